@@ -5,13 +5,12 @@ import os
 from pathlib import Path
 import aws_cdk as cdk
 from cdk_nag import AwsSolutionsChecks, NagSuppressions
-import yaml
+from components.layers.common_layer.fashion_common import load_config
 from components.stacks.fashion_agent_stack import FashionAgentStack
 
 
 # Load the configuration from config.yml
-with open(os.path.join(Path(__file__).parent, "config.yml"), "r") as ymlfile:
-    stack_config = yaml.load(ymlfile, Loader=yaml.loader.SafeLoader)
+stack_config = load_config(Path(__file__).parent / "config.yml")
 
 
 current_file_path = Path(__file__).resolve()
@@ -0,0 +1,189 @@
+# Token-minimized variants of the agent instructions and OpenAPI schema
+#
+# The instructions and the schema descriptions are part of the model input of every
+# orchestration step. The source files stay readable; the stack deploys the variants
+# built here when `compact_agent_prompt` is set. Only wording and layout change: every
+# path, parameter, type, required flag, response code and response schema is kept.
+
+import copy
+import json
+import math
+import re
+
+# Sentences of the source instructions and schema descriptions and their compact
+# wording. A sentence that changed in the source would no longer match and be deployed
+# as written, so the stack and `python -m tools.agent_tokens build` fail on stale
+# entries, see check_rewrites.
+REWRITES = {
+    # prompt.py
+    "Follow these steps to handle user requests:": "For each request:",
+    "1. Classify the request as fashion-related or not. If not fashion-related, respond:": "1. If the request is not fashion-related, respond:",
+    "If fashion-related, proceed.": "Otherwise continue.",
+    "2. Check if a location is mentioned requiring weather information. If so, call /weather API with location, and with start_date and end_date if the user mentions when they will be there (e.g. a trip next week), and generate one-sentence weather description.":
+        "2. If a location is mentioned, call /weather with it (and start_date, end_date if the user says when they will be there, e.g. a trip next week) and write a one-sentence weather description.",
+    "3. Check if generating new fashion image or finding similar images to existing one.": "3. Decide between generating a new image and finding images similar to an existing one.",
+    "For new image generation:": "New image:",
+    "For finding similar images:": "Similar images:",
+    "For finding several items at once, such as a full outfit:": "Several items, e.g. a full outfit:",
+    "4. Check if inpainting requested. If so:": "4. If inpainting is requested:",
+    "5. If any API output contains S3 URI, you must always return it in your final response within the xml tags <generated_s3_uri>output_s3_uri</generated_s3_uri> (one pair of tags per S3 URI)":
+        "5. Always return every S3 URI of the API outputs in your final response, one <generated_s3_uri>output_s3_uri</generated_s3_uri> pair per URI.",
+    "6. If an API output says a job was submitted, do not wait for it. Return the job id in your final response within the xml tags <job_id>job_id</job_id>. If the user asks about a submitted job, call /job_status API with the job id.":
+        "6. If an API output says a job was submitted, do not wait: return <job_id>job_id</job_id> in your final response. For questions about a submitted job, call /job_status with the job id.",
+    # FashionAgent_Schema.json
+    "Modify an image by seamlessly extending the region defined by the mask. Outpaint the outfit in the image to the requested scene or environment or background using a text prompt.":
+        "Extend the image around the masked outfit into the requested scene, environment or background, from a text prompt.",
+    "The prompt describing the desired scene or environment the user wants for the outfit": "The scene or environment the user wants for the outfit",
+    "The description for mask of the outfit to be outpainted. Mask here means the parts that user doesn't want to change. Just describing the items to be masked, without adding instructions like keeping or unchanging.":
+        "The items the user does not want to change, described without instructions like keeping or unchanging.",
+    "Inpainting is defined as an image editing operation where a section of the image called a mask is modified to match the surrounding background in the input image. Inpaint the outfits or clothes in the image to the desired style. The inpaint parameter mask should only contains the outfits/clothes need to be changed, parameter text should contains the desired outfits/clothes design in the generated image.":
+        "Change the outfits or clothes in the image to the desired style, matching the surrounding image. mask is only the outfits/clothes to change, text the desired outfits/clothes design.",
+    "Text prompt to guide inpainting, showing how user wants the new image to be.": "How the user wants the new image to be.",
+    "Prompt used for describing where in the current image that the user wants to change. Normally it should be the current outfits or clothes in the image.":
+        "What to change in the current image, normally its current outfits or clothes.",
+    "Either preview or final. Use preview while the user is still exploring looks, it is faster and cheaper. Use final once the user picked a look or asks for the full quality version.":
+        "preview (faster, cheaper) while the user explores looks, final once they picked a look or ask for full quality.",
+    "Seed of the image to re-render. Only provide it to render the final version of a previously generated preview, using the seed returned with that preview or given by the user.":
+        "Only to render the final version of an earlier preview: the seed it returned or the user gave.",
+    "Search for the input image in the database/catalog & retrieve similar images. If the image location is not provided use the default value of None":
+        "Find catalog images similar to the input image or query.",
+    "S3 location URI of the user uploaded image. This is not a required input. If an input location for the image is not provided, use a default value of None":
+        "S3 location URI of the user uploaded image, or None.",
+    "This is the part of the user query that describes the details to be included in the image. This is not a required input. If this not provided used a default value of None":
+        "The part of the user query describing the image details, or None.",
+    "No matching image retrieved. Redirecting to /imageGeneration ApiPath. Using the original query as input_query parameter":
+        "No match: call /imageGeneration with the original query as input_query",
+    "This action generates images based on user's query and image provided by the user, the weather parameter is only needed if a location was mentioned in the user query. If weather is needed used the /weather api to get the weather input needed. In other cases where a location is not mentioned by the user query the weather parameter is optional.":
+        "Generates images from the user's query and image. weather is only needed if the query mentions a location, get it from /weather first.",
+    "This is the part of the user query that describes the details to be included in the image.": "The part of the user query describing the image details.",
+    "This parameter is input with the weather output if the /weather api is called. If a location is not mentioned in the user query use the default value of None":
+        "The /weather output if /weather was called, otherwise None.",
+    "Generates a response with the s3 location of the images that were generated": "The S3 location of the generated images",
+    "Bad request. Please check log for more details.": "Bad request. Check the logs.",
+    "Search the database/catalog for one matching image per item description in a single call. Use it instead of several /image_lookup calls when the user asks for a full outfit or several items,":
+        "Find one catalog image per item description in a single call. Use it instead of several /image_lookup calls for a full outfit or several items,",
+    "This finds the current weather at a particular geographical location, or its daily forecast for the dates of a trip or an event within the next 16 days":
+        "Current weather at a location, or its daily forecast for the dates of a trip or event within the next 16 days",
+    "String with weather information for a given location identified from user's prompt, one line per day for a forecast. This will be used if needed in the /imageGeneration API":
+        "Weather at the location, one line per day for a forecast. Pass it to /imageGeneration if needed.",
+    "Bad request. Please ask user to confirm location.": "Bad request. Ask the user to confirm the location.",
+    "Image generation, inpainting and outpainting may be submitted as background jobs that return a job id instead of an S3 location. Use this API with that job id to check whether the job finished and to get the S3 location of the resulting image.":
+        "Image generation, inpainting and outpainting may run as background jobs returning a job id instead of an S3 location. Check with the job id whether the job finished and get the S3 location of its image.",
+}
+
+
+def compact_text(text: str) -> str:
+    """
+    Shorten a description without changing what it asks of the model.
+
+    Args:
+        text (str): The source description.
+
+    Returns:
+        str: The description on one line, with the sentences of REWRITES replaced.
+    """
+    text = " ".join(text.split())
+    for sentence, replacement in REWRITES.items():
+        text = text.replace(sentence, replacement)
+    text = re.sub(r"(/\w+) API (?=with|once)", r"\1 ", text)
+    return text.strip()
+
+
+def stale_rewrites(*sources: str) -> list:
+    """Return the REWRITES sentences found in none of the given source texts."""
+    text = " ".join(" ".join(source.split()) for source in sources)
+    return [sentence for sentence in REWRITES if sentence not in text]
+
+
+def check_rewrites(*sources: str) -> None:
+    """
+    Fail on REWRITES sentences found in none of the given source texts.
+
+    Raises:
+        ValueError: Listing the stale sentences, to update after an edit of the sources.
+    """
+    stale = stale_rewrites(*sources)
+    if stale:
+        listed = "\n".join(f"  {sentence[:80]}" for sentence in stale)
+        raise ValueError(f"compact.REWRITES has sentences no longer found in the sources:\n{listed}")
+
+
+def compact_instructions(instructions: str) -> str:
+    """
+    Compact the agent instructions, keeping their line structure.
+
+    Args:
+        instructions (str): The source instructions, see prompt.py.
+
+    Returns:
+        str: The instructions with blank lines removed and each line compacted.
+    """
+    lines = (compact_text(line) for line in instructions.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _compact_descriptions(schema: dict) -> None:
+    # Descriptions of a response body schema and its properties, in place
+    if schema.get("description"):
+        schema["description"] = compact_text(schema["description"])
+    for value in schema.get("properties", {}).values():
+        _compact_descriptions(value)
+    if isinstance(schema.get("items"), dict):
+        _compact_descriptions(schema["items"])
+
+
+def _response(response: dict) -> dict:
+    # The response content schemas are part of the action group contract, only their
+    # descriptions are compacted
+    response["description"] = compact_text(response.get("description", ""))
+    for media in response.get("content", {}).values():
+        _compact_descriptions(media.get("schema", {}))
+    return response
+
+
+def compact_schema(schema: dict) -> dict:
+    """
+    Build the token-minimized variant of an OpenAPI schema.
+
+    Drops the API and operation summaries (the operation description is kept) and
+    compacts every description, response schemas included.
+
+    Args:
+        schema (dict): The source OpenAPI schema.
+
+    Returns:
+        dict: The compact schema, with the same paths and parameters.
+    """
+    compact = copy.deepcopy(schema)
+    compact["info"] = {key: value for key, value in compact["info"].items() if key != "description"}
+    for methods in compact["paths"].values():
+        for operation in methods.values():
+            if operation.get("description"):
+                operation.pop("summary", None)
+                operation["description"] = compact_text(operation["description"])
+            for parameter in operation.get("parameters", []):
+                if parameter.get("description"):
+                    parameter["description"] = compact_text(parameter["description"])
+            operation["responses"] = {
+                code: _response(response) for code, response in operation.get("responses", {}).items()
+            }
+    return compact
+
+
+def schema_payload(schema: dict) -> str:
+    """Serialize a schema for the agent, without insignificant whitespace."""
+    return json.dumps(schema, separators=(",", ":"))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens of a text, offline.
+
+    Counts one token per punctuation character and one per started group of four
+    characters of every word, a close enough proxy for the model tokenizer
+    to compare variants. Use the Bedrock CountTokens API for exact numbers.
+    """
+    return sum(
+        math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == "_" else 1
+        for piece in re.findall(r"\w+|[^\w\s]", text)
+    )
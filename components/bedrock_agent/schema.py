@@ -0,0 +1,69 @@
+# Helpers to read the agent OpenAPI schema and derive what the Lambda needs from it
+
+import json
+from pathlib import Path
+
+SCHEMA_DIR = Path(__file__).resolve().parent
+
+
+def load_schema(schema_name: str) -> dict:
+    """
+    Load an OpenAPI schema from the bedrock_agent directory.
+
+    Args:
+        schema_name (str): File name of the schema, e.g. "FashionAgent_Schema.json".
+
+    Returns:
+        dict: The parsed schema.
+    """
+    with open(SCHEMA_DIR / schema_name, "r") as f:
+        return json.load(f)
+
+
+def action_spec(schema: dict) -> dict:
+    """
+    Reduce an OpenAPI schema to the parameter table used by the Lambda action registry.
+
+    The result is small enough to be passed to the Lambda as an environment variable:
+    {api_path: [[parameter_name, type, required], ...]}
+
+    Args:
+        schema (dict): The OpenAPI schema.
+
+    Returns:
+        dict: The parameter table, one entry per API path.
+    """
+    spec = {}
+    for api_path, methods in schema["paths"].items():
+        parameters = []
+        for operation in methods.values():
+            for parameter in operation.get("parameters", []):
+                parameters.append(
+                    [
+                        parameter["name"],
+                        parameter.get("schema", {}).get("type", "string"),
+                        bool(parameter.get("required", False)),
+                    ]
+                )
+        spec[api_path] = parameters
+    return spec
+
+
+def subset_schema(schema: dict, api_paths: list) -> dict:
+    """
+    Copy an OpenAPI schema keeping only the given API paths.
+
+    Args:
+        schema (dict): The OpenAPI schema.
+        api_paths (list): The API paths to keep.
+
+    Returns:
+        dict: The reduced schema.
+    """
+    unknown = set(api_paths) - set(schema["paths"])
+    if unknown:
+        raise ValueError(f"API paths not declared in the schema: {sorted(unknown)}")
+    return {
+        **schema,
+        "paths": {api_path: schema["paths"][api_path] for api_path in api_paths},
+    }
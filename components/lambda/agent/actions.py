@@ -0,0 +1,184 @@
+"""
+Table-driven routing for the agent Lambda.
+
+The registry is built from the parameter table derived from the agent OpenAPI schema
+(see ``components/bedrock_agent/schema.py``). Each request's parameters are parsed
+once into a typed, immutable object and required fields are checked before the
+action runs, so invalid requests never reach S3 or Bedrock.
+"""
+
+import json
+import logging
+from dataclasses import field, make_dataclass
+
+logger = logging.getLogger()
+
+
+def _to_tuple(value) -> tuple:
+    """Parse an array parameter, sent as a JSON array or as "[a, b]" / "a|b" text."""
+    if isinstance(value, (list, tuple)):
+        return tuple(str(item) for item in value)
+    text = str(value).strip()
+    try:
+        items = json.loads(text)
+    except ValueError:
+        text = text.removeprefix("[").removesuffix("]")
+        items = text.split("|") if "|" in text else text.split(",")
+    if not isinstance(items, list):
+        items = [items]
+    return tuple(str(item).strip().strip("'\"") for item in items if str(item).strip())
+
+
+_CONVERTERS = {
+    "string": str,
+    "integer": int,
+    "number": float,
+    "boolean": lambda value: str(value).strip().lower() in ("true", "1", "yes"),
+    "array": _to_tuple,
+}
+
+
+class ActionError(Exception):
+    """Raised by an action to answer the agent with an error response instead of failing."""
+
+    def __init__(self, message: str, response_code: int = 400):
+        super().__init__(message)
+        self.response_code = response_code
+
+
+class ValidationError(ActionError, ValueError):
+    """Raised when a request does not match the parameters declared in the schema."""
+
+
+def _params_class(api_path: str, parameters: list):
+    name = "".join(part.capitalize() for part in api_path.strip("/").split("_")) or "Root"
+    fields = [
+        (param_name, _CONVERTERS.get(param_type, str), field(default=None))
+        for param_name, param_type, _ in parameters
+    ]
+    return make_dataclass(f"{name}Params", fields, frozen=True, slots=True)
+
+
+class ActionRegistry:
+    """
+    Maps API paths to action functions and their typed parameter classes.
+
+    Usage:
+
+    registry = ActionRegistry(spec)
+
+    @registry.action("/weather")
+    def get_weather(event, params): ...
+
+    result = registry.dispatch(event)
+
+    Actions registered with ``asynchronous=True`` can be handed to a job submitter
+    instead of running inline, see ``dispatch``. ``api_paths`` lists every path of the
+    agent schema, of which ``spec`` may serve a subset (see lambda_profiles); actions
+    registered for a path outside of it are rejected at import time.
+    """
+
+    def __init__(self, spec: dict, api_paths=None):
+        self._parameters = {api_path: list(params) for api_path, params in spec.items()}
+        self._api_paths = set(api_paths or ()) | set(spec)
+        self._params_classes = {
+            api_path: _params_class(api_path, params)
+            for api_path, params in self._parameters.items()
+        }
+        self._actions = {}
+        self._asynchronous = set()
+
+    def action(self, api_path: str, asynchronous: bool = False):
+        """
+        Decorator registering ``func(event, params)`` as the handler for ``api_path``.
+
+        Args:
+            api_path (str): The API path declared in the schema.
+            asynchronous (bool): Whether the action may run as a background job.
+
+        Raises:
+            ValueError: If ``api_path`` is not declared in the agent schema.
+        """
+
+        def register(func):
+            if api_path not in self._api_paths:
+                raise ValueError(f"{func.__name__} is registered for {api_path}, not declared in the agent schema")
+            # Each function only serves the paths of its own schema, see lambda_profiles
+            if api_path not in self._parameters:
+                return func
+            self._actions[api_path] = func
+            if asynchronous:
+                self._asynchronous.add(api_path)
+            return func
+
+        return register
+
+    def parse(self, api_path: str, event: dict):
+        """
+        Parse and validate the parameters of an agent event.
+
+        Args:
+            api_path (str): The API path the parameters belong to.
+            event (dict): The agent event.
+
+        Returns:
+            The typed parameter object for ``api_path``.
+
+        Raises:
+            ValidationError: If a required parameter is missing or has the wrong type.
+        """
+        values = {item["name"]: item.get("value") for item in event.get("parameters") or []}
+        parsed = {}
+        missing = []
+        for name, param_type, required in self._parameters[api_path]:
+            value = values.get(name)
+            if value is None or value == "":
+                if required:
+                    missing.append(name)
+                continue
+            try:
+                parsed[name] = _CONVERTERS.get(param_type, str)(value)
+            except (TypeError, ValueError):
+                raise ValidationError(f"Parameter {name} must be of type {param_type}")
+        if missing:
+            raise ValidationError(f"Missing required parameter(s): {', '.join(missing)}")
+        return self._params_classes[api_path](**parsed)
+
+    def dispatch(self, event: dict, submit_job=None) -> dict:
+        """
+        Route an agent event to its action.
+
+        Args:
+            event (dict): The agent event.
+            submit_job (callable): If given, asynchronous actions are validated and
+                passed to ``submit_job(event, params)`` instead of running inline.
+
+        Returns:
+            dict: The action result with 'body' and 'response_code'. Actions raising
+                ``ActionError`` are answered with its message and response code.
+        """
+        api_path = event["apiPath"]
+        func = self._actions.get(api_path)
+        if func is None:
+            logger.warning("Unknown API path: %s", api_path)
+            return {"body": "Unknown API path", "response_code": 400}
+        try:
+            params = self.parse(api_path, event)
+        except ValidationError as e:
+            logger.warning("Invalid request for %s: %s", api_path, e)
+            return {"body": f"Invalid request: {e}", "response_code": 400}
+        if submit_job is not None and api_path in self._asynchronous:
+            return submit_job(event, params)
+        try:
+            return func(event, params)
+        except ActionError as e:
+            logger.warning("%s failed: %s", api_path, e)
+            return {"body": str(e), "response_code": e.response_code}
+
+
+def load_registry(raw_spec: str, raw_paths: str = None) -> ActionRegistry:
+    """
+    Build a registry from the JSON parameter table and API path list of the
+    ``action_spec`` and ``action_paths`` settings.
+    """
+    return ActionRegistry(json.loads(raw_spec), json.loads(raw_paths) if raw_paths else None)
@@ -0,0 +1,126 @@
+"""
+Shared invocation layer for Bedrock runtime models.
+
+Every model call made by the agent Lambda goes through ``invoke_model``, which adds
+on top of the client-side rate limiting of the botocore "adaptive" retry mode:
+    - jittered exponential backoff on throttling, up to ``bedrock.max_attempts``
+      calls. The client makes a single attempt per call, so one throttled request
+      never costs more than ``max_attempts`` calls,
+    - a per-model concurrency budget,
+    - single-flight coalescing: identical requests already in flight share one call.
+Throttles, retries and coalesced calls are counted through ``tracing``.
+"""
+
+import hashlib
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+from fashion_common import clients, get_settings, vectors
+
+import tracing
+
+MAX_ATTEMPTS = get_settings().bedrock_max_attempts
+MAX_CONCURRENCY = get_settings().bedrock_max_concurrency
+BASE_DELAY = 0.5  # seconds
+MAX_DELAY = 20.0  # seconds
+THROTTLING_ERRORS = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+# The retries are made by _call only, SDK retries would multiply its attempts
+bedrock_client = clients.client("bedrock-runtime", max_attempts=1)
+
+_lock = threading.Lock()
+_budgets = {}
+_inflight = {}
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _budget(model_id: str) -> threading.BoundedSemaphore:
+    with _lock:
+        if model_id not in _budgets:
+            _budgets[model_id] = threading.BoundedSemaphore(MAX_CONCURRENCY)
+        return _budgets[model_id]
+
+
+def _read_json(body) -> dict:
+    return vectors.loads(body.read())
+
+
+def _call(model_id: str, body: str, parse, span_name: str):
+    budget = _budget(model_id)
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with budget, tracing.span(span_name, bytes=len(body)):
+                response = bedrock_client.invoke_model(
+                    body=body,
+                    modelId=model_id,
+                    accept="application/json",
+                    contentType="application/json",
+                )
+                return parse(response["body"])
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in THROTTLING_ERRORS:
+                raise
+            tracing.incr("bedrock_throttled")
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            tracing.incr("bedrock_retries")
+            # Full jitter: spread retries from concurrent containers over the window.
+            time.sleep(random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2**attempt)))
+
+
+def invoke_model(model_id: str, body: str, parse=None, span_name: str = "bedrock_invoke"):
+    """
+    Invoke a Bedrock model with throttling control and request coalescing.
+
+    Args:
+        model_id (str): The Bedrock model id.
+        body (str): The JSON request body.
+        parse (callable): Turns the streaming response body into the result.
+            Defaults to parsing the body as JSON. Results are shared between
+            coalesced callers and must not be mutated.
+        span_name (str): Tracing stage name for the call.
+
+    Returns:
+        The parsed response body.
+    """
+    parse = parse or _read_json
+    key = hashlib.sha256(
+        f"{model_id}\0{getattr(parse, '__qualname__', id(parse))}\0{body}".encode()
+    ).digest()
+    with _lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    if not leader:
+        tracing.incr("bedrock_coalesced")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _call(model_id, body, parse, span_name)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _inflight[key]
+        flight.done.set()
@@ -0,0 +1,197 @@
+"""
+Session-scoped edit chains and mask caching for inpainting.
+
+Every edit of an image is stored as a new version under a chain keyed by the agent
+session and the original image, instead of overwriting the previous result:
+
+    ephemeral/sessions/<session_id>/edits/<chain_id>/v001.png, v002.png, ...
+    ephemeral/sessions/<session_id>/edits/<chain_id>/v001_mask.png, ...
+    ephemeral/sessions/<session_id>/edits/<chain_id>/masks/<mask_id>.png
+
+under the prefix of the tenant of the session, if any.
+
+Versions are written with a conditional put, so concurrent edits of a chain each get
+their own version. Every version records the mask it was made with: the normalized
+mask prompt and, when Titan was given a ``maskImage``, a copy of that mask next to
+the version.
+
+A mask image supplied by the user is also stored under ``masks/`` for its region
+(the normalized mask prompt). Later edits of the same region in the chain send it as
+``maskImage`` instead of having Titan segment the full image again; regions without
+a supplied mask are segmented from the prompt every time.
+"""
+
+import base64
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+import storage
+import tracing
+
+logger = logging.getLogger()
+
+EDIT_PREFIX = f"{storage.EPHEMERAL}sessions/"
+MAX_CACHED_MASKS = 64
+# Conditional puts of a version before giving up, each losing one race
+MAX_VERSION_ATTEMPTS = 5
+# Errors of a conditional put whose key exists or is being written
+_CONFLICTS = ("PreconditionFailed", "ConditionalRequestConflict")
+# Longest mask prompt recorded as object metadata, which S3 caps at 2 KB
+MAX_MASK_PROMPT_METADATA = 256
+
+_VERSION_KEY = re.compile(rf"^((?:.*/)?{re.escape(EDIT_PREFIX)}[^/]+/edits/[^/]+/)v(\d+)\.png$")
+_masks = OrderedDict()
+
+
+def _safe(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "_", value or "anonymous")
+
+
+def normalize_mask_prompt(mask_prompt: str) -> str:
+    """Normalize a mask prompt so rewordings in case, spacing and punctuation match."""
+    words = re.sub(r"[^a-z0-9 ]", " ", (mask_prompt or "").lower()).split()
+    return " ".join(words)
+
+
+def chain_prefix(session_id: str, image_uri: str, root: str = "") -> str:
+    """
+    Return the key prefix of the edit chain an input image belongs to.
+
+    Args:
+        session_id (str): The agent session id.
+        image_uri (str): The S3 URI of the image being edited.
+        root (str): The key prefix of the tenant, "" for the default tenant.
+
+    Returns:
+        str: The chain prefix, ending with "/".
+    """
+    key = image_uri.replace("s3://", "").split("/", 1)[-1]
+    match = _VERSION_KEY.match(key)
+    if match and match.group(1).startswith(f"{root}{EDIT_PREFIX}{_safe(session_id)}/"):
+        return match.group(1)
+    chain_id = hashlib.sha1(image_uri.encode("utf8")).hexdigest()[:16]
+    return f"{root}{EDIT_PREFIX}{_safe(session_id)}/edits/{chain_id}/"
+
+
+def next_version_key(s3_client, bucket_name: str, prefix: str, after: int = 0) -> str:
+    """Return the key of the next version in an edit chain, past version ``after``."""
+    latest = after
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter="/"):
+        for item in page.get("Contents", []):
+            match = _VERSION_KEY.match(item["Key"])
+            if match:
+                latest = max(latest, int(match.group(2)))
+    return f"{prefix}v{latest + 1:03d}.png"
+
+
+def put_version(s3_client, bucket_name: str, prefix: str, image_bytes: bytes, metadata: dict) -> str:
+    """
+    Store an edit as the next version of its chain.
+
+    The version is written with ``IfNoneMatch="*"``: if another edit of the chain took
+    the version first, the next free one is used instead of overwriting it.
+
+    Args:
+        s3_client: The S3 client.
+        bucket_name (str): The agent bucket.
+        prefix (str): The chain prefix, see ``chain_prefix``.
+        image_bytes (bytes): The edited image, PNG.
+        metadata (dict): S3 user metadata of the version, see ``mask_metadata``.
+
+    Returns:
+        str: The key of the version.
+    """
+    key = next_version_key(s3_client, bucket_name, prefix)
+    for _ in range(MAX_VERSION_ATTEMPTS):
+        try:
+            with tracing.span("s3_put", bytes=len(image_bytes)):
+                s3_client.put_object(
+                    Bucket=bucket_name,
+                    Key=key,
+                    Body=image_bytes,
+                    ContentType="image/png",
+                    Metadata=metadata,
+                    IfNoneMatch="*",
+                )
+            return key
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in _CONFLICTS:
+                raise
+            tracing.incr("edit_version_conflicts")
+            logger.info("Version %s was taken by a concurrent edit", key)
+            key = next_version_key(s3_client, bucket_name, prefix, after=int(_VERSION_KEY.match(key).group(2)))
+    raise Exception("Too many concurrent edits of this image, please try again")
+
+
+def mask_metadata(mask_prompt: str, mask_image: bool) -> dict:
+    """
+    S3 user metadata recording the mask of an edit.
+
+    Args:
+        mask_prompt (str): The mask prompt of the edit.
+        mask_image (bool): Whether Titan was given a mask image, stored next to the
+            version by ``put_version_mask``, instead of segmenting the prompt.
+    """
+    return {
+        "mask-prompt": normalize_mask_prompt(mask_prompt)[:MAX_MASK_PROMPT_METADATA],
+        "mask-source": "image" if mask_image else "prompt",
+    }
+
+
+def version_mask_key(version_key: str) -> str:
+    """Return the key of the mask image an edit version was made with."""
+    return version_key.rsplit(".", 1)[0] + "_mask.png"
+
+
+def put_version_mask(s3_client, bucket_name: str, version_key: str, mask_png: bytes) -> None:
+    """Store the mask image an edit version was made with next to the version."""
+    with tracing.span("s3_put", bytes=len(mask_png)):
+        s3_client.put_object(
+            Bucket=bucket_name, Key=version_mask_key(version_key), Body=mask_png, ContentType="image/png"
+        )
+
+
+def mask_key(prefix: str, mask_prompt: str) -> str:
+    """Return the key of the cached mask for a region of an edit chain."""
+    mask_id = hashlib.sha1(normalize_mask_prompt(mask_prompt).encode("utf8")).hexdigest()[:16]
+    return f"{prefix}masks/{mask_id}.png"
+
+
+def get_mask(s3_client, bucket_name: str, key: str):
+    """
+    Return the cached mask as a base64 string, or None if the region has no mask yet.
+    """
+    with tracing.span("mask_cache") as span:
+        if key in _masks:
+            _masks.move_to_end(key)
+            span.set("cache_hit", True)
+            return _masks[key]
+        try:
+            response = s3_client.get_object(Bucket=bucket_name, Key=key)
+        except s3_client.exceptions.NoSuchKey:
+            span.set("cache_hit", False)
+            return None
+        encoded = base64.b64encode(response["Body"].read()).decode("utf8")
+        span.set("cache_hit", True)
+    _remember(key, encoded)
+    return encoded
+
+
+def put_mask(s3_client, bucket_name: str, key: str, mask_png: bytes) -> None:
+    """Store the mask image supplied for a region of an edit chain."""
+    with tracing.span("s3_put", bytes=len(mask_png)):
+        s3_client.put_object(Bucket=bucket_name, Key=key, Body=mask_png, ContentType="image/png")
+    _remember(key, base64.b64encode(mask_png).decode("utf8"))
+
+
+def _remember(key: str, encoded: str) -> None:
+    _masks[key] = encoded
+    _masks.move_to_end(key)
+    while len(_masks) > MAX_CACHED_MASKS:
+        _masks.popitem(last=False)
+
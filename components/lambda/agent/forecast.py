@@ -0,0 +1,176 @@
+"""
+Daily weather forecasts for the /weather action.
+
+Shoppers plan outfits for trips ("what should I wear in Paris next week"), so
+/weather also answers for a date range. The daily forecast of a location is fetched
+from Open-Meteo once, for the whole forecast horizon, and reduced to one small
+``DaySummary`` per day (min/max temperature, dominant weather code, precipitation).
+The summaries are kept in container memory, keyed by location and UTC day, for
+``weather_cache_ttl`` seconds; any range within the horizon is then served from the
+cached entry instead of a new request.
+"""
+
+import datetime
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+import requests
+from fashion_common import get_settings
+
+import tracing
+
+logger = logging.getLogger()
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+# Longest forecast served by Open-Meteo
+FORECAST_DAYS = 16
+DAILY_FIELDS = "temperature_2m_min,temperature_2m_max,weathercode,precipitation_sum"
+DEFAULT_TTL = 3 * 60 * 60
+MAX_LOCATIONS = 256
+
+WEATHER_CODES = {
+    0: "Clear sky",
+    1: "Mainly clear",
+    2: "Partly cloudy",
+    3: "Overcast",
+    45: "Fog",
+    48: "Depositing rime fog",
+    51: "Drizzle: Light intensity",
+    53: "Drizzle: Moderate intensity",
+    55: "Drizzle: Dense intensity",
+    56: "Freezing Drizzle: Light intensity",
+    57: "Freezing Drizzle: Dense intensity",
+    61: "Rain: Slight intensity",
+    63: "Rain: Moderate intensity",
+    65: "Rain: Heavy intensity",
+    66: "Freezing Rain: Light intensity",
+    67: "Freezing Rain: Heavy intensity",
+    71: "Snow fall: Slight intensity",
+    73: "Snow fall: Moderate intensity",
+    75: "Snow fall: Heavy intensity",
+    77: "Snow grains",
+    80: "Rain showers: Slight intensity",
+    81: "Rain showers: Moderate intensity",
+    82: "Rain showers: Violent intensity",
+    85: "Snow showers: Slight intensity",
+    86: "Snow showers: Heavy intensity",
+    95: "Thunderstorm: Slight or moderate",
+    96: "Thunderstorm with slight hail",
+    99: "Thunderstorm with heavy hail",
+}
+
+
+def describe(weathercode) -> str:
+    """The text description of a WMO weather code."""
+    return WEATHER_CODES.get(weathercode, "Unknown")
+
+
+class DaySummary(NamedTuple):
+    """Forecast of one day, in Fahrenheit and millimetres."""
+
+    date: datetime.date
+    temp_min: float
+    temp_max: float
+    weathercode: int
+    precipitation: float
+
+    def describe(self) -> str:
+        return (
+            f"{self.date:%A %Y-%m-%d}: {self.temp_min:.0f} to {self.temp_max:.0f} F, "
+            f"{describe(self.weathercode)}, {self.precipitation:.1f} mm of precipitation"
+        )
+
+
+def summarize_daily(daily: dict) -> tuple:
+    """Reduce the ``daily`` block of an Open-Meteo response to DaySummary tuples."""
+    return tuple(
+        DaySummary(datetime.date.fromisoformat(day), low, high, code, precipitation or 0.0)
+        for day, low, high, code, precipitation in zip(
+            daily["time"],
+            daily["temperature_2m_min"],
+            daily["temperature_2m_max"],
+            daily["weathercode"],
+            daily["precipitation_sum"],
+        )
+        if low is not None and high is not None
+    )
+
+
+def fetch_daily(latitude, longitude, timeout: float) -> tuple:
+    """
+    Fetch the daily forecast of a location for the whole horizon.
+
+    Returns:
+        tuple: DaySummary per day, in the location's time zone, or None if the
+        request failed.
+    """
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": DAILY_FIELDS,
+        "temperature_unit": "fahrenheit",
+        "timezone": "auto",
+        "forecast_days": FORECAST_DAYS,
+    }
+    with tracing.span("http_weather") as span:
+        response = requests.get(FORECAST_URL, params=params, timeout=timeout)
+        span.set("bytes", len(response.content))
+    if response.status_code != 200:
+        logger.warning("Forecast request failed with status %s", response.status_code)
+        return None
+    return summarize_daily(response.json()["daily"])
+
+
+class ForecastCache:
+    """LRU cache of daily summaries per location, expiring after a TTL or at the end of the UTC day."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_locations: int = MAX_LOCATIONS):
+        self.ttl = ttl
+        self.max_locations = max_locations
+        self._entries = OrderedDict()  # location -> (utc day, expires at, summaries)
+        self._lock = threading.Lock()
+
+    def get(self, location: str, fetch) -> tuple:
+        """
+        Return the daily summaries of a location, calling ``fetch()`` on a miss.
+
+        Args:
+            location (str): The location name, as given by the user.
+            fetch (callable): Returns the DaySummary tuple of the location, or None.
+
+        Returns:
+            tuple: The DaySummary tuple, or None if it could not be fetched.
+        """
+        key = location.strip().lower()
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and cached[0] == today and cached[1] > time.monotonic():
+                self._entries.move_to_end(key)
+            else:
+                cached = None
+        with tracing.span("weather_cache") as span:
+            span.set("cache_hit", cached is not None)
+        if cached:
+            return cached[2]
+        summaries = fetch()
+        if not summaries:
+            return None
+        with self._lock:
+            self._entries[key] = (today, time.monotonic() + self.ttl, summaries)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_locations:
+                self._entries.popitem(last=False)
+        return summaries
+
+
+def select(summaries: tuple, start: datetime.date, end: datetime.date) -> list:
+    """The summaries of the days from ``start`` to ``end``, both included."""
+    return [day for day in summaries if start <= day.date <= end]
+
+
+forecast_cache = ForecastCache(get_settings().weather_cache_ttl)
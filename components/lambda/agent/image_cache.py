@@ -0,0 +1,91 @@
+"""
+Working set of the images used by an agent session.
+
+A conversation keeps coming back to the same images: the lookup embeds the user's
+photo, /inpaint loads it again, /outpaint loads the inpainted result. The cache keeps
+the base64 payload of those images in container memory, keyed by session and S3 URI,
+so later actions skip the download and the encoding. A hit is revalidated with a
+conditional GET on the stored ETag, which S3 answers with an empty 304 when the
+object did not change. Entries are evicted least recently used first once the cache
+holds more than ``image_cache_bytes``.
+"""
+
+import base64
+import logging
+import threading
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+from fashion_common import get_settings
+
+import tracing
+
+logger = logging.getLogger()
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class SessionImageCache:
+    """LRU cache of base64-encoded S3 images under a byte budget."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # (session_id, uri) -> (etag, encoded)
+        self._lock = threading.Lock()
+
+    def load(self, s3_client, image_uri: str, session_id: str = None) -> str:
+        """
+        Return the base64 payload of an S3 image, downloading it only if it changed.
+
+        Args:
+            s3_client: The S3 client used for the download.
+            image_uri (str): The S3 URI of the image.
+            session_id (str): The agent session the image is used in.
+
+        Returns:
+            str: The base64-encoded image.
+        """
+        key = (session_id, image_uri)
+        with self._lock:
+            cached = self._entries.get(key)
+        bucket, object_key = image_uri.replace("s3://", "").split("/", 1)
+        request = {"Bucket": bucket, "Key": object_key}
+        if cached:
+            request["IfNoneMatch"] = cached[0]
+        with tracing.span("s3_get") as span:
+            try:
+                response = s3_client.get_object(**request)
+            except ClientError as e:
+                if cached and e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+                    span.set("cache_hit", True)
+                    with self._lock:
+                        if key in self._entries:
+                            self._entries.move_to_end(key)
+                    return cached[1]
+                raise
+            image_content = response["Body"].read()
+            span.set("cache_hit", False)
+            span.set("bytes", len(image_content))
+        with tracing.span("b64_encode", bytes=len(image_content)):
+            encoded = base64.b64encode(image_content).decode("utf8")
+        self._store(key, response.get("ETag"), encoded)
+        return encoded
+
+    def _store(self, key, etag, encoded: str) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self.size -= len(previous[1])
+            if not etag or len(encoded) > self.max_bytes:
+                return
+            self._entries[key] = (etag, encoded)
+            self.size += len(encoded)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+        tracing.gauge("image_cache_bytes", self.size)
+
+
+image_cache = SessionImageCache(get_settings().image_cache_bytes)
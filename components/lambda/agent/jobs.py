@@ -0,0 +1,193 @@
+"""
+Asynchronous job mode for long-running agent actions.
+
+When job mode is on, actions registered as asynchronous are validated, written to
+the job store as "pending" and put on a queue; the agent gets a job id back right
+away. A worker (the ``job_handler`` Lambda fed by SQS, or a local thread pool)
+runs the action and records its result, which ``/job_status`` and the frontend poll.
+
+Jobs are stored under the prefix of the tenant that submitted them and record the
+tenant and the agent session, so ``find`` only returns a job to its own session.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+
+JOB_PREFIX = "jobs/"
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def job_key(job_id: str, prefix: str = "") -> str:
+    """Key of the status document of a job, under the prefix of its tenant."""
+    return f"{prefix}{JOB_PREFIX}{job_id}.json"
+
+
+class S3JobStore:
+    """Keeps one small JSON status document per job under ``<prefix>jobs/`` in the bucket."""
+
+    def __init__(self, s3_client, bucket_name: str):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+
+    def put(self, job_id: str, status: dict, prefix: str = "") -> None:
+        self.s3_client.put_object(
+            Bucket=self.bucket_name,
+            Key=job_key(job_id, prefix),
+            Body=json.dumps(status).encode("utf8"),
+            ContentType="application/json",
+        )
+
+    def get(self, job_id: str, prefix: str = ""):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=job_key(job_id, prefix))
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response["Body"].read())
+
+
+class LocalJobStore:
+    """In-memory job store for local runs and tests."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, job_id: str, status: dict, prefix: str = "") -> None:
+        with self._lock:
+            self._jobs[job_key(job_id, prefix)] = dict(status)
+
+    def get(self, job_id: str, prefix: str = ""):
+        with self._lock:
+            status = self._jobs.get(job_key(job_id, prefix))
+        return dict(status) if status is not None else None
+
+
+class SqsJobQueue:
+    """Sends job messages to the SQS queue consumed by the job worker Lambda."""
+
+    def __init__(self, sqs_client, queue_url: str):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+
+    def send(self, message: dict) -> None:
+        self.sqs_client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(message))
+
+
+class LocalJobQueue:
+    """
+    Local stand-in for the SQS queue: messages are processed by a thread pool in
+    the same process. Only meant for local runs and tests, since a Lambda container
+    is frozen as soon as the handler returns.
+    """
+
+    def __init__(self, worker, max_workers: int = 2):
+        self.worker = worker
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def send(self, message: dict) -> None:
+        self.executor.submit(self.worker, message)
+
+
+def submit(store, queue, event: dict, tenant) -> str:
+    """
+    Record a pending job for the agent event and enqueue it.
+
+    Args:
+        store: The job store.
+        queue: The job queue.
+        event (dict): The agent event to run later.
+        tenant (Tenant): The tenant of the event, under whose prefix the job is stored.
+
+    Returns:
+        str: The job id.
+
+    Raises:
+        Exception: The queue failed to take the job, which is then recorded as failed.
+    """
+    job_id = uuid.uuid4().hex
+    status = {
+        "job_id": job_id,
+        "status": PENDING,
+        "apiPath": event["apiPath"],
+        "tenant_id": tenant.tenant_id,
+        "session_id": event.get("sessionId"),
+        "created": time.time(),
+    }
+    # Recorded before it is queued, so a fast worker never has its status overwritten
+    store.put(job_id, status, tenant.prefix)
+    try:
+        queue.send({"job_id": job_id, "event": event, "prefix": tenant.prefix, "tenant_id": tenant.tenant_id})
+    except Exception:
+        # A job that never reached the queue would otherwise be polled as pending forever
+        status.update(status=FAILED, result="The job could not be queued, please try again.", finished=time.time())
+        store.put(job_id, status, tenant.prefix)
+        raise
+    logger.info("Submitted job %s for %s", job_id, event["apiPath"])
+    return job_id
+
+
+def run(store, run_action, message: dict) -> dict:
+    """
+    Run one job message and record its outcome.
+
+    Args:
+        store: The job store.
+        run_action (callable): Runs an agent event synchronously and returns the
+            action result with 'body' and 'response_code'.
+        message (dict): The message produced by ``submit``.
+
+    Returns:
+        dict: The final job status.
+    """
+    job_id = message["job_id"]
+    event = message["event"]
+    prefix = message.get("prefix", "")
+    status = {
+        "job_id": job_id,
+        "apiPath": event["apiPath"],
+        "tenant_id": message.get("tenant_id"),
+        "session_id": event.get("sessionId"),
+        "status": RUNNING,
+        "started": time.time(),
+    }
+    store.put(job_id, status, prefix)
+    try:
+        result = run_action(event)
+        status["status"] = SUCCEEDED if result["response_code"] == 200 else FAILED
+        status["result"] = str(result["body"])
+    except Exception as e:
+        logger.error("Job %s failed: %s", job_id, e)
+        status["status"] = FAILED
+        status["result"] = "The job failed, please try again."
+    status["finished"] = time.time()
+    store.put(job_id, status, prefix)
+    return status
+
+
+def find(store, job_id: str, tenant, session_id: str):
+    """
+    Return the status of a job submitted by an agent session.
+
+    Args:
+        store: The job store.
+        job_id (str): The job id.
+        tenant (Tenant): The tenant of the asking session.
+        session_id (str): The agent session asking.
+
+    Returns:
+        dict: The job status, or None if there is no such job for this tenant and session.
+    """
+    status = store.get(job_id, tenant.prefix)
+    if status is None or status.get("tenant_id") != tenant.tenant_id or status.get("session_id") != session_id:
+        return None
+    return status
@@ -1,81 +1,129 @@
 import base64
 import json
-import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from random import randint
 from typing import List
 from io import BytesIO
 
-import boto3
 import requests
-from opensearchpy import AWSV4SignerAuth, OpenSearch, RequestsHttpConnection
 import logging
+from fashion_common import Tenant, clients, get_settings, vectors
+
+import edit_sessions
+import forecast
+import image_cache
+import jobs
+import log_fields
+import neighbours
+import postprocess
+import profiling
+import query_embeddings
+import render_tiers
+import retrieval
+import storage
+import tracing
+from actions import ActionError, load_registry
+from bedrock_invoke import invoke_model
 
 logger = logging.getLogger()
 logger.setLevel("INFO")
 
 REQUEST_TIMEOUT = 10
 
-region = os.environ["region_info"]
-bedrock_client = boto3.client("bedrock-runtime")
-s3_client = boto3.client("s3")
-bucket_name = os.environ["s3_bucket"]
-host = os.environ["aoss_host"]
-if host.startswith("https:"):
-    host = host.removeprefix("https://")
-index_name = os.environ["index_name"]
-embeddingSize = int(os.environ["embeddingSize"])
+# Deployment settings, see components/layers/common_layer/fashion_common/settings.py
+settings = get_settings().require("bucket_name", "index_name", "action_spec")
+s3_client = clients.client("s3")
+bucket_name = settings.bucket_name
+host = settings.aoss_host
+embeddingSize = settings.embedding_size
 
-# similarity threshold - to retrieve the matching images from OpenSearch index
-RETRIEVE_THRESHOLD = 0.2
+# Session attribute selecting the catalog of a storefront, see Settings.tenants
+TENANT_ATTRIBUTE = "tenant_id"
 
+# Maximum number of queries of one /batch_image_lookup request
+MAX_BATCH_QUERIES = 8
+lookup_executor = ThreadPoolExecutor(max_workers=MAX_BATCH_QUERIES)
+opensearch_client = None
 
-def get_named_parameter(event, name):
+# Action registry generated from the agent schema, see components/bedrock_agent/schema.py
+registry = load_registry(settings.action_spec, settings.action_paths)
+
+# Job mode: long-running actions are queued and picked up by job_handler
+JOB_MODE = settings.job_mode
+job_queue_url = settings.job_queue_url
+if job_queue_url == "local":
+    job_store = jobs.LocalJobStore()
+    job_queue = jobs.LocalJobQueue(lambda message: jobs.run(job_store, registry.dispatch, message))
+else:
+    job_store = jobs.S3JobStore(s3_client, bucket_name)
+    job_queue = jobs.SqsJobQueue(clients.client("sqs"), job_queue_url) if job_queue_url else None
+
+
+def get_tenant(event) -> Tenant:
+    """
+    Return the tenant of an agent event, from its tenant_id session attribute.
+
+    Raises:
+        KeyError: The tenant id is not configured.
     """
-    Retrieve the value of a named parameter from the event object.
+    return settings.tenant((event.get("sessionAttributes") or {}).get(TENANT_ATTRIBUTE))
+
+
+def submit_job(event, params):
+    """
+    Queue an asynchronous action and return its job id to the agent.
 
     Args:
-        event (dict): The event object containing parameters.
-        name (str): The name of the parameter to retrieve.
+        event (dict): The event object of the agent request.
+        params: The parsed request parameters (already validated).
 
     Returns:
-        The value of the named parameter or None if not found.
+        dict: A dictionary with 'body' (job id message) and 'response_code'.
     """
-    try:
-        return next(item for item in event["parameters"] if item["name"] == name)[
-            "value"
-        ]
-    except:
-        return None
+    job_id = jobs.submit(job_store, job_queue, event, get_tenant(event))
+    return {
+        "body": f"Job {job_id} submitted. The image will be ready in about a minute, check /job_status with job_id {job_id}.",
+        "response_code": 200,
+    }
 
 
-def get_weather(event):
+@registry.action("/weather")
+def get_weather(event, params):
     """
-    Retrieves current weather data from Open-Meteo API for the given location.
+    Retrieves weather data from Open-Meteo API for the given location: the current
+    weather, or the daily forecast when a date range is given.
 
     Args:
-        event (dict): The event object containing parameters including latitude and longitude.
+        event (dict): The event object of the agent request.
+        params: The parsed request parameters, including location_name and the
+            optional start_date and end_date (YYYY-MM-DD).
 
     Returns:
-        dict: A dictionary with 'body' containing the current weather data and 'response_code'.
+        dict: A dictionary with 'body' containing the weather data and 'response_code'.
     """
-    logger.info(f"Getting weather for event: {event}")
-    location_name = get_named_parameter(event, "location_name")
-    logger.info(f"Location name: {location_name}")
+    logger.info("Getting weather for event: %s", log_fields.capped(event))
+    location_name = params.location_name
+    logger.info("Location name: %s", location_name)
+
+    if params.start_date or params.end_date:
+        return get_forecast(location_name, params.start_date or params.end_date, params.end_date or params.start_date)
 
     latitude, longitude = get_location_coordinates(location_name)
     if not latitude or not longitude:
-        logger.warning(f"Could not find location coordinates for {location_name}")
-        raise Exception(f"Error: Could not find location {location_name}")
+        logger.warning("Could not find location coordinates for %s", location_name)
+        raise ActionError(f"Error: Could not find location {location_name}. Ask the user for another location.")
 
-    base_url = "https://api.open-meteo.com/v1/forecast"
-    params = {
+    query_params = {
         "latitude": latitude,
         "longitude": longitude,
         "current_weather": True,
-        "hourly": "temperature_2m,relativehumidity_2m,windspeed_10m",
+        "temperature_unit": "fahrenheit",
     }
 
-    response = requests.get(base_url, params=params, timeout=REQUEST_TIMEOUT)
+    with tracing.span("http_weather") as span:
+        response = requests.get(forecast.FORECAST_URL, params=query_params, timeout=REQUEST_TIMEOUT)
+        span.set("bytes", len(response.content))
 
     if response.status_code == 200:
         data = response.json()
@@ -85,57 +133,21 @@ def get_weather(event):
             "body": "There is no weather information for this location. Use default value.",
             "response_code": response_code,
         }
-        logger.warning(f"No weather data found for {location_name}")
+        logger.warning("No weather data found for %s", location_name)
         return results
 
-    payload = {
-        "taskType": "WEATHER",
-        "weatherParams": {
-            "location_name": location_name,  # Required
-        },
-    }
     weather_data = data
 
     if weather_data:
         current_weather = weather_data["current_weather"]
         temperature = current_weather["temperature"]
         weathercode = current_weather["weathercode"]
-        weather_code_dict = {
-            0: "Clear sky",
-            1: "Mainly clear",
-            2: "Partly cloudy",
-            3: "Overcast",
-            45: "Fog",
-            48: "Depositing rime fog",
-            51: "Drizzle: Light intensity",
-            53: "Drizzle: Moderate intensity",
-            55: "Drizzle: Dense intensity",
-            56: "Freezing Drizzle: Light intensity",
-            57: "Freezing Drizzle: Dense intensity",
-            61: "Rain: Slight intensity",
-            63: "Rain: Moderate intensity",
-            65: "Rain: Heavy intensity",
-            66: "Freezing Rain: Light intensity",
-            67: "Freezing Rain: Heavy intensity",
-            71: "Snow fall: Slight intensity",
-            73: "Snow fall: Moderate intensity",
-            75: "Snow fall: Heavy intensity",
-            77: "Snow grains",
-            80: "Rain showers: Slight intensity",
-            81: "Rain showers: Moderate intensity",
-            82: "Rain showers: Violent intensity",
-            85: "Snow showers: Slight intensity",
-            86: "Snow showers: Heavy intensity",
-            95: "Thunderstorm: Slight or moderate",
-            96: "Thunderstorm with slight hail",
-            99: "Thunderstorm with heavy hail",
-        }
         response_code = 200
         results = {
-            "body": f"Temperature is {temperature} in Fahrenheit. The weather description is {weather_code_dict[weathercode]}",
+            "body": f"Temperature is {temperature} in Fahrenheit. The weather description is {forecast.describe(weathercode)}",
             "response_code": response_code,
         }
-        logger.info(f"Weather results: {results}")
+        logger.info("Weather results: %s", log_fields.capped(results))
         return results
     else:
         response_code = 400
@@ -143,10 +155,57 @@ def get_weather(event):
             "body": "There is no weather information for this location. Use default value.",
             "response_code": response_code,
         }
-        logger.warning(f"No weather data found for {location_name}")
+        logger.warning("No weather data found for %s", location_name)
         return results
 
 
+def get_forecast(location_name, start_date, end_date):
+    """
+    Builds the daily forecast of a location for a date range, from the cached daily
+    summaries of the location when available.
+
+    Args:
+        location_name (str): The location indicated in the user query.
+        start_date (str): First day of the range, YYYY-MM-DD.
+        end_date (str): Last day of the range, YYYY-MM-DD.
+
+    Returns:
+        dict: A dictionary with 'body' containing one line per day and 'response_code'.
+    """
+    try:
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    except ValueError:
+        return {"body": "Invalid dates. Use the YYYY-MM-DD format.", "response_code": 400}
+    if end < start:
+        start, end = end, start
+
+    def fetch():
+        latitude, longitude = get_location_coordinates(location_name)
+        if not latitude or not longitude:
+            return None
+        return forecast.fetch_daily(latitude, longitude, REQUEST_TIMEOUT)
+
+    summaries = forecast.forecast_cache.get(location_name, fetch)
+    if not summaries:
+        logger.warning("No forecast found for %s", location_name)
+        return {
+            "body": "There is no weather information for this location. Use default value.",
+            "response_code": 400,
+        }
+    days = forecast.select(summaries, start, end)
+    if not days:
+        return {
+            "body": f"No forecast for these dates. Forecasts are available from {summaries[0].date} to {summaries[-1].date}.",
+            "response_code": 400,
+        }
+    results = {
+        "body": f"Daily forecast for {location_name}:\n" + "\n".join(day.describe() for day in days),
+        "response_code": 200,
+    }
+    logger.info("Weather results: %s", log_fields.capped(results))
+    return results
+
+
 def get_location_coordinates(location_name):
     """
     Calls the Open-Meteo Geocoding API to get the latitude and longitude
@@ -159,8 +218,9 @@ def get_location_coordinates(location_name):
         tuple: A tuple containing the latitude and longitude of the location,
                or None if the location is not found.
     """
-    url = f"https://geocoding-api.open-meteo.com/v1/search?name={location_name}"
-    response = requests.get(url, timeout=REQUEST_TIMEOUT)
+    with tracing.span("http_geocode") as span:
+        response = requests.get(forecast.GEOCODING_URL, params={"name": location_name}, timeout=REQUEST_TIMEOUT)
+        span.set("bytes", len(response.content))
     if response.status_code == 200:
         data = response.json()
         if data.get("results"):
@@ -175,7 +235,7 @@ def get_location_coordinates(location_name):
 
 
 def find_similar_image_in_opensearch_index(
-    image_path: str = "None", text: str = "None", k: int = 1
+    image_path: str = "None", text: str = "None", k: int = 1, session_id: str = None, tenant: Tenant = None
 ) -> List:
     """
     Find similar images in the OpenSearch index based on image path or text query.
@@ -184,63 +244,129 @@ def find_similar_image_in_opensearch_index(
         image_path (str): Path to the input image in S3. Defaults to "None".
         text (str): Text query for image search. Defaults to "None".
         k (int): Number of similar images to retrieve. Defaults to 1.
+        session_id (str): The agent session, used to cache the input image.
+        tenant (Tenant): The tenant whose index is searched. Defaults to the default tenant.
 
     Returns:
-        List: List of retrieved images as byte strings.
+        List: List of retrieved images as (catalog id, document source) tuples.
     """
-    logger.info(
-        f"Finding similar image with params: image_path={image_path}, text={text}, k={k}"
-    )
-    # Create the client with SSL/TLS enabled, but hostname verification disabled.
-    if host is None:
-        logger.warning("Host is None, returning None")
+    tenant = tenant or settings.tenant()
+    logger.info("Finding similar image with params: image_path=%s, text=%s, k=%s", image_path, text, k)
+    if not host:
+        logger.warning("No OpenSearch host is set, returning None")
         return None
-    credentials = boto3.session.Session().get_credentials()
-    aws_auth = AWSV4SignerAuth(credentials, region, "aoss")
-    opensearch_client = OpenSearch(
-        hosts=[{"host": host, "port": 443}],
-        http_auth=aws_auth,
-        use_ssl=True,
-        verify_certs=True,
-        connection_class=RequestsHttpConnection,
-        pool_maxsize=20,
-        timeout=3000,
-    )
+    opensearch_client = get_opensearch_client()
     if (image_path != "None") or (text != "None"):
-        _, embedding = get_titan_multimodal_embedding(image_path=image_path, text=text)
-    query = {
-        "size": 5,
-        "query": {"knn": {"vector_field": {"vector": embedding["embedding"], "k": k}}},
-    }
+        _, embedding = get_titan_multimodal_embedding(
+            image_path=image_path, text=text, session_id=session_id
+        )
+    query = retrieval.knn_query(embedding["embedding"], k)
     # search for documents in the index with the given query
-    response = opensearch_client.search(index=index_name, body=query)
-    retrieved_images = []
-    for hit in response["hits"]["hits"]:
-        # only retrieve the image if the matching-score is more than a certain pre-defined threshold.
-        if hit["_score"] > RETRIEVE_THRESHOLD:
-            image = hit["_source"]["image_b64"]
-            img = base64.b64decode(image)
-            retrieved_images.append(img)
-
-    logger.info(f"Retrieved {len(retrieved_images)} similar images")
+    with tracing.span("opensearch_search") as span:
+        response = opensearch_client.search(index=tenant.index_name, body=query)
+        span.set("hits", len(response["hits"]["hits"]))
+    # only retrieve the image if the matching-score is more than a certain pre-defined threshold.
+    retrieved_images = catalog_hits(retrieval.matching_hits(response["hits"]["hits"]))
+
+    logger.info("Retrieved %d similar images", len(retrieved_images))
     return retrieved_images
 
 
-def image_lookup(event, host):
+def get_opensearch_client():
+    """Return the SigV4-signed OpenSearch Serverless client, created once per container."""
+    global opensearch_client
+    if opensearch_client is None:
+        opensearch_client = clients.opensearch(settings)
+    return opensearch_client
+
+
+def catalog_hits(hits: list) -> List:
+    """Reduce search hits to (catalog id, document source) tuples, see retrieval.catalog_id."""
+    return [(retrieval.catalog_id(hit), hit["_source"]) for hit in hits]
+
+
+def get_catalog_id(image_path: str, tenant: Tenant):
+    """
+    Return the catalog id recorded on an image returned by an earlier lookup, or None.
+
+    Args:
+        image_path (str): The S3 location URI of the image.
+        tenant (Tenant): The tenant of the lookup. Only its own images are trusted,
+            catalog ids of another catalog mean nothing in its neighbour lists.
+    """
+    prefix = f"s3://{bucket_name}/"
+    if not image_path.startswith(prefix) or settings.tenant_for_key(image_path[len(prefix) :]) != tenant:
+        return None
+    try:
+        with tracing.span("s3_head"):
+            response = s3_client.head_object(Bucket=bucket_name, Key=image_path[len(prefix) :])
+    except Exception as e:
+        logger.warning("Could not read the metadata of %s: %s", image_path, e)
+        return None
+    return response.get("Metadata", {}).get(neighbours.CATALOG_ID_METADATA)
+
+
+def find_catalog_neighbours(catalog_id: str, k: int = 1, tenant: Tenant = None):
+    """
+    Find the images most similar to a catalog image from the precomputed neighbour lists.
+
+    Args:
+        catalog_id (str): The image id of the catalog document.
+        k (int): Number of similar images to retrieve. Defaults to 1.
+        tenant (Tenant): The tenant of the catalog. Defaults to the default tenant.
+
+    Returns:
+        List: List of retrieved images as (catalog id, document source) tuples, or None
+        if the document has no precomputed neighbours or they are no longer indexed.
+    """
+    tenant = tenant or settings.tenant()
+    entries = neighbours.lookup(s3_client, bucket_name, catalog_id, tenant.neighbours_key)
+    if entries is None:
+        return None
+    neighbour_ids = [neighbour_id for neighbour_id, score in entries if score > retrieval.RETRIEVE_THRESHOLD][:k]
+    if not neighbour_ids:
+        return []
+    with tracing.span("opensearch_search") as span:
+        response = get_opensearch_client().search(
+            index=tenant.index_name, body=retrieval.catalog_ids_query(neighbour_ids)
+        )
+        span.set("hits", len(response["hits"]["hits"]))
+    found = {retrieval.catalog_id(hit): hit for hit in response["hits"]["hits"]}
+    missing = [neighbour_id for neighbour_id in neighbour_ids if neighbour_id not in found]
+    if missing:
+        # The neighbour table was built from another catalog than the one indexed
+        logger.warning(
+            "Neighbours %s of catalog image %s are not in %s, rebuild the neighbour table with "
+            "tools/catalog_neighbours.py",
+            missing,
+            catalog_id,
+            tenant.index_name,
+        )
+        tracing.incr("neighbour_index_stale")
+        return None
+    logger.info("Retrieved %d precomputed neighbours of catalog image %s", len(neighbour_ids), catalog_id)
+    # keep the neighbour order, the terms query does not rank
+    return catalog_hits([found[neighbour_id] for neighbour_id in neighbour_ids])
+
+
+@registry.action("/image_lookup")
+def image_lookup(event, params):
     """
     Perform image lookup based on input image or query.
 
     Args:
-        event (dict): The event object containing input parameters.
-        host (str): The host address for the opensearch instance.
+        event (dict): The event object of the agent request.
+        params: The parsed request parameters, input_image and input_query.
 
     Returns:
         dict: A dictionary with 'body' (image location or error message) and 'response_code'.
     """
-    logger.info(f"Image lookup for event: {event}")
-    input_image = get_named_parameter(event, "input_image")
-    input_query = get_named_parameter(event, "input_query")
-    logger.info(f"Input image: {input_image}, Input query: {input_query}")
+    logger.info("Image lookup for event: %s", log_fields.capped(event))
+    tenant = get_tenant(event)
+    input_image = params.input_image
+    input_query = params.input_query
+    # tools/query_embedding_warmup.py mines this line for frequent queries
+    logger.info("Input image: %s, Input query: %s", input_image, input_query)
 
     if not host:
         logger.warning("No database available for image lookup")
@@ -250,9 +376,16 @@ def image_lookup(event, host):
         }
 
     if (input_query != "None") or (input_image != "None"):
-        similar_img_b64 = find_similar_image_in_opensearch_index(
-            image_path=input_image, text=input_query, k=1
-        )
+        similar_images = None
+        if input_query in (None, "None", ""):
+            # A catalog image returned by an earlier lookup has static neighbours
+            catalog_id = get_catalog_id(input_image, tenant)
+            if catalog_id:
+                similar_images = find_catalog_neighbours(catalog_id, k=1, tenant=tenant)
+        if similar_images is None:
+            similar_images = find_similar_image_in_opensearch_index(
+                image_path=input_image, text=input_query, k=1, session_id=event.get("sessionId"), tenant=tenant
+            )
     else:
         # If none of the two possible inputs is provided. Return 404
         logger.warning("No valid inputs provided for image lookup")
@@ -261,91 +394,244 @@ def image_lookup(event, host):
             "response_code": 404,
         }
     try:
-        if similar_img_b64:
-            image_data = BytesIO(similar_img_b64[0])
-
-            rand_suffix = randint(0, 1000000)
-            file_name = f"lookup_image_{rand_suffix}.jpg"
-            output_key = "OutputImages/" + file_name
-            output_s3_location = "s3://" + bucket_name + "/" + output_key
-            s3_client.upload_fileobj(image_data, bucket_name, output_key)
+        if similar_images:
+            output_s3_location = store_lookup_image(*similar_images[0], tenant=tenant)
             response = {"body": output_s3_location, "response_code": 200}
         else:
             response = {"body": "", "response_code": 400}
     except Exception as e:
-        logger.error(f"Error in image lookup: {str(e)}")
+        logger.error("Error in image lookup: %s", e)
         response = {
             "body": "Something went wrong",
             "response_code": 400,
         }
     # If the response_code is 400 - return the original input image
-    if input_image and (input_image != "None"):
+    if response["response_code"] == 400 and input_image and (input_image != "None"):
         response["body"] = input_image
 
-    logger.info(f"Image lookup response: {response}")
+    logger.info("Image lookup response: %s", log_fields.capped(response))
     return response
 
 
-def inpaint(event):
+def store_lookup_image(catalog_id: str, source: dict, tenant: Tenant = None) -> str:
+    """
+    Return the S3 location of an image found by a lookup, with its catalog id in the
+    S3 metadata.
+
+    Documents ingested with the ``s3_uri`` of their catalog object are served without
+    moving image bytes through the Lambda: the canonical object when it is in the agent
+    bucket, otherwise a server-side copy. Older documents only hold the image inline
+    and are uploaded.
+
+    Args:
+        catalog_id (str): The image id of the catalog document, None if it has none.
+        source (dict): The document source, with ``s3_uri`` or ``image_b64``.
+        tenant (Tenant): The tenant the image is stored for. Defaults to the default tenant.
+
+    Returns:
+        str: The S3 location URI of the image.
+    """
+    tenant = tenant or settings.tenant()
+    if source.get("s3_uri"):
+        return copy_catalog_image(catalog_id, source["s3_uri"], tenant)
+    with tracing.span("b64_decode", bytes=len(source["image_b64"])):
+        image_bytes = base64.b64decode(source["image_b64"])
+    # Catalog images are content-addressed, an image found before is not uploaded again
+    output_key = storage.content_key(image_bytes, tenant.key(storage.EPHEMERAL))
+    if not storage.exists(s3_client, bucket_name, output_key):
+        with tracing.span("s3_put", bytes=len(image_bytes)):
+            s3_client.upload_fileobj(
+                BytesIO(image_bytes),
+                bucket_name,
+                output_key,
+                ExtraArgs={"Metadata": {neighbours.CATALOG_ID_METADATA: catalog_id} if catalog_id else {}},
+            )
+    return storage.uri(bucket_name, output_key)
+
+
+def copy_catalog_image(catalog_id: str, catalog_uri: str, tenant: Tenant) -> str:
+    """
+    Return a catalog image stored in S3, copying it server-side into the agent bucket
+    if it lives elsewhere.
+
+    Returns:
+        str: The S3 location URI of the image.
+    """
+    source_bucket, source_key = catalog_uri.replace("s3://", "").split("/", 1)
+    if source_bucket == bucket_name:
+        # the notebook records the image id on the canonical object at ingestion
+        return catalog_uri
+    output_key = storage.copy_key(catalog_uri, tenant.key(storage.EPHEMERAL))
+    if not storage.exists(s3_client, bucket_name, output_key):
+        with tracing.span("s3_copy"):
+            s3_client.copy_object(
+                Bucket=bucket_name,
+                Key=output_key,
+                CopySource={"Bucket": source_bucket, "Key": source_key},
+                Metadata={neighbours.CATALOG_ID_METADATA: catalog_id} if catalog_id else {},
+                MetadataDirective="REPLACE",
+            )
+    return storage.uri(bucket_name, output_key)
+
+
+@registry.action("/batch_image_lookup")
+def batch_image_lookup(event, params):
+    """
+    Find one catalog image per query in a single action, e.g. every item of an outfit.
+
+    The queries are embedded concurrently, searched with one _msearch request, and
+    the matching images are stored in parallel.
+
+    Args:
+        event (dict): The event object of the agent request.
+        params: The parsed request parameters, queries.
+
+    Returns:
+        dict: A dictionary with 'body' (JSON list of {"query", "image"} objects, image
+        being null when nothing matched) and 'response_code'.
+    """
+    tenant = get_tenant(event)
+    queries = [query for query in params.queries if query != "None"][:MAX_BATCH_QUERIES]
+    logger.info("Batch image lookup for queries: %s", log_fields.capped(queries))
+    if not host:
+        logger.warning("No database available for image lookup")
+        return {
+            "body": "No database available for image look_up, try other actions.",
+            "response_code": 404,
+        }
+    if not queries:
+        return {"body": "No valid queries provided. Ask user to describe the items", "response_code": 404}
+
+    try:
+        embeddings = list(
+            lookup_executor.map(tracing.propagate(lambda query: get_titan_multimodal_embedding(text=query)[1]), queries)
+        )
+        body = []
+        for embedding in embeddings:
+            body.append({"index": tenant.index_name})
+            body.append(retrieval.knn_query(embedding["embedding"], k=1))
+        with tracing.span("opensearch_msearch") as span:
+            responses = get_opensearch_client().msearch(body=body)["responses"]
+            span.set("queries", len(queries))
+        winners = []
+        for response in responses:
+            hits = retrieval.matching_hits(response.get("hits", {}).get("hits", []))
+            winners.append(catalog_hits(hits[:1])[0] if hits else None)
+        locations = list(
+            lookup_executor.map(
+                tracing.propagate(lambda winner: store_lookup_image(*winner, tenant=tenant) if winner else None),
+                winners,
+            )
+        )
+    except Exception as e:
+        logger.error("Batch image lookup failed: %s", e)
+        return {
+            "body": f"Something went wrong: {log_fields.error_text(e)}",
+            "response_code": 400,
+        }
+    results = [{"query": query, "image": location} for query, location in zip(queries, locations)]
+    logger.info("Batch image lookup response: %s", log_fields.capped(results))
+    return {"body": json.dumps(results), "response_code": 200}
+
+
+@registry.action("/inpaint", asynchronous=True)
+def inpaint(event, params):
     """
     Perform image inpainting based on the provided event parameters.
 
     Args:
-        event (dict): The event object containing inpainting parameters.
+        event (dict): The event object of the agent request.
+        params: The parsed inpainting parameters, text, mask, image_location and the
+            optional mask_image, render_tier and seed.
 
     Returns:
-        dict: A dictionary with 'body' (output image location or error message) and 'response_code'.
+        dict: A dictionary with 'body' (JSON with the output image location, render_tier
+        and seed, or error message) and 'response_code'.
     """
-    prompt_text = get_named_parameter(event, "text")
-    prompt_mask = get_named_parameter(event, "mask")
-    input_image = get_named_parameter(event, "image_location")
+    prompt_text = params.text
+    prompt_mask = params.mask
+    input_image = params.image_location
+    tier = render_tiers.resolve(params.render_tier)
+    seed = params.seed if params.seed is not None else randint(0, render_tiers.MAX_SEED)
 
     try:
-        encoded_image = load_image_from_s3(input_image)
-        payload = {
-            "taskType": "INPAINTING",
-            "inPaintingParams": {
-                "text": prompt_text,
-                "negativeText": "bad quality, low resolution",  # Optional
-                "image": encoded_image,  # Required
-                "maskPrompt": prompt_mask,  # One of "maskImage" or "maskPrompt" is required
-            },
+        encoded_image = load_image_from_s3(input_image, event.get("sessionId"))
+        # Edits are versioned per session, and supplied masks are cached per region of the chain
+        chain = edit_sessions.chain_prefix(event.get("sessionId"), input_image, get_tenant(event).prefix)
+        mask_key = edit_sessions.mask_key(chain, prompt_mask)
+        if params.mask_image:
+            encoded_mask = load_image_from_s3(params.mask_image, event.get("sessionId"))
+            edit_sessions.put_mask(s3_client, bucket_name, mask_key, base64.b64decode(encoded_mask))
+        else:
+            encoded_mask = edit_sessions.get_mask(s3_client, bucket_name, mask_key)
+        inpainting_params = {
+            "text": prompt_text,
+            "negativeText": "bad quality, low resolution",  # Optional
+            "image": encoded_image,  # Required
+            "maskPrompt": prompt_mask,  # One of "maskImage" or "maskPrompt" is required
         }
-        result = titan_image(payload)[0]
+        result = None
+        if encoded_mask:
+            mask_params = {k: v for k, v in inpainting_params.items() if k != "maskPrompt"}
+            mask_params["maskImage"] = encoded_mask
+            try:
+                result = titan_image(
+                    {"taskType": "INPAINTING", "inPaintingParams": mask_params}, seed=seed, tier=tier
+                )[0]
+            except Exception as e:
+                # e.g. a cached mask that no longer matches the image size
+                logger.warning("Inpainting with the cached mask failed, segmenting again: %s", e)
+                encoded_mask = None
+        if result is None:
+            result = titan_image(
+                {"taskType": "INPAINTING", "inPaintingParams": inpainting_params}, seed=seed, tier=tier
+            )[0]
         if result:
-            image_data = BytesIO(result)
-            output_key = "OutputImages/" + input_image.split("/")[-1]
-            output_s3_location = "s3://" + bucket_name + "/" + output_key
-            s3_client.upload_fileobj(image_data, bucket_name, output_key)
+            metadata = {
+                **render_tiers.object_metadata(tier, seed),
+                **edit_sessions.mask_metadata(prompt_mask, mask_image=bool(encoded_mask)),
+            }
+            output_key = edit_sessions.put_version(s3_client, bucket_name, chain, result, metadata)
+            if encoded_mask:
+                edit_sessions.put_version_mask(s3_client, bucket_name, output_key, base64.b64decode(encoded_mask))
+            postprocess.store_variants(s3_client, result, bucket_name, output_key, metadata, variants=("thumbnail",))
+            output_s3_location = f"s3://{bucket_name}/{output_key}"
     except Exception as e:
+        logger.error("Inpainting failed: %s", e)
         response_code = 400
         results = {
-            "body": f"Image cannot be inpainted, please try again: see error {e}",
+            "body": f"Image cannot be inpainted, please try again: see error {log_fields.error_text(e)}",
             "response_code": response_code,
         }
         return results
 
     response_code = 200
-    results = {"body": output_s3_location, "response_code": response_code}
+    results = {"body": render_tiers.response_body(output_s3_location, tier, seed), "response_code": response_code}
     return results
 
 
-def outpaint(event):
+@registry.action("/outpaint", asynchronous=True)
+def outpaint(event, params):
     """
     Perform image outpainting based on the provided event parameters.
 
     Args:
-        event (dict): The event object containing outpainting parameters.
+        event (dict): The event object of the agent request.
+        params: The parsed outpainting parameters, text, mask, image_location and the
+            optional render_tier and seed.
 
     Returns:
-        dict: A dictionary with 'body' (output image location or error message) and 'response_code'.
+        dict: A dictionary with 'body' (JSON with the output image location, render_tier
+        and seed, or error message) and 'response_code'.
     """
-    prompt_text = get_named_parameter(event, "text")
-    prompt_mask = get_named_parameter(event, "mask")
-    input_image = get_named_parameter(event, "image_location")
+    prompt_text = params.text
+    prompt_mask = params.mask
+    input_image = params.image_location
+    tier = render_tiers.resolve(params.render_tier)
+    seed = params.seed if params.seed is not None else randint(0, render_tiers.MAX_SEED)
 
     try:
-        encoded_image = load_image_from_s3(input_image)
+        encoded_image = load_image_from_s3(input_image, event.get("sessionId"))
         payload = {
             "taskType": "OUTPAINTING",
             "outPaintingParams": {
@@ -355,39 +641,50 @@ def outpaint(event):
                 "outPaintingMode": "PRECISE",  # One of "PRECISE" or "DEFAULT"
             },
         }
-        result = titan_image(payload)[0]
+        result = titan_image(payload, seed=seed, tier=tier)[0]
 
         if result:
-            image_data = BytesIO(result)
-            output_key = "OutputImages/" + input_image.split("/")[-1]
-            output_s3_location = "s3://" + bucket_name + "/" + output_key
-            s3_client.upload_fileobj(image_data, bucket_name, output_key)
+            chain = edit_sessions.chain_prefix(event.get("sessionId"), input_image, get_tenant(event).prefix)
+            metadata = {
+                **render_tiers.object_metadata(tier, seed),
+                **edit_sessions.mask_metadata(prompt_mask, mask_image=False),
+            }
+            output_key = edit_sessions.put_version(s3_client, bucket_name, chain, result, metadata)
+            postprocess.store_variants(s3_client, result, bucket_name, output_key, metadata, variants=("thumbnail",))
+            output_s3_location = f"s3://{bucket_name}/{output_key}"
 
     except Exception as e:
+        logger.error("Outpainting failed: %s", e)
         response_code = 400
         results = {
-            "body": f"Image cannot be outpainted, please try again: see error{e}",
+            "body": f"Image cannot be outpainted, please try again: see error {log_fields.error_text(e)}",
             "response_code": response_code,
         }
         return results
 
     response_code = 200
-    results = {"body": output_s3_location, "response_code": response_code}
+    results = {"body": render_tiers.response_body(output_s3_location, tier, seed), "response_code": response_code}
     return results
 
 
-def get_image_gen(event):
+@registry.action("/imageGeneration", asynchronous=True)
+def get_image_gen(event, params):
     """
     Generate an image based on the provided event parameters.
 
     Args:
-        event (dict): The event object containing image generation parameters.
+        event (dict): The event object of the agent request.
+        params: The parsed image generation parameters, input_query, weather and the
+            optional render_tier and seed.
 
     Returns:
-        dict: A dictionary with 'body' (generated image location or error message) and 'response_code'.
+        dict: A dictionary with 'body' (JSON with the generated image location, render_tier
+        and seed, or error message) and 'response_code'.
     """
-    input_query = get_named_parameter(event, "input_query")
-    weather = get_named_parameter(event, "weather")
+    input_query = params.input_query
+    weather = params.weather
+    tier = render_tiers.resolve(params.render_tier)
+    seed = params.seed if params.seed is not None else 0
 
     # Read image from file and encode it as base64 string.
 
@@ -401,75 +698,93 @@ def get_image_gen(event):
             {
                 "taskType": "TEXT_IMAGE",
                 "textToImageParams": {"text": prompt},
-                "imageGenerationConfig": {
-                    "numberOfImages": 1,
-                    "height": 1024,
-                    "width": 1024,
-                    "cfgScale": 10.0,
-                    "seed": 0,
-                },
+                "imageGenerationConfig": render_tiers.generation_config(tier, seed),
             }
         )
 
-        accept = "application/json"
-        content_type = "application/json"
         model_id = "amazon.titan-image-generator-v2:0"
 
-        response = bedrock_client.invoke_model(
-            body=body, modelId=model_id, accept=accept, contentType=content_type
+        # Raises if the response holds an error instead of an image
+        image_bytes = invoke_model(
+            model_id,
+            body,
+            parse=postprocess.extract_first_image,
+            span_name=f"bedrock_image_{tier}",
         )
-        response_body = json.loads(response.get("body").read())
-
-        finish_reason = response_body.get("error")
-        if finish_reason is not None:
-            raise Exception(f"Image generation error. Error is {finish_reason}")
-
-        base64_image = response_body.get("images")[0]
-        base64_bytes = base64_image.encode("ascii")
-        image_bytes = base64.b64decode(base64_bytes)
-
-        image_data = BytesIO(image_bytes)
-
-        rand_suffix = randint(0, 1000000)
-        file_name = f"gen_image_{rand_suffix}.jpg"
-        output_key = "OutputImages/" + file_name
-        s3_client.upload_fileobj(image_data, bucket_name, output_key)
+        render_tiers.record(tier)
+
+        # Final renders are kept, previews expire with the other ephemeral images
+        prefix = get_tenant(event).key(storage.PERSISTED if tier == "final" else storage.EPHEMERAL)
+        output_key = storage.content_key(image_bytes, prefix)
+        if not storage.exists(s3_client, bucket_name, output_key):
+            postprocess.store_variants(
+                s3_client,
+                image_bytes,
+                bucket_name,
+                output_key,
+                metadata=render_tiers.object_metadata(tier, seed),
+            )
     except Exception as e:
+        logger.error("Image generation failed: %s", e)
         response_code = 400
         results = {
-            "body": f"Image cannot be generated, please try again: see error {e}",
+            "body": f"Image cannot be generated, please try again: see error {log_fields.error_text(e)}",
             "response_code": response_code,
         }
         return results
 
     response_code = 200
     output_s3_location = f"s3://{bucket_name}/{output_key}"
-    results = {"body": output_s3_location, "response_code": response_code}
+    results = {"body": render_tiers.response_body(output_s3_location, tier, seed), "response_code": response_code}
 
     return results
 
 
-def load_image_from_s3(image_path: str):
+@registry.action("/job_status")
+def job_status(event, params):
+    """
+    Report the status of a job submitted in job mode.
+
+    Args:
+        event (dict): The event object of the agent request.
+        params: The parsed request parameters, job_id.
+
+    Returns:
+        dict: A dictionary with 'body' (result S3 location or status message) and 'response_code'.
+    """
+    # Jobs are only visible to the tenant and the agent session that submitted them
+    status = jobs.find(job_store, params.job_id, get_tenant(event), event.get("sessionId"))
+    if status is None:
+        return {"body": f"No job found with id {params.job_id}", "response_code": 404}
+    if status["status"] == jobs.SUCCEEDED:
+        return {"body": status["result"], "response_code": 200}
+    if status["status"] == jobs.FAILED:
+        return {"body": status["result"], "response_code": 400}
+    return {
+        "body": f"Job {params.job_id} is still {status['status']}, check again shortly.",
+        "response_code": 200,
+    }
+
+
+def load_image_from_s3(image_path: str, session_id: str = None):
     """
     Load an image from S3 and encode it as a base64 string.
 
+    Images are cached per session, so an image used by several actions of a
+    conversation is only downloaded again if it changed.
+
     Args:
         image_path (str): The S3 path of the image to load.
+        session_id (str): The agent session the image is used in.
 
     Returns:
         str: Base64 encoded image content or None if there's an error.
     """
     try:
-        s3 = boto3.client("s3")
-        _bucket_name, object_key = image_path.replace("s3://", "").split("/", 1)
-        response = s3.get_object(Bucket=_bucket_name, Key=object_key)
-        # Read the object's body
-        image_content = response["Body"].read()
-        # Encode the body in bytes & decode it into a string.
-        image_encoded = base64.b64encode(image_content).decode("utf8")
+        image_encoded = image_cache.image_cache.load(s3_client, image_path, session_id)
 
     except Exception as e:
-        print(f"Error downloading file from S3: {e}")
+        logger.error("Error downloading file from S3: %s", e)
         return None
 
     return image_encoded
@@ -478,6 +793,7 @@ def load_image_from_s3(image_path: str):
 def get_titan_multimodal_embedding(
     image_path: str = "None",
     text: str = "None",
+    session_id: str = None,
 ):
     """
     This function reads the image path, and gets the embeddings by calling Titan Multimodal Embeddings model Amazon Bedrock.
@@ -485,21 +801,18 @@ def get_titan_multimodal_embedding(
     Args:
         image_path (str): Path to the input image. Defaults to "None".
         text (str): Text input for embedding. Defaults to "None".
+        session_id (str): The agent session, used to cache the input image.
 
     Returns:
-        tuple: A tuple containing payload_body and vector (embeddings).
+        tuple: A tuple containing payload_body and vector (embeddings), the embedding
+        being a float32 ``array``.
     """
 
-    embedding_config = {
-        # OutputEmbeddingLength has to be one of: [256, 384, 1024],
-        "embeddingConfig": {"outputEmbeddingLength": embeddingSize}
-    }
-
     payload_body = {}
 
     if image_path and image_path != "None":
         if image_path.startswith("s3"):
-            payload_body["inputImage"] = load_image_from_s3(image_path)
+            payload_body["inputImage"] = load_image_from_s3(image_path, session_id)
         else:
             with open(image_path, "rb") as image_file:
                 input_image = base64.b64encode(image_file.read()).decode("utf8")
@@ -508,15 +821,22 @@ def get_titan_multimodal_embedding(
         payload_body["inputText"] = text
 
     if (image_path == "None") and (text == "None"):
-        print("please provide either an image and/or a text description")
+        logger.warning("please provide either an image and/or a text description")
 
-    response = bedrock_client.invoke_model(
-        body=json.dumps({**payload_body, **embedding_config}),
-        modelId="amazon.titan-embed-image-v1",
-        accept="application/json",
-        contentType="application/json",
+    if "inputImage" not in payload_body and "inputText" in payload_body:
+        # Frequent text queries are embedded ahead of time, see tools/query_embedding_warmup.py
+        precomputed = query_embeddings.lookup(s3_client, bucket_name, text, embeddingSize)
+        if precomputed is not None:
+            return (payload_body, {"embedding": precomputed})
+
+    vector = invoke_model(
+        retrieval.EMBEDDING_MODEL_ID,
+        # OutputEmbeddingLength has to be one of: [256, 384, 1024],
+        json.dumps(retrieval.embedding_request(embeddingSize, payload_body.get("inputImage"), text)),
+        # The embedding stays a float32 array up to the kNN query body
+        parse=vectors.parse_embedding,
+        span_name="bedrock_embed",
     )
-    vector = json.loads(response.get("body").read())
     return (payload_body, vector)
 
 
@@ -526,6 +846,7 @@ def titan_image(
     cfg: float = 10.0,
     seed: int = None,
     modelId: str = "amazon.titan-image-generator-v2",
+    tier: str = render_tiers.DEFAULT_TIER,
 ) -> list:
     """
     Generate images using the Titan Image Generator model.
@@ -536,42 +857,26 @@ def titan_image(
         cfg (float): Scale for classifier-free guidance. Defaults to 10.0.
         seed (int): Seed for random number generation. Defaults to None.
         modelId (str): ID of the Titan model to use. Defaults to "amazon.titan-image-generator-v2".
+        tier (str): The render tier, "preview" or "final". Defaults to the configured default tier.
 
     Returns:
         list: List of generated images as byte strings.
     """
-    #   ImageGenerationConfig Options:
-    #   - numberOfImages: Number of images to be generated
-    #   - quality: Quality of generated images, can be standard or premium
-    #   - height: Height of output image(s)
-    #   - width: Width of output image(s)
-    #   - cfgScale: Scale for classifier-free guidance
-    #   - seed: The seed to use for reproducibility
-    seed = seed if seed is not None else randint(0, 214783647)
+    # The editing tasks keep the resolution of the input image, the tier sets the quality
+    seed = seed if seed is not None else randint(0, render_tiers.MAX_SEED)
 
     params = {
-        "imageGenerationConfig": {
-            "numberOfImages": num_image,  # Range: 1 to 5
-            "quality": "premium",  # Options: standard/premium
-            "height": 1024,  # Supported height list above
-            "width": 1024,  # Supported width list above
-            "cfgScale": cfg,  # Range: 1.0 (exclusive) to 10.0
-            "seed": seed,  # Range: 0 to 214783647
-        }
+        "imageGenerationConfig": render_tiers.generation_config(
+            tier, seed, cfg=cfg, num_image=num_image, edit=True
+        )
     }
     body = json.dumps({**payload, **params})
 
-    response = bedrock_client.invoke_model(
-        body=body,
-        modelId=modelId,
-        accept="application/json",
-        contentType="application/json",
+    # The first image is decoded straight from the response stream
+    image_bytes = invoke_model(
+        modelId, body, parse=postprocess.extract_first_image, span_name=f"bedrock_image_{tier}"
     )
-
-    response_body = json.loads(response.get("body").read())
-    base64_image = response_body.get("images")[0]
-    base64_bytes = base64_image.encode("ascii")
-    image_bytes = base64.b64decode(base64_bytes)
+    render_tiers.record(tier, num_image, edit=True)
 
     images = [
         image_bytes
@@ -579,6 +884,7 @@ def titan_image(
     return images
 
 
+@profiling.profiled
 def lambda_handler(event, context):
     """
     AWS Lambda function handler for bedrock agents.
@@ -590,26 +896,23 @@ def lambda_handler(event, context):
     Returns:
         dict: A dictionary containing the action response, including 'statusCode', 'headers', and 'body'.
     """
-    logger.info(f"Received event: {event}")
+    log_fields.sample_invocation()
+    logger.info("Received event: %s", log_fields.capped(event))
     response_code = 200
     action_group = event["actionGroup"]
     api_path = event["apiPath"]
 
-    logger.info(f"Processing action: {action_group}, API path: {api_path}")
-
-    if api_path == "/imageGeneration":
-        result = get_image_gen(event)
-    elif api_path == "/weather":
-        result = get_weather(event)
-    elif api_path == "/image_lookup":
-        result = image_lookup(event, host)
-    elif api_path == "/inpaint":
-        result = inpaint(event)
-    elif api_path == "/outpaint":
-        result = outpaint(event)
-    else:
-        logger.warning(f"Unknown API path: {api_path}")
-        result = {"body": "Unknown API path", "response_code": 400}
+    logger.info("Processing action: %s, API path: %s", action_group, api_path)
+
+    request_id = getattr(context, "aws_request_id", None)
+    with tracing.invocation(api_path, request_id):
+        try:
+            get_tenant(event)
+        except KeyError as e:
+            logger.warning("Unknown tenant: %s", e)
+            result = {"body": "Unknown tenant", "response_code": 400}
+        else:
+            result = registry.dispatch(event, submit_job if JOB_MODE and job_queue else None)
 
     body = result["body"]
     response_code = result["response_code"]
@@ -626,5 +929,29 @@ def lambda_handler(event, context):
         },
     }
 
-    logger.info(f"Returning response: {action_response}")
+    logger.info("Returning response: %s", log_fields.capped(action_response))
     return action_response
+
+
+@profiling.profiled
+def job_handler(event, context):
+    """
+    AWS Lambda function handler for the job worker, fed by the job SQS queue.
+
+    Args:
+        event (dict): The SQS event with one job message per record.
+        context (object): Runtime information provided by AWS Lambda.
+
+    Returns:
+        dict: The batch item failures, so only failed messages are retried.
+    """
+    failures = []
+    for record in event["Records"]:
+        try:
+            message = json.loads(record["body"])
+            with tracing.invocation(message["event"]["apiPath"], record.get("messageId")):
+                jobs.run(job_store, registry.dispatch, message)
+        except Exception as e:
+            logger.error("Could not process job message %s: %s", record.get("messageId"), e)
+            failures.append({"itemIdentifier": record["messageId"]})
+    return {"batchItemFailures": failures}
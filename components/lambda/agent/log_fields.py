@@ -0,0 +1,99 @@
+"""
+Size-capped, redacted and lazily formatted values for the Lambda logs.
+
+Agent events and responses can carry large inline content (base64 images, long
+prompts, session attributes). Log them through ``capped``, with %-style arguments:
+
+    logger.info("Received event: %s", log_fields.capped(event))
+
+Nothing is formatted unless the record is emitted. When it is, the value is written
+as compact JSON with long strings cut to ``log_max_field_chars``, long lists cut,
+base64 payloads replaced by their size and the keys in ``REDACTED_KEYS`` (plus the
+``log_redact_keys`` setting, ``logging.redact_keys`` in config.yml) masked, as are the
+values of agent parameters (``{"name": ..., "value": ...}``) named like them. One
+invocation in ``1 / log_payload_sample_rate`` logs its payloads in full, still
+redacted.
+"""
+
+import json
+import random
+import re
+
+from fashion_common import get_settings
+
+MAX_FIELD_CHARS = get_settings().log_max_field_chars
+MAX_LIST_ITEMS = 10
+SAMPLE_RATE = get_settings().log_payload_sample_rate
+REDACTED_KEYS = {
+    "authorization",
+    "password",
+    "secret",
+    "token",
+    *get_settings().log_redact_keys,
+}
+REDACTED = "[redacted]"
+
+_BASE64 = re.compile(r"^[A-Za-z0-9+/=]+$")
+_sampled = False
+
+
+def sample_invocation() -> bool:
+    """Decide whether the current invocation logs its payloads in full."""
+    global _sampled
+    _sampled = SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+    return _sampled
+
+
+def _is_secret(key) -> bool:
+    return str(key).lower() in REDACTED_KEYS
+
+
+def _cap_string(value: str, full: bool) -> str:
+    if len(value) > MAX_FIELD_CHARS and _BASE64.match(value[:MAX_FIELD_CHARS]):
+        # base64 payloads are never useful in logs, even sampled ones
+        return f"<{len(value)} chars of base64>"
+    if full or len(value) <= MAX_FIELD_CHARS:
+        return value
+    return f"{value[:MAX_FIELD_CHARS]}...<{len(value)} chars>"
+
+
+def summarize(value, full: bool = False):
+    """Return a copy of ``value`` with long strings and lists cut and secrets masked."""
+    if isinstance(value, str):
+        return _cap_string(value, full)
+    if isinstance(value, dict):
+        # Agent parameters and request properties are {"name": ..., "value": ...} entries
+        secret_value = "value" in value and _is_secret(value.get("name"))
+        return {
+            key: REDACTED if _is_secret(key) or (secret_value and key == "value") else summarize(item, full)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        items = [summarize(item, full) for item in (value if full else value[:MAX_LIST_ITEMS])]
+        if not full and len(value) > MAX_LIST_ITEMS:
+            items.append(f"...<{len(value)} items>")
+        return items
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    return value
+
+
+class _Capped:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(summarize(self.value, _sampled), default=str, separators=(",", ":"))
+
+
+def capped(value) -> _Capped:
+    """Wrap a log argument so it is rendered as capped JSON, only when the record is emitted."""
+    return _Capped(value)
+
+
+def error_text(error: Exception, limit: int = 200) -> str:
+    """A short description of an exception, safe to return to the agent."""
+    text = f"{type(error).__name__}: {error}"
+    return text if len(text) <= limit else text[:limit] + "..."
@@ -0,0 +1,130 @@
+"""
+Precomputed nearest neighbours of the catalog images.
+
+When the input of a lookup is itself a catalog image (one returned by an earlier
+lookup, which records its catalog id in the S3 metadata), its neighbours are
+static. Catalog ids are the ``image_id`` field of the documents, which survives
+restores and rebuilds of the index, unlike the document ids the collection assigns.
+tools/catalog_neighbours.py computes the neighbours offline for every document and
+writes a single file:
+
+    {"neighbours": 10, "ids": ["<image id>", ...]}\\n
+    int32 little-endian rows of neighbour positions in "ids" (-1 when missing),
+        documents without an image id are "" and never returned
+    float32 little-endian rows of their scores, in the same order
+
+Scores use the scale of the OpenSearch l2 space, so RETRIEVE_THRESHOLD applies
+unchanged. The file is read from ``catalog_neighbours.bin`` next to this module if
+shipped with the Lambda, otherwise from the ``neighbours_key`` object of the bucket.
+Every tenant has its own catalog and so its own file, the ``neighbours_key`` of the
+tenant; the bundled file belongs to the default catalog.
+"""
+
+import json
+import logging
+import sys
+import threading
+from array import array
+from pathlib import Path
+
+from fashion_common import get_settings
+
+import tracing
+
+logger = logging.getLogger()
+
+BUNDLED_INDEX = Path(__file__).resolve().parent / "catalog_neighbours.bin"
+CATALOG_ID_METADATA = "catalog-id"
+
+
+class NeighbourIndex:
+    """Top-N neighbour image ids and scores of every catalog document, in flat arrays."""
+
+    def __init__(self, ids: list, neighbours: int, positions: array, scores: array):
+        self.ids = ids
+        self.neighbours = neighbours
+        self.rows = {catalog_id: row for row, catalog_id in enumerate(ids) if catalog_id}
+        self.positions = positions
+        self.scores = scores
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "NeighbourIndex":
+        header, _, body = data.partition(b"\n")
+        header = json.loads(header)
+        size = len(header["ids"]) * header["neighbours"] * 4
+        positions, scores = array("i"), array("f")
+        positions.frombytes(body[:size])
+        scores.frombytes(body[size : 2 * size])
+        if sys.byteorder != "little":
+            positions.byteswap()
+            scores.byteswap()
+        if len(scores) * 4 != size:
+            raise ValueError("Neighbour index is truncated")
+        return cls(header["ids"], header["neighbours"], positions, scores)
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps({"neighbours": self.neighbours, "ids": self.ids})
+        positions, scores = array("i", self.positions), array("f", self.scores)
+        if sys.byteorder != "little":
+            positions.byteswap()
+            scores.byteswap()
+        return header.encode("utf8") + b"\n" + positions.tobytes() + scores.tobytes()
+
+    def get(self, catalog_id: str):
+        """Return [(neighbour image id, score), ...] best first, or None for unknown documents."""
+        row = self.rows.get(catalog_id)
+        if row is None:
+            return None
+        start = row * self.neighbours
+        return [
+            (self.ids[position], score)
+            for position, score in zip(
+                self.positions[start : start + self.neighbours], self.scores[start : start + self.neighbours]
+            )
+            if position >= 0 and self.ids[position]
+        ]
+
+
+DEFAULT_KEY = get_settings().neighbours_key
+
+# neighbours key -> NeighbourIndex, or None when the catalog has none
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _load(s3_client, bucket_name: str, key: str):
+    if key == DEFAULT_KEY and BUNDLED_INDEX.exists():
+        return NeighbourIndex.from_bytes(BUNDLED_INDEX.read_bytes())
+    if not key:
+        return None
+    try:
+        data = s3_client.get_object(Bucket=bucket_name, Key=key)["Body"].read()
+    except s3_client.exceptions.NoSuchKey:
+        logger.info("No neighbour index at s3://%s/%s", bucket_name, key)
+        return None
+    return NeighbourIndex.from_bytes(data)
+
+
+def lookup(s3_client, bucket_name: str, catalog_id: str, key: str = DEFAULT_KEY):
+    """
+    Return the precomputed neighbours of a catalog image, by image id, or None.
+
+    The index of a catalog, the ``key`` object, is loaded on first use and kept for the
+    life of the container.
+    """
+    if key not in _indexes:
+        with _lock:
+            if key not in _indexes:
+                index = None
+                try:
+                    index = _load(s3_client, bucket_name, key)
+                except Exception as e:
+                    logger.warning("Could not load the neighbour index %s: %s", key, e)
+                _indexes[key] = index
+    index = _indexes[key]
+    if index is None:
+        return None
+    with tracing.span("neighbour_index") as span:
+        neighbours = index.get(catalog_id)
+        span.set("cache_hit", neighbours is not None)
+    return neighbours
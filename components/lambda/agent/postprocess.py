@@ -0,0 +1,167 @@
+"""
+Post-processing stage for images returned by Titan.
+
+``extract_first_image`` decodes the first image of a Titan response straight from
+the streaming body, so the Lambda never holds the raw response, the parsed JSON
+string and the decoded bytes at the same time. ``store_variants`` then produces the
+configured variants (full size, thumbnail, ...) in a thread pool, since Pillow
+releases the GIL while encoding, and uploads each one as soon as it is ready.
+"""
+
+import base64
+import json
+import logging
+import re
+import resource
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from fashion_common import get_settings
+
+import tracing
+
+logger = logging.getLogger()
+
+CHUNK_SIZE = 64 * 1024
+# The value of "images" up to its first element: an opening quote when the response
+# holds an image, "]" for an empty list, or the first byte of another value (null)
+_IMAGES_VALUE = re.compile(rb'"images"\s*:\s*(\[\s*)?([^\s\[])')
+THUMBNAIL_SIZE = (256, 256)
+
+_executor = ThreadPoolExecutor(max_workers=get_settings().postprocess_workers)
+
+
+def extract_first_image(body) -> bytes:
+    """
+    Decode the first base64 image of a Titan response from its streaming body.
+
+    Args:
+        body: The streaming response body (anything with ``read(size)``).
+
+    Returns:
+        bytes: The decoded image.
+
+    Raises:
+        Exception: If the response holds an error or no image.
+    """
+    with tracing.span("pp_extract") as span:
+        head = b""
+        # Read until the first element of "images" is known
+        while True:
+            match = _IMAGES_VALUE.search(head)
+            if match is not None:
+                break
+            chunk = body.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            head += chunk
+        if match is None or match.group(1) is None or match.group(2) != b'"':
+            # No image, e.g. {"images":[],"error":"..."}: the rest of the response says why
+            response = json.loads(head + body.read() or b"{}")
+            raise Exception(f"Image generation error. Error is {response.get('error')}")
+        start = match.start(2)
+
+        image = BytesIO()
+        pending = head[start + 1 :]
+        while True:
+            end = pending.find(b'"')
+            data = pending if end < 0 else pending[:end]
+            # JSON may escape "/" as "\/"; base64 never contains a backslash.
+            data = data.replace(b"\\", b"")
+            usable = len(data) - len(data) % 4 if end < 0 else len(data)
+            image.write(base64.b64decode(data[:usable]))
+            if end >= 0:
+                break
+            chunk = body.read(CHUNK_SIZE)
+            if not chunk:
+                raise Exception("Image generation error. Truncated response")
+            pending = data[usable:] + chunk
+        span.set("bytes", image.tell())
+        return image.getvalue()
+
+
+def _thumbnail(image_bytes: bytes):
+    from PIL import Image
+
+    with tracing.span("pp_thumbnail") as span:
+        with Image.open(BytesIO(image_bytes)) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            output = BytesIO()
+            image.convert("RGB").save(output, format="JPEG", quality=85)
+        span.set("bytes", output.tell())
+        return output.getvalue()
+
+
+# name -> (transform, key suffix). None keeps the image as it is.
+VARIANTS = {
+    "full": (None, ""),
+    "thumbnail": (_thumbnail, "_thumb.jpg"),
+}
+
+
+def variant_key(output_key: str, variant: str) -> str:
+    """S3 key of a variant of ``output_key``."""
+    suffix = VARIANTS[variant][1]
+    if not suffix:
+        return output_key
+    return output_key.rsplit(".", 1)[0] + suffix
+
+
+def _upload(s3_client, data: bytes, bucket_name: str, key: str, metadata: dict):
+    with tracing.span("s3_put", bytes=len(data)):
+        s3_client.upload_fileobj(BytesIO(data), bucket_name, key, ExtraArgs={"Metadata": metadata})
+    return f"s3://{bucket_name}/{key}"
+
+
+def _produce_and_upload(s3_client, image_bytes, variant, bucket_name, key, metadata):
+    transform = VARIANTS[variant][0]
+    data = image_bytes if transform is None else transform(image_bytes)
+    return _upload(s3_client, data, bucket_name, key, metadata)
+
+
+def store_variants(
+    s3_client,
+    image_bytes: bytes,
+    bucket_name: str,
+    output_key: str,
+    metadata: dict = None,
+    variants=("full", "thumbnail"),
+) -> dict:
+    """
+    Produce and upload the variants of an image concurrently.
+
+    Args:
+        s3_client: The S3 client used for the uploads.
+        image_bytes (bytes): The full-size image.
+        bucket_name (str): The destination bucket.
+        output_key (str): The key of the full-size image; other variants are stored next to it.
+        metadata (dict): S3 user metadata recorded on every variant.
+        variants (tuple): Names of the variants to produce, see ``VARIANTS``.
+
+    Returns:
+        dict: The S3 location of each variant.
+    """
+    with tracing.span("pp_variants"):
+        futures = {
+            variant: _executor.submit(
+                tracing.propagate(_produce_and_upload),
+                s3_client,
+                image_bytes,
+                variant,
+                bucket_name,
+                variant_key(output_key, variant),
+                metadata or {},
+            )
+            for variant in variants
+        }
+        locations = {}
+        for variant, future in futures.items():
+            try:
+                locations[variant] = future.result()
+            except Exception as e:
+                # Only the full-size image is required, the other variants are best effort
+                if variant == "full":
+                    raise
+                logger.warning("Could not store the %s variant of %s: %s", variant, output_key, e)
+    tracing.gauge("peak_rss_bytes", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    return locations
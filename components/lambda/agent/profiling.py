@@ -0,0 +1,183 @@
+"""
+Opt-in profiling of single agent invocations.
+
+Profiling is off unless the ``profiling_mode`` setting (``profiling.mode`` in
+config.yml) is set, or the agent session carries a ``profiling`` session attribute
+(set by the caller of InvokeAgent, or in a replayed event) naming the mode for that
+invocation:
+
+    sample    a thread samples the stacks of the handler and its worker threads every
+              ``profiling_interval_ms`` and writes them as collapsed stacks, the input
+              of flamegraph.pl and speedscope
+    cprofile  deterministic cProfile of the handler, written as a pstats file
+
+Both modes also trace allocations with tracemalloc and write the ``profiling_top``
+largest allocation sites and the peak as JSON. Profiles are written under
+``<api path>/`` to ``profiling_output``, a local directory or an s3:// prefix, by
+default ``ephemeral/profiles/`` in the agent bucket. Merge and compare them with
+``python -m tools.profiles``.
+"""
+
+import cProfile
+import functools
+import json
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from fashion_common import clients, get_settings
+from fashion_common.settings import PROFILING_MODES
+
+import storage
+
+logger = logging.getLogger()
+
+MODES = PROFILING_MODES
+MODE = get_settings().profiling_mode
+OUTPUT = get_settings().profiling_output
+INTERVAL = get_settings().profiling_interval_ms / 1000
+TOP = get_settings().profiling_top
+SESSION_ATTRIBUTE = "profiling"
+# Collapsed name of the frame of ``profiled``'s wrapper, the root of handler stacks
+_WRAPPER_FRAME = "profiling.py:wrapper;"
+
+
+class StackSampler:
+    """
+    Samples the stacks of the running threads from a background thread.
+
+    Stacks are counted in collapsed form, "root;file:function;file:function count".
+    The root is "handler" for the thread that started the sampler and "worker" for
+    the others; idle pool threads are skipped so they do not dilute the profile.
+    """
+
+    def __init__(self, interval: float = INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (ident != self._target and _idle(frame)):
+                    continue
+                if ident == self._target:
+                    # Drop the frames of the Lambda runtime above the handler
+                    stack = "handler;" + collapse(frame).partition(_WRAPPER_FRAME)[2]
+                else:
+                    stack = f"worker;{collapse(frame)}"
+                self.counts[stack] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+def _frame_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse(frame) -> str:
+    """Return the stack of a frame as "file:function" names joined by ";", outermost first."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _idle(frame) -> bool:
+    # A pool thread waiting for work sits in concurrent.futures or threading
+    return _frame_name(frame.f_code) in ("thread.py:_worker", "threading.py:wait", "selectors.py:select")
+
+
+def requested_mode(event) -> str:
+    """The profiling mode of an invocation, "" when it is not profiled."""
+    attributes = (event.get("sessionAttributes") or {}) if isinstance(event, dict) else {}
+    mode = str(attributes.get(SESSION_ATTRIBUTE, MODE)).lower()
+    return mode if mode in MODES else ""
+
+
+def allocation_report(snapshot, peak: int, top: int = TOP) -> dict:
+    """Summarize a tracemalloc snapshot as the ``top`` largest allocation sites."""
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return {
+        "peak_bytes": peak,
+        "sites": [
+            {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "size": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:top]
+        ],
+    }
+
+
+def write(name: str, data: bytes) -> str:
+    """Write a profile file under the profiling output and return its location."""
+    output = OUTPUT or storage.uri(get_settings().bucket_name, f"{storage.EPHEMERAL}profiles/")
+    if output.startswith("s3://"):
+        bucket_name, prefix = output[len("s3://"):].split("/", 1)
+        key = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        clients.client("s3").put_object(Bucket=bucket_name, Key=key, Body=data)
+        return storage.uri(bucket_name, key)
+    path = Path(output) / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def profiled(handler):
+    """Wrap a Lambda handler so that invocations are profiled when requested."""
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        mode = requested_mode(event)
+        if not mode:
+            return handler(event, context)
+        api_path = event.get("apiPath", "/jobs") if isinstance(event, dict) else "/jobs"
+        request_id = getattr(context, "aws_request_id", None) or uuid.uuid4().hex[:12]
+        name = f"{api_path.strip('/')}/{time.strftime('%Y%m%dT%H%M%S')}-{request_id}"
+        tracemalloc.start()
+        if mode == "sample":
+            profiler = StackSampler().start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            return handler(event, context)
+        finally:
+            if mode == "sample":
+                profiler.stop()
+                files = {".collapsed": profiler.collapsed().encode("utf8")}
+            else:
+                profiler.disable()
+                profiler.create_stats()
+                files = {".pstats": marshal.dumps(profiler.stats)}
+            peak = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            files[".alloc.json"] = json.dumps(allocation_report(snapshot, peak)).encode("utf8")
+            try:
+                locations = [write(name + extension, data) for extension, data in files.items()]
+                logger.info("Wrote profiles %s", ", ".join(locations))
+            except Exception as e:
+                # Profiling must never fail the invocation
+                logger.warning(f"Could not write the profiles of {name}: {str(e)}")
+
+    return wrapper
+
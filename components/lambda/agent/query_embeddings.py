@@ -0,0 +1,110 @@
+"""
+Precomputed embeddings of frequent text queries.
+
+Popular lookups ("red summer dress", "black evening gown") are embedded ahead of
+time by tools/query_embedding_warmup.py, so matching queries skip the Titan call and
+go straight to the kNN search. The table is a single file:
+
+    {"embedding_size": 1024, "queries": ["black evening gown", ...]}\\n
+    float32 little-endian rows, one per query, in the order of "queries"
+
+It is read from ``query_embeddings.bin`` next to this module if the file is shipped
+with the Lambda, otherwise from the ``query_embeddings_key`` object of the bucket.
+Rows stay in one ``array`` instead of one Python list per query.
+"""
+
+import json
+import logging
+import sys
+import threading
+from array import array
+from pathlib import Path
+
+from fashion_common import get_settings
+
+import retrieval
+import tracing
+
+logger = logging.getLogger()
+
+BUNDLED_TABLE = Path(__file__).resolve().parent / "query_embeddings.bin"
+
+
+class QueryEmbeddingTable:
+    """Embeddings of normalized text queries, stored in one float32 array."""
+
+    def __init__(self, embedding_size: int, queries: list, vectors: array):
+        self.embedding_size = embedding_size
+        self.rows = {query: row for row, query in enumerate(queries)}
+        self.vectors = vectors
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QueryEmbeddingTable":
+        header, _, body = data.partition(b"\n")
+        header = json.loads(header)
+        vectors = array("f")
+        vectors.frombytes(body)
+        if sys.byteorder != "little":
+            vectors.byteswap()
+        if len(vectors) != len(header["queries"]) * header["embedding_size"]:
+            raise ValueError("Query embedding table is truncated")
+        return cls(header["embedding_size"], header["queries"], vectors)
+
+    def to_bytes(self) -> bytes:
+        queries = sorted(self.rows, key=self.rows.get)
+        header = json.dumps({"embedding_size": self.embedding_size, "queries": queries})
+        vectors = array("f", self.vectors)
+        if sys.byteorder != "little":
+            vectors.byteswap()
+        return header.encode("utf8") + b"\n" + vectors.tobytes()
+
+    def get(self, text: str):
+        """Return the embedding of a text query as a float32 array, or None if it is not in the table."""
+        row = self.rows.get(retrieval.normalize_query(text))
+        if row is None:
+            return None
+        start = row * self.embedding_size
+        return self.vectors[start : start + self.embedding_size]
+
+
+_table = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def _load(s3_client, bucket_name: str):
+    if BUNDLED_TABLE.exists():
+        return QueryEmbeddingTable.from_bytes(BUNDLED_TABLE.read_bytes())
+    key = get_settings().query_embeddings_key
+    if not key:
+        return None
+    try:
+        data = s3_client.get_object(Bucket=bucket_name, Key=key)["Body"].read()
+    except s3_client.exceptions.NoSuchKey:
+        logger.info("No query embedding table at s3://%s/%s", bucket_name, key)
+        return None
+    return QueryEmbeddingTable.from_bytes(data)
+
+
+def lookup(s3_client, bucket_name: str, text: str, embedding_size: int):
+    """
+    Return the precomputed embedding of a text query, or None.
+
+    The table is loaded on first use and kept for the life of the container. A table
+    built for another embedding size is ignored.
+    """
+    global _table, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                try:
+                    _table = _load(s3_client, bucket_name)
+                except Exception as e:
+                    logger.warning("Could not load the query embedding table: %s", e)
+                _loaded = True
+    if _table is None or _table.embedding_size != embedding_size:
+        return None
+    with tracing.span("query_table") as span:
+        vector = _table.get(text)
+        span.set("cache_hit", vector is not None)
+    return vector
@@ -0,0 +1,80 @@
+"""
+Render tiers for Titan image generation and editing.
+
+"preview" is a fast, standard-quality render for exploring looks, "final" a premium
+render of the look the shopper picked. A final render reuses the seed of its preview
+(returned with every render and stored as S3 object metadata) so the composition
+stays close.
+Each render counts towards per-tier cost metrics; per-tier latency is recorded as
+the ``bedrock_image_<tier>`` tracing stage.
+"""
+
+import json
+
+from fashion_common import get_settings
+
+import tracing
+
+# imageGenerationConfig per tier. Editing tasks (inpaint/outpaint) keep the output
+# resolution and only switch quality.
+# cost_usd: on-demand price per image for Titan Image Generator v2 at the time of
+# writing, used for cost metrics only. Check the Amazon Bedrock pricing page.
+RENDER_TIERS = {
+    "preview": {"quality": "standard", "height": 512, "width": 512, "cost_usd": 0.008, "edit_cost_usd": 0.01},
+    "final": {"quality": "premium", "height": 1024, "width": 1024, "cost_usd": 0.012, "edit_cost_usd": 0.012},
+}
+DEFAULT_TIER = get_settings().default_render_tier
+MAX_SEED = 214783647
+
+
+def resolve(tier: str) -> str:
+    """Return a known tier name, falling back to the default tier."""
+    tier = (tier or "").strip().lower()
+    return tier if tier in RENDER_TIERS else DEFAULT_TIER
+
+
+def generation_config(tier: str, seed: int, cfg: float = 10.0, num_image: int = 1, edit: bool = False) -> dict:
+    """
+    Build the Titan imageGenerationConfig for a render tier.
+
+    Args:
+        tier (str): The render tier, "preview" or "final".
+        seed (int): The seed, reused when a preview is promoted to a final render.
+        cfg (float): Scale for classifier-free guidance.
+        num_image (int): Number of images to generate.
+        edit (bool): True for inpainting/outpainting, which keep the input resolution.
+
+    Returns:
+        dict: The imageGenerationConfig.
+    """
+    settings = RENDER_TIERS[tier]
+    config = {
+        "numberOfImages": num_image,  # Range: 1 to 5
+        "quality": settings["quality"],  # Options: standard/premium
+        "cfgScale": cfg,  # Range: 1.0 (exclusive) to 10.0
+        "seed": seed,  # Range: 0 to 214783647
+    }
+    if not edit:
+        config["height"] = settings["height"]
+        config["width"] = settings["width"]
+    return config
+
+
+def record(tier: str, num_image: int = 1, edit: bool = False) -> None:
+    """Count a render and its estimated cost for the tier."""
+    cost = RENDER_TIERS[tier]["edit_cost_usd" if edit else "cost_usd"]
+    tracing.incr(f"render_{tier}", num_image)
+    tracing.incr(f"render_{tier}_cost_usd", cost * num_image)
+
+
+def object_metadata(tier: str, seed: int) -> dict:
+    """S3 user metadata recorded on every rendered image."""
+    return {"render-tier": tier, "seed": str(seed)}
+
+
+def response_body(location: str, tier: str, seed: int) -> str:
+    """
+    Body of the action response for a render: the image location with its tier and
+    seed, which the agent passes back to render the final version of a preview.
+    """
+    return json.dumps({"image": location, "render_tier": tier, "seed": seed})
@@ -0,0 +1,83 @@
+"""
+Query construction for the image lookup.
+
+Shared by ``find_similar_image_in_opensearch_index`` and the offline evaluation in
+tools/retrieval_eval.py, so retrieval quality is measured with exactly the requests
+and filtering the Lambda uses.
+"""
+
+import re
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-image-v1"
+VECTOR_FIELD = "vector_field"
+# Number of documents returned by the kNN search
+SEARCH_SIZE = 5
+# similarity threshold - to retrieve the matching images from OpenSearch index
+RETRIEVE_THRESHOLD = 0.2
+# Field identifying a catalog image. Document ids are assigned by the collection and
+# change when an index is restored or rebuilt, image ids do not.
+CATALOG_ID_FIELD = "image_id"
+# Document fields returned by the lookups: the catalog id, and the catalog object or
+# the inline image of documents ingested before images were stored in S3. Never the vector.
+SOURCE_FIELDS = [CATALOG_ID_FIELD, "s3_uri", "image_b64"]
+
+
+def embedding_request(embedding_size: int, image_b64: str = None, text: str = None) -> dict:
+    """
+    Build the Titan multimodal embeddings request for an image and/or a text.
+
+    Args:
+        embedding_size (int): Output embedding length, one of 256, 384 or 1024.
+        image_b64 (str): Base64-encoded input image.
+        text (str): Input text; "None" is treated as missing.
+
+    Returns:
+        dict: The request body.
+    """
+    body = {}
+    if image_b64:
+        body["inputImage"] = image_b64
+    if text and text != "None":
+        body["inputText"] = text
+    body["embeddingConfig"] = {"outputEmbeddingLength": embedding_size}
+    return body
+
+
+def knn_query(vector, k: int, size: int = SEARCH_SIZE) -> dict:
+    """Build the kNN search body for an embedding, a list or a float32 array."""
+    return {
+        "size": size,
+        "query": {"knn": {VECTOR_FIELD: {"vector": vector, "k": k}}},
+        "_source": SOURCE_FIELDS,
+    }
+
+
+def catalog_ids_query(catalog_ids: list) -> dict:
+    """
+    Build the search body fetching catalog documents by their image id.
+
+    The notebook maps the field as a keyword; indexes where it was mapped dynamically
+    hold it as text with a keyword subfield, which is matched too.
+    """
+    terms = [{"terms": {CATALOG_ID_FIELD: catalog_ids}}, {"terms": {f"{CATALOG_ID_FIELD}.keyword": catalog_ids}}]
+    return {
+        "size": len(catalog_ids),
+        "query": {"bool": {"should": terms, "minimum_should_match": 1}},
+        "_source": SOURCE_FIELDS,
+    }
+
+
+def catalog_id(hit: dict):
+    """Return the catalog id of a search hit, None for documents indexed without one."""
+    value = hit["_source"].get(CATALOG_ID_FIELD)
+    return str(value) if value not in (None, "") else None
+
+
+def matching_hits(hits: list, threshold: float = RETRIEVE_THRESHOLD) -> list:
+    """Keep the search hits whose score is above the threshold, best first."""
+    return [hit for hit in hits if hit["_score"] > threshold]
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a text query so variants in case, spacing and punctuation match."""
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", (text or "").lower()).split())
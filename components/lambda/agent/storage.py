@@ -0,0 +1,79 @@
+"""
+Key layout of the agent bucket.
+
+Images written by the actions are content-addressed: the key is the SHA-256 of the
+bytes, so the same image (a catalog item found twice, a render repeated with the
+same prompt and seed) is stored once, and an existing key is never written again.
+The key starts with two hex characters of the digest, which spreads writes evenly
+over the S3 key space instead of piling them on one hot prefix:
+
+    ephemeral/<digest[:2]>/<digest>.jpg   lookups, previews, uploads, edit sessions
+    persisted/<digest[:2]>/<digest>.jpg   final renders
+    catalog/<image id>.jpg                catalog images, see opensearch_ingest.ipynb
+
+Lookups return catalog images where they are, or as a server-side copy keyed by the
+source URI when the catalog is in another bucket, see ``copy_key``.
+
+Objects under ``ephemeral/`` expire after ``storage.ephemeral_days`` and objects
+under ``persisted/`` move to Intelligent-Tiering, see the lifecycle rules of the
+bucket in components/stacks/fashion_agent_stack.py.
+"""
+
+import hashlib
+import logging
+import posixpath
+
+from botocore.exceptions import ClientError
+
+import tracing
+
+logger = logging.getLogger()
+
+EPHEMERAL = "ephemeral/"
+PERSISTED = "persisted/"
+
+
+def content_key(data: bytes, prefix: str = EPHEMERAL, extension: str = ".jpg") -> str:
+    """
+    Return the content-addressed key of an object.
+
+    Args:
+        data (bytes): The object content.
+        prefix (str): EPHEMERAL or PERSISTED.
+        extension (str): The file extension, with its dot.
+
+    Returns:
+        str: The key, e.g. "ephemeral/3f/3f8a...e1.jpg".
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{prefix}{digest[:2]}/{digest}{extension}"
+
+
+def copy_key(source_uri: str, prefix: str = EPHEMERAL) -> str:
+    """
+    Return the key of a copy of an S3 object.
+
+    Copies are made server-side without reading the content, so they are addressed by
+    the URI of their source instead, which is stable for catalog objects.
+    """
+    digest = hashlib.sha256(source_uri.encode("utf8")).hexdigest()
+    extension = posixpath.splitext(source_uri)[1]
+    return f"{prefix}{digest[:2]}/{digest}{extension}"
+
+
+def exists(s3_client, bucket_name: str, key: str) -> bool:
+    """Check whether an object exists, with a HEAD request."""
+    with tracing.span("s3_head") as span:
+        try:
+            s3_client.head_object(Bucket=bucket_name, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                span.set("cache_hit", False)
+                return False
+            raise
+        span.set("cache_hit", True)
+    return True
+
+
+def uri(bucket_name: str, key: str) -> str:
+    return f"s3://{bucket_name}/{key}"
@@ -0,0 +1,231 @@
+"""
+Lightweight tracing for the agent Lambda.
+
+Spans time the external calls an action makes (S3, Bedrock, OpenSearch, HTTP) and
+are aggregated per invocation into a single CloudWatch Embedded Metric Format (EMF)
+line written to stdout. Spans are only recorded while the ``tracing_enabled``
+setting is true. While it is false (the default), ``span`` hands back a
+shared no-op object so the instrumented code pays for little more than a function call.
+
+The invocation being recorded is held in a context variable, so concurrent
+invocations never record into each other. Worker threads start from an empty
+context; wrap the work handed to a thread pool with ``propagate`` to record its
+spans into the invocation that submitted it.
+"""
+
+import contextvars
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from fashion_common import get_settings
+
+NAMESPACE = get_settings().tracing_namespace
+
+_enabled = get_settings().tracing_enabled
+
+
+def enabled() -> bool:
+    """Return True if spans are being recorded."""
+    return _enabled
+
+
+def set_enabled(value: bool) -> None:
+    """Turn tracing on or off at runtime (used by local tools and benchmarks)."""
+    global _enabled
+    _enabled = bool(value)
+
+
+class _NullSpan:
+    """Span returned while tracing is disabled. Every method is a no-op."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Invocation:
+    """Per-invocation aggregate of stage timings, counters and payload sizes."""
+
+    def __init__(self, api_path: str, request_id: str = None):
+        self.api_path = api_path
+        self.request_id = request_id
+        self.stages = {}
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, elapsed_ms: float, attributes: dict, error: bool):
+        with self._lock:
+            stage = self.stages.setdefault(name, [0, 0.0])
+            stage[0] += 1
+            stage[1] += elapsed_ms
+            if error:
+                self._add(f"{name}.errors", 1)
+            for key, value in attributes.items():
+                if isinstance(value, bool):
+                    self._add(f"{name}.cache_hit" if value else f"{name}.cache_miss", 1)
+                elif isinstance(value, (int, float)):
+                    self._add(f"{name}.{key}", value)
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._add(name, value)
+
+    def gauge(self, name: str, value: float):
+        with self._lock:
+            self.values[name] = max(self.values.get(name, value), value)
+
+    def _add(self, name, value):
+        self.values[name] = self.values.get(name, 0) + value
+
+    def to_emf(self, total_ms: float) -> dict:
+        metrics = [{"Name": "total", "Unit": "Milliseconds"}]
+        record = {"apiPath": self.api_path, "total": round(total_ms, 3)}
+        for name, (count, elapsed_ms) in self.stages.items():
+            metrics.append({"Name": name, "Unit": "Milliseconds"})
+            record[name] = round(elapsed_ms, 3)
+            record[f"{name}.calls"] = count
+        for name, value in self.values.items():
+            unit = "Bytes" if name.endswith("bytes") else "Count"
+            metrics.append({"Name": name, "Unit": unit})
+            record[name] = value
+        if self.request_id:
+            record["requestId"] = self.request_id
+        record["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [["apiPath"]],
+                    "Metrics": metrics,
+                }
+            ],
+        }
+        return record
+
+
+_current = contextvars.ContextVar("tracing_invocation", default=None)
+
+
+class Span:
+    """Times a block and records it, plus numeric or boolean attributes, on exit."""
+
+    __slots__ = ("name", "attributes", "_start")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self._start) * 1000
+        invocation = _current.get()
+        if invocation is not None:
+            invocation.record(self.name, elapsed_ms, self.attributes, exc_type is not None)
+        return False
+
+    def set(self, key: str, value) -> None:
+        """
+        Attach an attribute to the span.
+
+        Numbers are summed per stage (e.g. ``bytes``), booleans are counted as
+        ``<stage>.cache_hit`` / ``<stage>.cache_miss``. Anything else is ignored.
+        """
+        self.attributes[key] = value
+
+
+def span(name: str, **attributes):
+    """
+    Time a block of code as stage ``name`` of the current invocation.
+
+    Args:
+        name (str): The stage name, e.g. "s3_get" or "bedrock_embed".
+        **attributes: Initial attributes, see ``Span.set``.
+
+    Returns:
+        A context manager yielding the span (or a no-op span if tracing is off).
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def incr(name: str, value: float = 1) -> None:
+    """Add ``value`` to the counter ``name`` of the current invocation."""
+    invocation = _current.get()
+    if _enabled and invocation is not None:
+        invocation.incr(name, value)
+
+
+def gauge(name: str, value: float) -> None:
+    """Set the value ``name`` of the current invocation, keeping the maximum seen."""
+    invocation = _current.get()
+    if _enabled and invocation is not None:
+        invocation.gauge(name, value)
+
+
+def emit(record: dict) -> None:
+    """Write one EMF record as a single stdout line."""
+    sys.stdout.write(json.dumps(record, default=str) + "\n")
+    sys.stdout.flush()
+
+
+@contextmanager
+def invocation(api_path: str, request_id: str = None):
+    """
+    Collect every span recorded inside the block and emit them as one EMF line.
+
+    Args:
+        api_path (str): The agent API path, used as the metric dimension.
+        request_id (str): Optional Lambda request id, added as a property.
+    """
+    if not _enabled:
+        yield
+        return
+    collected = _Invocation(api_path, request_id)
+    token = _current.set(collected)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        emit(collected.to_emf((time.perf_counter() - start) * 1000))
+
+
+def propagate(function):
+    """
+    Bind a callable to the current invocation, for work submitted to a thread pool.
+
+    Args:
+        function: The callable run by the worker thread.
+
+    Returns:
+        A callable recording its spans into the invocation active at this call.
+    """
+    invocation = _current.get()
+    if invocation is None:
+        return function
+
+    def run(*args, **kwargs):
+        token = _current.set(invocation)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
@@ -0,0 +1,4 @@
+"""Settings and clients shared by the agent Lambda, the CDK app, the notebook and the demo UI."""
+
+from . import clients, vectors
+from .settings import ClientPolicy, Settings, Tenant, get_settings, load_config
@@ -0,0 +1,97 @@
+"""
+Cached AWS and OpenSearch clients.
+
+Clients are created once per process (one Lambda container, one Streamlit server,
+one notebook kernel) and shared: boto3 clients are thread-safe and keep their
+connection pool, so reusing them saves the TLS handshake and credential resolution
+of every new client. All clients get the timeouts, retries and pool size of
+``Settings.clients``.
+"""
+
+from functools import lru_cache
+
+import boto3
+from botocore.config import Config
+
+from . import vectors
+from .settings import Settings, get_settings
+
+# Read timeouts of the services with long calls, in seconds. Image generation can
+# take more than a minute and an agent turn several model calls.
+READ_TIMEOUTS = {
+    "bedrock-runtime": 120,
+    "bedrock-agent-runtime": 600,
+}
+
+
+@lru_cache(maxsize=None)
+def session(profile_name: str = None, region_name: str = None) -> boto3.Session:
+    """Return the boto3 session of a profile and region, created once."""
+    return boto3.Session(profile_name=profile_name, region_name=region_name)
+
+
+def client_config(service: str, settings: Settings, max_attempts: int = None) -> Config:
+    """
+    Return the botocore config of a service client under the client policy.
+
+    ``max_attempts`` counts every attempt, the first one included, and overrides
+    ``clients.max_attempts`` for callers retrying on their own.
+    """
+    policy = settings.clients
+    return Config(
+        connect_timeout=policy.connect_timeout,
+        read_timeout=max(policy.read_timeout, READ_TIMEOUTS.get(service, 0)),
+        retries={"mode": policy.retry_mode, "total_max_attempts": max_attempts or policy.max_attempts},
+        max_pool_connections=policy.max_pool_connections,
+        tcp_keepalive=True,
+    )
+
+
+@lru_cache(maxsize=None)
+def client(service: str, settings: Settings = None, profile_name: str = None, max_attempts: int = None):
+    """
+    Return the shared boto3 client of a service.
+
+    Args:
+        service (str): The service name, e.g. "s3" or "bedrock-runtime".
+        settings (Settings): The settings, by default those of the environment.
+        profile_name (str): The AWS profile, outside AWS only.
+        max_attempts (int): Attempts per call, first one included, by default
+            ``clients.max_attempts``.
+
+    Returns:
+        The client, the same object for the same arguments.
+    """
+    settings = settings or get_settings()
+    config = client_config(service, settings, max_attempts)
+    return session(profile_name, settings.region).client(service, config=config)
+
+
+@lru_cache(maxsize=None)
+def opensearch(settings: Settings = None, profile_name: str = None):
+    """
+    Return the shared SigV4-signed client of the OpenSearch Serverless collection.
+
+    Vectors in request bodies are written by ``vectors.VectorSerializer``.
+
+    Args:
+        settings (Settings): The settings, with the collection host and region.
+        profile_name (str): The AWS profile, outside AWS only.
+
+    Returns:
+        OpenSearch: The client, the same object for the same arguments.
+    """
+    from opensearchpy import AWSV4SignerAuth, OpenSearch, RequestsHttpConnection
+
+    settings = (settings or get_settings()).require("aoss_host")
+    aws_session = session(profile_name, settings.region)
+    return OpenSearch(
+        hosts=[{"host": settings.aoss_host, "port": 443}],
+        http_auth=AWSV4SignerAuth(aws_session.get_credentials(), aws_session.region_name, "aoss"),
+        use_ssl=True,
+        verify_certs=True,
+        connection_class=RequestsHttpConnection,
+        pool_maxsize=settings.clients.opensearch_pool_maxsize,
+        timeout=settings.clients.opensearch_timeout,
+        serializer=vectors.VectorSerializer(settings.vector_digits),
+    )
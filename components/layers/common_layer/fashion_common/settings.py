@@ -0,0 +1,339 @@
+"""
+Typed settings of the Fashion Agent, shared by the CDK app, the agent Lambda, the
+ingestion notebook and the demo UI.
+
+``config.yml`` is read once with ``load_config`` and validated into ``Settings``.
+The stack passes the settings to the Lambda as environment variables (``to_env``),
+and the Lambda reads them back with ``Settings.from_env``, so the names and types of
+those variables are defined here only.
+"""
+
+import dataclasses
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+EMBEDDING_SIZES = (256, 384, 1024)
+RENDER_TIERS = ("preview", "final")
+DEFAULT_TENANT = "default"
+PROFILING_MODES = ("sample", "cprofile")
+_TENANT_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+@dataclass(frozen=True)
+class ClientPolicy:
+    """Connection pooling, retry and timeout policy of the AWS and OpenSearch clients."""
+
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    # boto3 clients are shared by the worker threads of the Lambda, size the pool for them
+    max_pool_connections: int = 16
+    retry_mode: str = "adaptive"
+    max_attempts: int = 3
+    opensearch_timeout: float = 30.0
+    opensearch_pool_maxsize: int = 16
+
+    def __post_init__(self):
+        for name in ("connect_timeout", "read_timeout", "max_pool_connections", "max_attempts",
+                     "opensearch_timeout", "opensearch_pool_maxsize"):
+            if getattr(self, name) <= 0:
+                raise ValueError(f"clients.{name} must be positive, got {getattr(self, name)}")
+        if self.retry_mode not in ("legacy", "standard", "adaptive"):
+            raise ValueError(f"clients.retry_mode must be legacy, standard or adaptive, got {self.retry_mode}")
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """
+    A storefront catalog served by the deployment.
+
+    Its documents are searched in ``index_name`` (an alias, so the index behind it can
+    be rebuilt and swapped), the objects written for it are stored under ``prefix`` in
+    the agent bucket, and ``neighbours_key`` holds the neighbours of its catalog.
+    """
+
+    tenant_id: str
+    index_name: str
+    prefix: str = ""
+    neighbours_key: str = ""
+
+    def __post_init__(self):
+        if not _TENANT_ID.match(self.tenant_id):
+            raise ValueError(f"Invalid tenant id {self.tenant_id!r}, use letters, digits, _ and -")
+        if self.prefix.startswith("/") or (self.prefix and not self.prefix.endswith("/")):
+            raise ValueError(f"tenants.{self.tenant_id}.prefix must be relative and end with /, got {self.prefix}")
+
+    def key(self, key: str) -> str:
+        """Return a key of the agent bucket under the prefix of the tenant."""
+        return f"{self.prefix}{key}"
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Deployment settings of the agent and its clients."""
+
+    region: Optional[str] = None
+    bucket_name: str = ""
+    aoss_host: str = ""
+    index_name: str = ""
+    embedding_size: int = 1024
+    tracing_enabled: bool = False
+    tracing_namespace: str = "FashionAgent"
+    bedrock_max_attempts: int = 5
+    bedrock_max_concurrency: int = 4
+    default_render_tier: str = "final"
+    query_embeddings_key: str = ""
+    neighbours_key: str = ""
+    # Significant digits of the vectors sent to the index, see vectors.py
+    vector_digits: int = 9
+    # Parameter table and API paths of the agent schema as JSON, see bedrock_agent/schema.py
+    action_spec: str = ""
+    action_paths: str = ""
+    # Long-running actions are queued on job_queue_url ("local": run in process)
+    job_mode: bool = False
+    job_queue_url: str = ""
+    # Per-container pools and caches of the agent Lambda
+    postprocess_workers: int = 4
+    image_cache_bytes: int = 64 * 1024 * 1024
+    weather_cache_ttl: float = 3 * 60 * 60
+    # Structured logging, see log_fields.py
+    log_max_field_chars: int = 256
+    log_payload_sample_rate: float = 0.0
+    log_redact_keys: tuple = ()
+    # Profiling of every invocation when profiling_mode is set, see profiling.py
+    profiling_mode: str = ""
+    profiling_output: str = ""
+    profiling_interval_ms: float = 5.0
+    profiling_top: int = 25
+    # Catalogs other than the default one, selected by the tenant_id session attribute
+    tenants: tuple = ()
+    clients: ClientPolicy = field(default_factory=ClientPolicy)
+
+    def __post_init__(self):
+        # The collection endpoint is an URL in the stack outputs, clients need the host
+        host = self.aoss_host.removeprefix("https://").removeprefix("http://").rstrip("/")
+        object.__setattr__(self, "aoss_host", host)
+        if self.embedding_size not in EMBEDDING_SIZES:
+            raise ValueError(f"embeddingSize must be one of {EMBEDDING_SIZES}, got {self.embedding_size}")
+        if self.default_render_tier not in RENDER_TIERS:
+            raise ValueError(f"default_render_tier must be one of {RENDER_TIERS}, got {self.default_render_tier}")
+        if self.bedrock_max_attempts < 1 or self.bedrock_max_concurrency < 1:
+            raise ValueError("bedrock.max_attempts and bedrock.max_concurrency must be at least 1")
+        if not 4 <= self.vector_digits <= 9:
+            raise ValueError(f"opensearch.vector_digits must be between 4 and 9, got {self.vector_digits}")
+        if self.postprocess_workers < 1 or self.log_max_field_chars < 1 or self.profiling_top < 1:
+            raise ValueError("postprocess_workers, logging.max_field_chars and profiling.top must be at least 1")
+        if self.image_cache_bytes < 0 or self.weather_cache_ttl < 0:
+            raise ValueError("image_cache_bytes and weather_cache_ttl must not be negative")
+        if self.profiling_interval_ms <= 0:
+            raise ValueError(f"profiling.interval_ms must be positive, got {self.profiling_interval_ms}")
+        if not 0 <= self.log_payload_sample_rate <= 1:
+            raise ValueError(f"logging.payload_sample_rate must be between 0 and 1, got {self.log_payload_sample_rate}")
+        object.__setattr__(self, "profiling_mode", self.profiling_mode.lower())
+        if self.profiling_mode not in ("", *PROFILING_MODES):
+            raise ValueError(f"profiling.mode must be empty or one of {PROFILING_MODES}, got {self.profiling_mode}")
+        object.__setattr__(self, "log_redact_keys", tuple(key.lower() for key in self.log_redact_keys))
+        ids = [tenant.tenant_id for tenant in self.tenants]
+        prefixes = [tenant.prefix for tenant in self.tenants]
+        if DEFAULT_TENANT in ids or len(set(ids)) != len(ids):
+            raise ValueError(f"Tenant ids must be unique and not {DEFAULT_TENANT!r}, got {ids}")
+        # Keys of different catalogs must never collide
+        nested = [(a, b) for i, a in enumerate(prefixes) for b in prefixes[i + 1 :] if a.startswith(b) or b.startswith(a)]
+        if "" in prefixes or nested:
+            raise ValueError(f"Every tenant needs its own prefix, not nested in another, got {prefixes}")
+        for tenant in self.tenants:
+            if not tenant.index_name:
+                raise ValueError(f"tenants.{tenant.tenant_id}.index_name is required")
+
+    def tenant(self, tenant_id: str = None) -> Tenant:
+        """
+        Return a tenant by id.
+
+        Sessions without a tenant id use the default tenant: ``index_name``, the root of
+        the bucket and ``neighbours_key``. Raises KeyError for an unknown tenant id.
+        """
+        if not tenant_id or tenant_id == DEFAULT_TENANT:
+            return Tenant(DEFAULT_TENANT, self.index_name, "", self.neighbours_key)
+        for tenant in self.tenants:
+            if tenant.tenant_id == tenant_id:
+                return tenant
+        raise KeyError(tenant_id)
+
+    def tenant_for_key(self, key: str) -> Tenant:
+        """Return the tenant owning a key of the agent bucket, by its prefix."""
+        for tenant in self.tenants:
+            if key.startswith(tenant.prefix):
+                return tenant
+        return self.tenant()
+
+    def require(self, *names: str) -> "Settings":
+        """Raise ValueError if any of the given settings is empty, return the settings."""
+        missing = [name for name in names if not getattr(self, name)]
+        if missing:
+            raise ValueError(f"Missing setting(s): {', '.join(missing)}")
+        return self
+
+    @classmethod
+    def from_config(cls, config: dict, outputs: dict = None, **overrides) -> "Settings":
+        """
+        Build the settings from config.yml and, outside the stack, its deployed outputs.
+
+        Args:
+            config (dict): The parsed config.yml, see ``load_config``.
+            outputs (dict): The stack outputs of variables.json, for the bucket and the
+                collection endpoint of a deployed stack.
+            **overrides: Values known to the caller only, e.g. region or bucket_name.
+
+        Returns:
+            Settings: The validated settings.
+        """
+        outputs = outputs or {}
+        logging_config = config.get("logging") or {}
+        profiling_config = config.get("profiling") or {}
+        endpoint = next((value for key, value in outputs.items() if "OSSEndpoint" in key), "")
+        values = {
+            "bucket_name": outputs.get("BucketName") or config.get("bucket_name") or "",
+            "aoss_host": endpoint,
+            "index_name": config.get("opensearch", {}).get("opensearch_index_name", ""),
+            "embedding_size": int(config.get("embeddingSize", 1024)),
+            "tracing_enabled": bool(config.get("tracing_enabled", False)),
+            "tracing_namespace": config.get("tracing_namespace", "FashionAgent"),
+            "bedrock_max_attempts": int(config.get("bedrock", {}).get("max_attempts", 5)),
+            "bedrock_max_concurrency": int(config.get("bedrock", {}).get("max_concurrency", 4)),
+            "default_render_tier": config.get("default_render_tier", "final"),
+            "query_embeddings_key": config.get("query_embeddings_key", ""),
+            "neighbours_key": config.get("neighbours_key", ""),
+            "vector_digits": int(config.get("opensearch", {}).get("vector_digits", 9)),
+            "job_mode": bool(config.get("jobs", {}).get("job_mode", False)),
+            "postprocess_workers": int(config.get("postprocess_workers", 4)),
+            "image_cache_bytes": int(config.get("image_cache_bytes", 64 * 1024 * 1024)),
+            "weather_cache_ttl": float(config.get("weather_cache_ttl", 3 * 60 * 60)),
+            "log_max_field_chars": int(logging_config.get("max_field_chars", 256)),
+            "log_payload_sample_rate": float(logging_config.get("payload_sample_rate", 0)),
+            "log_redact_keys": tuple(str(key) for key in logging_config.get("redact_keys") or ()),
+            "profiling_mode": profiling_config.get("mode") or "",
+            "profiling_output": profiling_config.get("output") or "",
+            "profiling_interval_ms": float(profiling_config.get("interval_ms", 5)),
+            "profiling_top": int(profiling_config.get("top", 25)),
+            "tenants": tuple(
+                Tenant(
+                    str(tenant_id),
+                    tenant.get("index_name", ""),
+                    tenant.get("prefix", f"tenants/{tenant_id}/"),
+                    tenant.get("neighbours_key", ""),
+                )
+                for tenant_id, tenant in sorted((config.get("tenants") or {}).items())
+            ),
+            "clients": ClientPolicy(**config.get("clients", {})),
+        }
+        values.update(overrides)
+        return cls(**values)
+
+    def to_env(self) -> dict:
+        """The Lambda environment variables holding these settings."""
+        env = {
+            name: _to_text(getattr(self, attribute))
+            for attribute, name in ENV_NAMES.items()
+            if getattr(self, attribute) is not None
+        }
+        for attribute in CLIENT_ENV_NAMES:
+            env[CLIENT_ENV_NAMES[attribute]] = _to_text(getattr(self.clients, attribute))
+        if self.tenants:
+            env[TENANTS_ENV_NAME] = json.dumps([dataclasses.asdict(tenant) for tenant in self.tenants])
+        return env
+
+    @classmethod
+    def from_env(cls, environ=None) -> "Settings":
+        """Read the settings written by ``to_env``, with defaults for missing variables."""
+        environ = os.environ if environ is None else environ
+        types = {f.name: f.type for f in dataclasses.fields(cls)}
+        values = {
+            attribute: _parse(environ[name], types[attribute])
+            for attribute, name in ENV_NAMES.items()
+            if name in environ
+        }
+        client_types = {f.name: f.type for f in dataclasses.fields(ClientPolicy)}
+        values["clients"] = ClientPolicy(
+            **{
+                attribute: _parse(environ[name], client_types[attribute])
+                for attribute, name in CLIENT_ENV_NAMES.items()
+                if name in environ
+            }
+        )
+        if environ.get(TENANTS_ENV_NAME):
+            values["tenants"] = tuple(Tenant(**tenant) for tenant in json.loads(environ[TENANTS_ENV_NAME]))
+        return cls(**values)
+
+
+# Setting -> Lambda environment variable. The names predate this module and are kept
+# so functions deployed with an older stack keep working.
+ENV_NAMES = {
+    "region": "region_info",
+    "bucket_name": "s3_bucket",
+    "aoss_host": "aoss_host",
+    "index_name": "index_name",
+    "embedding_size": "embeddingSize",
+    "tracing_enabled": "tracing_enabled",
+    "tracing_namespace": "tracing_namespace",
+    "bedrock_max_attempts": "bedrock_max_attempts",
+    "bedrock_max_concurrency": "bedrock_max_concurrency",
+    "default_render_tier": "default_render_tier",
+    "query_embeddings_key": "query_embeddings_key",
+    "neighbours_key": "neighbours_key",
+    "vector_digits": "vector_digits",
+    "action_spec": "action_spec",
+    "action_paths": "action_paths",
+    "job_mode": "job_mode",
+    "job_queue_url": "job_queue_url",
+    "postprocess_workers": "postprocess_workers",
+    "image_cache_bytes": "image_cache_bytes",
+    "weather_cache_ttl": "weather_cache_ttl",
+    "log_max_field_chars": "log_max_field_chars",
+    "log_payload_sample_rate": "log_payload_sample_rate",
+    "log_redact_keys": "log_redact_keys",
+    "profiling_mode": "profiling_mode",
+    "profiling_output": "profiling_output",
+    "profiling_interval_ms": "profiling_interval_ms",
+    "profiling_top": "profiling_top",
+}
+CLIENT_ENV_NAMES = {f.name: f"client_{f.name}" for f in dataclasses.fields(ClientPolicy)}
+TENANTS_ENV_NAME = "tenants"
+
+
+def _to_text(value) -> str:
+    if isinstance(value, tuple):
+        return ",".join(value)
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def _parse(text: str, type_name):
+    type_name = getattr(type_name, "__name__", str(type_name))
+    if "bool" in type_name:
+        return text.strip().lower() in ("1", "true", "yes")
+    if "int" in type_name:
+        return int(text)
+    if "float" in type_name:
+        return float(text)
+    if "tuple" in type_name:
+        return tuple(filter(None, (item.strip() for item in text.split(","))))
+    return text
+
+
+def load_config(path=None) -> dict:
+    """Parse config.yml, by default the one at the root of the repository."""
+    import yaml
+
+    # Resolved here: in the Lambda layer, this file is not inside the repository
+    path = path or Path(__file__).resolve().parents[4] / "config.yml"
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """The settings of this process, read once from the environment."""
+    return Settings.from_env()
@@ -0,0 +1,159 @@
+"""
+Compact JSON transport of embedding vectors.
+
+Titan returns embeddings as JSON float lists and OpenSearch takes them back as JSON,
+so every vector is parsed and re-serialized on its way to the index. This module
+keeps that path short:
+
+    - JSON is parsed with orjson when it is installed, json otherwise,
+    - embeddings are held as float32 ``array("f")`` (numpy arrays are accepted too),
+      4 bytes per value instead of a Python float object,
+    - vectors are written with ``digits`` significant digits. The index stores
+      float32, for which 9 digits are exact; fewer digits shorten the requests at
+      the cost of rounding below the float32 precision at 7 and more. numpy
+      vectors are rounded in numpy and written by orjson at any number of digits,
+    - ``VectorSerializer`` plugs this into opensearch-py, so search, msearch and
+      bulk bodies format their vectors without an intermediate list of floats,
+      and the parts of a body holding no vector are written by orjson (or json)
+      in one call.
+
+Neither orjson nor numpy is required: numpy arrays are only recognized when numpy is
+already imported by the caller.
+"""
+
+import json
+import sys
+from array import array
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Significant digits that round-trip any float32
+FLOAT32_DIGITS = 9
+DIGITS = FLOAT32_DIGITS
+
+
+def loads(data):
+    """Parse a JSON document (str or bytes)."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def parse_embedding(body) -> dict:
+    """
+    Parse a Titan embeddings response body into a dict holding a float32 array.
+
+    Args:
+        body: The streaming response body of ``invoke_model``.
+
+    Returns:
+        dict: The response, with "embedding" as ``array("f")``.
+    """
+    response = loads(body.read())
+    response["embedding"] = array("f", response["embedding"])
+    return response
+
+
+def is_vector(value) -> bool:
+    """Whether a value is written as a vector: a float ``array`` or a 1-D numpy array."""
+    if isinstance(value, array):
+        return value.typecode in ("f", "d")
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(value, numpy.ndarray) and value.ndim == 1
+
+
+def format_vector(vector, digits: int = DIGITS) -> str:
+    """Return a vector as a JSON array of numbers with ``digits`` significant digits."""
+    numpy = sys.modules.get("numpy")
+    if orjson is not None and numpy is not None and isinstance(vector, numpy.ndarray):
+        # orjson only takes contiguous plain arrays, not rows of a memory-mapped matrix
+        vector = numpy.ascontiguousarray(vector)
+        if digits >= FLOAT32_DIGITS:
+            # orjson writes the shortest text that reads back as the same float32
+            return orjson.dumps(vector.astype("<f4", copy=False), option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        # The shortest text of the rounded float64 values is their first ``digits`` digits
+        return orjson.dumps(_round_significant(numpy, vector, digits), option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    values = vector.tolist()
+    return "[" + ",".join([f"%.{digits}g"] * len(values)) % tuple(values) + "]"
+
+
+def _round_significant(numpy, vector, digits: int):
+    # Same values as "%.{digits}g": scale each value to an integer of ``digits`` digits,
+    # round it and scale it back by an exact power of ten
+    values = vector.astype("<f8")
+    magnitude = numpy.floor(numpy.log10(numpy.abs(values, where=values != 0, out=numpy.ones_like(values))))
+    exponent = digits - 1 - magnitude
+    power = 10.0 ** numpy.abs(exponent)
+    return numpy.where(exponent >= 0, numpy.round(values * power) / power, numpy.round(values / power) * power)
+
+
+def dumps(data, digits: int = DIGITS) -> str:
+    """Serialize a JSON document, writing the vectors it holds with ``format_vector``."""
+    parts = []
+    _encode(data, parts, digits)
+    return "".join(parts)
+
+
+def _dumps_plain(value) -> str:
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, default=str, separators=(",", ":"))
+
+
+def _holds_vector(value) -> bool:
+    if isinstance(value, dict):
+        return any(_holds_vector(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_holds_vector(item) for item in value)
+    return is_vector(value)
+
+
+def _encode(value, parts: list, digits: int) -> None:
+    if is_vector(value):
+        parts.append(format_vector(value, digits))
+    elif not _holds_vector(value):
+        parts.append(_dumps_plain(value))
+    elif isinstance(value, dict):
+        parts.append("{")
+        for position, (key, item) in enumerate(value.items()):
+            if position:
+                parts.append(",")
+            parts.append(json.dumps(str(key)))
+            parts.append(":")
+            _encode(item, parts, digits)
+        parts.append("}")
+    else:
+        parts.append("[")
+        for position, item in enumerate(value):
+            if position:
+                parts.append(",")
+            _encode(item, parts, digits)
+        parts.append("]")
+
+
+class VectorSerializer:
+    """
+    Serializer of opensearch-py clients, passed as ``OpenSearch(serializer=...)``.
+
+    Request bodies are written with ``dumps`` and responses parsed with ``loads``.
+    """
+
+    mimetype = "application/json"
+
+    def __init__(self, digits: int = DIGITS):
+        self.digits = digits
+
+    def dumps(self, data) -> str:
+        # Bodies already serialized, e.g. bulk lines, are sent as they are
+        if isinstance(data, (str, bytes)):
+            return data
+        return dumps(data, self.digits)
+
+    def loads(self, s):
+        try:
+            return loads(s)
+        except ValueError as e:
+            from opensearchpy.exceptions import SerializationError
+
+            raise SerializationError(s, e)
@@ -1,3 +1,4 @@
+import dataclasses
 import json
 from pathlib import Path
 from typing import Any, Dict
@@ -8,10 +9,15 @@ from aws_cdk import aws_bedrock as bedrock
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda as lambda_
 from aws_cdk import aws_s3 as s3
+from aws_cdk import aws_sqs as sqs
+from aws_cdk.aws_lambda_event_sources import SqsEventSource
 from aws_cdk.aws_lambda_python_alpha import PythonLayerVersion
 from cdk_nag import NagSuppressions, NagPackSuppression
 from .opensearchserverless_stack import OpenSearchServerlessConstruct
+from ..bedrock_agent.compact import check_rewrites, compact_instructions, compact_schema, schema_payload
 from ..bedrock_agent.prompt import agent_instructions
+from ..bedrock_agent.schema import action_spec, subset_schema
+from ..layers.common_layer.fashion_common import Settings
 from constructs import Construct
 import os
 
@@ -50,6 +56,31 @@ class FashionAgentStack(cdk.Stack):
             auto_delete_objects=True,
             server_access_logs_bucket=access_log_bucket,
             server_access_logs_prefix="fashion-agent-logs/",
+            # Key layout of the agent images, see components/lambda/agent/storage.py
+            lifecycle_rules=[
+                s3.LifecycleRule(
+                    id="ExpireEphemeral",
+                    prefix="ephemeral/",
+                    expiration=Duration.days(config["storage"]["ephemeral_days"]),
+                    abort_incomplete_multipart_upload_after=Duration.days(1),
+                ),
+                s3.LifecycleRule(
+                    id="TierPersisted",
+                    prefix="persisted/",
+                    transitions=[
+                        s3.Transition(
+                            storage_class=s3.StorageClass.INTELLIGENT_TIERING,
+                            transition_after=Duration.days(config["storage"]["persisted_tiering_days"]),
+                        )
+                    ],
+                    abort_incomplete_multipart_upload_after=Duration.days(1),
+                ),
+                s3.LifecycleRule(
+                    id="ExpireJobs",
+                    prefix="jobs/",
+                    expiration=Duration.days(config["storage"]["ephemeral_days"]),
+                ),
+            ],
         )
 
         CfnOutput(
@@ -66,6 +97,15 @@ class FashionAgentStack(cdk.Stack):
         with open(schema_path, "r") as f:
             schema_content = json.load(f)
 
+        # The agent gets the token-minimized variants, see components/bedrock_agent/compact.py
+        if config.get("compact_agent_prompt", False):
+            check_rewrites(agent_instructions, json.dumps(schema_content))
+            instructions = compact_instructions(agent_instructions)
+            agent_schema = compact_schema(schema_content)
+        else:
+            instructions = agent_instructions
+            agent_schema = schema_content
+
         lambda_policy_document = iam.PolicyDocument(
             statements=[
                 iam.PolicyStatement(
@@ -77,11 +117,19 @@ class FashionAgentStack(cdk.Stack):
                     ],
                 ),
                 iam.PolicyStatement(
-                    actions=["s3:GetObject", "s3:PutObject"],
+                    actions=["s3:GetObject", "s3:PutObject", "s3:ListBucket"],
                     resources=[bucket.bucket_arn, f"{bucket.bucket_arn}/*"],
                 ),
             ]
         )
+        # Lookups copy catalog images kept in another bucket server-side
+        if config.get("catalog_bucket"):
+            lambda_policy_document.add_statements(
+                iam.PolicyStatement(
+                    actions=["s3:GetObject"],
+                    resources=[f"arn:aws:s3:::{config['catalog_bucket']}/catalog/*"],
+                )
+            )
 
         policy_lambda = iam.Policy(
             self, f"{self.stack_name}-policy", document=lambda_policy_document
@@ -155,37 +203,146 @@ class FashionAgentStack(cdk.Stack):
             entry="./components/layers/opensearch_layer",
             compatible_runtimes=[lambda_.Runtime.PYTHON_3_12],
         )
-        # Create lambda function
-        self.lambda_function = lambda_.Function(
+        common_layer = PythonLayerVersion(
             self,
-            "AgentLambda",
-            function_name="FashionAgentLambda",
-            runtime=lambda_.Runtime.PYTHON_3_12,
-            timeout=Duration.seconds(180),
-            role=self.lambda_role,
-            code=lambda_.Code.from_asset("components/lambda/agent"),
-            handler="lambda_function.lambda_handler",
-            environment={
-                "region_info": self.region,
-                "s3_bucket": bucket.bucket_name,
-                "aoss_host": opensearch_endpoint_url,
-                "index_name": config["opensearch"]["opensearch_index_name"],
-                "embeddingSize": config["embeddingSize"],
-            },
-            layers=[
-                lambda_.LayerVersion.from_layer_version_arn(
-                    self,
-                    "PillowLayer",
-                    layer_version_arn=f"arn:aws:lambda:{self.region}:770693421928:layer:Klayers-p312-Pillow:2",
-                ),
-                lambda_.LayerVersion.from_layer_version_arn(
-                    self,
-                    "RequestsLayer",
-                    layer_version_arn=f"arn:aws:lambda:{self.region}:770693421928:layer:Klayers-p312-requests:6",
-                ),
-                os_custom_layer,
-            ],
+            f'{config["agent_name"]}-CommonLayer',
+            entry="./components/layers/common_layer",
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_12],
+        )
+        # Validated at synth time, read back by the Lambda with Settings.from_env
+        settings = Settings.from_config(
+            config,
+            region=self.region,
+            bucket_name=bucket.bucket_name,
+            aoss_host=opensearch_endpoint_url,
+            action_spec=json.dumps(action_spec(schema_content), separators=(",", ":")),
+            # Every path of the schema, so a typo in an action registration fails at import
+            action_paths=json.dumps(sorted(schema_content["paths"]), separators=(",", ":")),
         )
+        # Tenants keep the key layout of the agent bucket under their own prefix
+        for tenant in settings.tenants:
+            bucket.add_lifecycle_rule(
+                id=f"ExpireEphemeral-{tenant.tenant_id}",
+                prefix=tenant.key("ephemeral/"),
+                expiration=Duration.days(config["storage"]["ephemeral_days"]),
+                abort_incomplete_multipart_upload_after=Duration.days(1),
+            )
+            bucket.add_lifecycle_rule(
+                id=f"ExpireJobs-{tenant.tenant_id}",
+                prefix=tenant.key("jobs/"),
+                expiration=Duration.days(config["storage"]["ephemeral_days"]),
+            )
+            bucket.add_lifecycle_rule(
+                id=f"TierPersisted-{tenant.tenant_id}",
+                prefix=tenant.key("persisted/"),
+                transitions=[
+                    s3.Transition(
+                        storage_class=s3.StorageClass.INTELLIGENT_TIERING,
+                        transition_after=Duration.days(config["storage"]["persisted_tiering_days"]),
+                    )
+                ],
+                abort_incomplete_multipart_upload_after=Duration.days(1),
+            )
+        lambda_layers = [
+            lambda_.LayerVersion.from_layer_version_arn(
+                self,
+                "PillowLayer",
+                layer_version_arn=f"arn:aws:lambda:{self.region}:770693421928:layer:Klayers-p312-Pillow:2",
+            ),
+            lambda_.LayerVersion.from_layer_version_arn(
+                self,
+                "RequestsLayer",
+                layer_version_arn=f"arn:aws:lambda:{self.region}:770693421928:layer:Klayers-p312-requests:6",
+            ),
+            os_custom_layer,
+            common_layer,
+        ]
+        agent_code = lambda_.Code.from_asset("components/lambda/agent")
+        log_group_arns = []
+
+        # Job mode: image generation and editing run in a worker fed by an SQS queue
+        if settings.job_mode:
+            job_timeout = Duration.seconds(config["jobs"]["worker_timeout"])
+            job_dead_letter_queue = sqs.Queue(
+                self,
+                "JobDeadLetterQueue",
+                enforce_ssl=True,
+                retention_period=Duration.days(4),
+            )
+            NagSuppressions.add_resource_suppressions(
+                job_dead_letter_queue,
+                [
+                    NagPackSuppression(
+                        id="AwsSolutions-SQS3",
+                        reason="This queue is the dead-letter queue of the job queue",
+                    )
+                ],
+            )
+            job_queue = sqs.Queue(
+                self,
+                "JobQueue",
+                enforce_ssl=True,
+                visibility_timeout=job_timeout * 6,
+                dead_letter_queue=sqs.DeadLetterQueue(
+                    max_receive_count=2, queue=job_dead_letter_queue
+                ),
+            )
+            job_queue.grant_send_messages(self.lambda_role)
+            # job_mode comes with the settings, the queue is only known here
+            settings = dataclasses.replace(settings, job_queue_url=job_queue.queue_url)
+
+            self.job_worker_function = lambda_.Function(
+                self,
+                "JobWorkerLambda",
+                function_name="FashionAgentJobWorker",
+                runtime=lambda_.Runtime.PYTHON_3_12,
+                timeout=job_timeout,
+                memory_size=config["jobs"]["worker_memory"],
+                role=self.lambda_role,
+                code=agent_code,
+                handler="lambda_function.job_handler",
+                environment=settings.to_env(),
+                layers=lambda_layers,
+            )
+            self.job_worker_function.add_event_source(
+                SqsEventSource(job_queue, batch_size=1, report_batch_item_failures=True)
+            )
+            log_group_arns.append(
+                f"arn:aws:logs:{self.region}:{self.account}:log-group:/aws/lambda/{self.job_worker_function.function_name}:*"
+            )
+
+        # Create one lambda function per profile, each serving a subset of the API paths
+        profiles = config["lambda_profiles"]
+        assigned = [path for profile in profiles.values() for path in profile["actions"]]
+        unassigned = set(schema_content["paths"]) - set(assigned)
+        if unassigned or len(assigned) != len(set(assigned)):
+            raise ValueError(
+                f"Every API path must belong to exactly one lambda profile, check {sorted(unassigned) or assigned}"
+            )
+        self.lambda_functions = {}
+        self.profile_schemas = {}
+        for profile_name, profile in profiles.items():
+            self.profile_schemas[profile_name] = subset_schema(schema_content, profile["actions"])
+            self.lambda_functions[profile_name] = lambda_.Function(
+                self,
+                f"AgentLambda-{profile_name}",
+                function_name=f"FashionAgentLambda-{profile_name}",
+                runtime=lambda_.Runtime.PYTHON_3_12,
+                timeout=Duration.seconds(profile["timeout"]),
+                memory_size=profile["memory"],
+                reserved_concurrent_executions=profile.get("reserved_concurrency"),
+                role=self.lambda_role,
+                code=agent_code,
+                handler="lambda_function.lambda_handler",
+                environment=dataclasses.replace(
+                    settings,
+                    action_spec=json.dumps(action_spec(self.profile_schemas[profile_name]), separators=(",", ":")),
+                ).to_env(),
+                layers=lambda_layers,
+            )
+            log_group_arns.append(
+                f"arn:aws:logs:{self.region}:{self.account}:log-group:/aws/lambda/{self.lambda_functions[profile_name].function_name}:*"
+            )
 
         self.lambda_cloudwatch_access_policy = iam.Policy(
             self,
@@ -197,9 +354,7 @@ class FashionAgentStack(cdk.Stack):
                         actions=[
                             "logs:*",
                         ],
-                        resources=[
-                            f"arn:aws:logs:{self.region}:{self.account}:log-group:/aws/lambda/{self.lambda_function.function_name}:*",
-                        ],
+                        resources=log_group_arns,
                     )
                 ]
             ),
@@ -219,7 +374,8 @@ class FashionAgentStack(cdk.Stack):
             },
         )
 
-        self.lambda_function.grant_invoke(bedrock_principal)
+        for function in self.lambda_functions.values():
+            function.grant_invoke(bedrock_principal)
 
         # Create IAM Role for the agent
         agent_role = iam.Role(
@@ -265,18 +421,19 @@ class FashionAgentStack(cdk.Stack):
             description="Agent for fashion related topics",
             foundation_model=config["foundation_model"],
             idle_session_ttl_in_seconds=3600,
-            instruction=agent_instructions,
+            instruction=instructions,
             action_groups=[
                 bedrock.CfnAgent.AgentActionGroupProperty(
-                    action_group_name="imagevar",
+                    action_group_name=profile_name,
                     action_group_executor=bedrock.CfnAgent.ActionGroupExecutorProperty(
-                        lambda_=self.lambda_function.function_arn
+                        lambda_=function.function_arn
                     ),
                     api_schema=bedrock.CfnAgent.APISchemaProperty(
-                        payload=json.dumps(schema_content)
+                        payload=schema_payload(subset_schema(agent_schema, profiles[profile_name]["actions"]))
                     ),
-                    description="Actions related to creating images and getting information to process images",
+                    description=profiles[profile_name]["description"],
                 )
+                for profile_name, function in self.lambda_functions.items()
             ],
         )
 
@@ -1,15 +1,21 @@
 import streamlit as st
-import bedrock_agent
 from PIL import Image
 import io
-import boto3
+import hashlib
+import sys
 import uuid
 import re
 import json
-import yaml
+import time
+from pathlib import Path
+from botocore.exceptions import ClientError
 
-with open("config.yml", "r") as ymlfile:
-    config = yaml.load(ymlfile, Loader=yaml.SafeLoader)
+# Settings and clients shared with the agent Lambda
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "components/layers/common_layer"))
+import bedrock_agent  # noqa: E402
+from fashion_common import Settings, clients, load_config  # noqa: E402
+
+config = load_config("config.yml")
 
 with open("variables.json", "r") as f:
     variables = json.load(f)
@@ -18,8 +24,9 @@ stack_name = config["stack_name"]
 agent_id = variables[stack_name]["AgentId"]
 agent_alias_id = variables[stack_name]["AgentAliasId"]
 default_bucket = variables[stack_name]["BucketName"]
+settings = Settings.from_config(config, variables[stack_name])
 
-bedrock = bedrock_agent.BedrockAgent(agent_id, agent_alias_id)
+bedrock = bedrock_agent.BedrockAgent(agent_id, agent_alias_id, settings)
 
 # To resolve 403 issue with uploading: https://discuss.streamlit.io/t/axioserror-request-failed-with-status-code-403/38112/12
 
@@ -28,6 +35,7 @@ st.session_state.setdefault("img", None)
 st.session_state.setdefault("previous_img", None)
 st.session_state.setdefault("s3_key", None)
 st.session_state.setdefault("img_displayed", False)
+st.session_state.setdefault("last_image", None)
 
 st.title("Fashion Assistant")
 INIT_MESSAGE = {
@@ -49,15 +57,18 @@ def new_chat() -> None:
     st.session_state["previous_img"] = None
     st.session_state["s3_key"] = None
     st.session_state["user_image"] = None
+    st.session_state["last_image"] = None
     bedrock.new_session()
 
 
-def upload_to_s3(bucket_name, s3_key):
+def upload_to_s3(bucket_name):
     """
-    This function uploads the image to S3.
+    This function uploads the image to S3 under its content-addressed key and
+    returns the key. An image uploaded before is not uploaded again.
     """
-    s3 = boto3.client("s3")
+    s3 = clients.client("s3", settings)
     image = Image.open(st.session_state["img"])
+    image_format = image.format
     max_size = 1024, 1024
     min_size = 256, 256
     original_width, original_height = image.size
@@ -66,34 +77,127 @@ def upload_to_s3(bucket_name, s3_key):
     if original_width < min_size[0] or original_height < min_size[1]:
         image = image.resize(min_size)
     image_bytes = io.BytesIO()
-    image.save(image_bytes, format=image.format)
-    image_bytes.seek(0)
-    s3.upload_fileobj(image_bytes, bucket_name, s3_key)
+    image.save(image_bytes, format=image_format)
+    # Same layout as components/lambda/agent/storage.py, uploads are ephemeral
+    digest = hashlib.sha256(image_bytes.getvalue()).hexdigest()
+    tenant = settings.tenant(st.session_state.get("tenant_id"))
+    s3_key = tenant.key(f"ephemeral/{digest[:2]}/{digest}.{image_format.lower()}")
+    try:
+        s3.head_object(Bucket=bucket_name, Key=s3_key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NotFound"):
+            raise
+        image_bytes.seek(0)
+        s3.upload_fileobj(image_bytes, bucket_name, s3_key)
     st.session_state["s3_key"] = s3_key
+    return s3_key
 
 
 def download_from_s3(bucket_name, key):
     """
     This function downloads the image from S3.
     """
-    s3 = boto3.client("s3")
+    s3 = clients.client("s3", settings)
     response = s3.get_object(Bucket=bucket_name, Key=key)
     img_bytes = response["Body"].read()
     img = Image.open(io.BytesIO(img_bytes))
     return img
 
 
+def wait_for_job(bucket_name, job_id, timeout=300, interval=2):
+    """
+    This function polls the status of a job submitted by the agent in job mode
+    until it finishes or the timeout (in seconds) expires.
+    """
+    s3 = clients.client("s3", settings)
+    deadline = time.monotonic() + timeout
+    status = {"status": "pending"}
+    while time.monotonic() < deadline:
+        try:
+            key = settings.tenant(st.session_state.get("tenant_id")).key(f"jobs/{job_id}.json")
+            response = s3.get_object(Bucket=bucket_name, Key=key)
+            status = json.loads(response["Body"].read())
+        except s3.exceptions.NoSuchKey:
+            pass
+        if status["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(interval)
+    return status
+
+
+def job_image(job):
+    """
+    This function returns the S3 location of the image rendered by a succeeded job,
+    from the render response recorded as its result.
+    """
+    if job["status"] != "succeeded":
+        return None
+    try:
+        return json.loads(job["result"])["image"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def get_render_info(bucket_name, key):
+    """
+    This function reads the render tier and seed recorded on a generated image.
+    """
+    s3 = clients.client("s3", settings)
+    metadata = s3.head_object(Bucket=bucket_name, Key=key).get("Metadata", {})
+    return metadata.get("render-tier"), metadata.get("seed")
+
+
+def show_image(column, image):
+    """
+    Displays an image returned by the agent with its download button.
+    """
+    column.image(image, caption="Retrieved Image", width=200)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    column.download_button(
+        label="Download Image",
+        data=buffer,
+        file_name="generated_image.png",
+        mime="image/png",
+        key=str(uuid.uuid4()),
+    )
+
+
+def render_final_version():
+    """
+    Asks the agent to re-render the last preview image in final quality with the same seed.
+    """
+    bucket_name, key = st.session_state["last_image"]
+    _, seed = get_render_info(bucket_name, key)
+    st.session_state["pending_prompt"] = (
+        "Create the final version of the last image with the same description, "
+        f"using render_tier final and seed {seed}."
+    )
+
+
 with st.sidebar:
     st.sidebar.button("New Chat", on_click=new_chat, type="primary")
+    if settings.tenants:
+        st.session_state["tenant_id"] = st.selectbox(
+            "Catalog", ["default"] + [tenant.tenant_id for tenant in settings.tenants], on_change=new_chat
+        )
     st.session_state["img"] = st.file_uploader(
         "Upload an image", type=["png", "jpeg"], label_visibility="collapsed"
     )
+    st.session_state["render_tier"] = st.radio(
+        "Image quality",
+        ["preview", "final"],
+        index=["preview", "final"].index(settings.default_render_tier),
+        format_func=lambda tier: "Preview (fast)" if tier == "preview" else "Final",
+        horizontal=True,
+    )
+    if st.session_state["last_image"] is not None:
+        if get_render_info(*st.session_state["last_image"])[0] == "preview":
+            st.button("Render final version", on_click=render_final_version)
 
 if st.session_state["img"] is not None:
     if st.session_state["img"] != st.session_state["previous_img"]:
-        folder = "blogpost/"
-        random_s3_key = folder + str(uuid.uuid4()) + ".png"
-        upload_to_s3(default_bucket, random_s3_key)
+        random_s3_key = upload_to_s3(default_bucket)
         st.session_state["previous_img"] = st.session_state["img"]
         st.session_state["img_displayed"] = False
         st.session_state["user_image"] = st.session_state["img"]
@@ -116,18 +220,9 @@ for index, chat in enumerate(st.session_state["chat_history"]):
 
             col1.markdown(chat["content"], unsafe_allow_html=True)
 
-            # Display the generated image if it exists in the chat history
-            if "image" in chat:
-                col1.image(chat["image"], caption="Retrieved Image", width=200)
-                buffer = io.BytesIO()
-                chat["image"].save(buffer, format="PNG")
-                col1.download_button(
-                    label="Download Image",
-                    data=buffer,
-                    file_name="generated_image.png",
-                    mime="image/png",
-                    key=str(uuid.uuid4()),
-                )
+            # Display the generated images if they exist in the chat history
+            for image in chat.get("images", []):
+                show_image(col1, image)
 
             if "trace" in chat and col3.checkbox(
                 "Trace", value=False, key=index, label_visibility="visible"
@@ -137,7 +232,10 @@ for index, chat in enumerate(st.session_state["chat_history"]):
         else:
             st.markdown(chat["content"])
 
-if prompt := st.chat_input("Start your conversation..."):
+if prompt := (
+    st.chat_input("Start your conversation...")
+    or st.session_state.pop("pending_prompt", None)
+):
     st.session_state["chat_history"].append({"role": "human", "content": prompt})
 
     with st.chat_message("human"):
@@ -153,45 +251,51 @@ if prompt := st.chat_input("Start your conversation..."):
             label_visibility="visible",
         ):
             col2.subheader("Trace")
+        agent_prompt = prompt
+        if "render_tier" not in prompt:
+            agent_prompt += f" Use render_tier {st.session_state['render_tier']} for any new image."
         if st.session_state["user_image"] is not None:
             random_key = st.session_state["random_s3_key"]
             input_s3_uri = f"s3://{default_bucket}/{random_key}"
             content = (
-                prompt
+                agent_prompt
                 + "The image I'm talking about is stored in S3 here: "
                 + f"<input_s3_uri>{input_s3_uri}<input_s3_uri>"
             )
             print("Final Prompt", content)
-            response_text, trace_text = bedrock.invoke_agent(content, col2)
+            response_text, trace_text = bedrock.invoke_agent(content, col2, st.session_state.get("tenant_id"))
 
         else:
-            response_text, trace_text = bedrock.invoke_agent(prompt, col2)
-        if "s3://" in response_text:
-            s3_uri = bedrock.response_parser(
-                response_text, "<generated_s3_uri>", "</generated_s3_uri>"
-            )
-            bucket, generated_s3_key = s3_uri.replace("s3://", "").split("/", 1)
-            generated_img = download_from_s3(bucket, generated_s3_key)
-
-            # Display the generated image in the chat message
-            col1.image(generated_img, caption="Retrieved Image", width=200)
-            buffer = io.BytesIO()
-            generated_img.save(buffer, format="PNG")
-            col1.download_button(
-                label="Download Image",
-                data=buffer,
-                file_name="generated_image.png",
-                mime="image/png",
-                key=str(uuid.uuid4()),
-            )
+            response_text, trace_text = bedrock.invoke_agent(agent_prompt, col2, st.session_state.get("tenant_id"))
+        if "<job_id>" in response_text:
+            job_id = bedrock.response_parser(response_text, "<job_id>", "</job_id>")
+            with st.spinner("Your image is being created..."):
+                job = wait_for_job(default_bucket, job_id)
+            image_s3_uri = job_image(job)
+            if image_s3_uri:
+                response_text += f"<generated_s3_uri>{image_s3_uri}</generated_s3_uri>"
+            else:
+                response_text += "\n\nThe image could not be created, please try again."
+        # A batch lookup (e.g. a full outfit) returns one URI per item
+        s3_uris = re.findall(r"<generated_s3_uri>\s*(s3://.*?)\s*</generated_s3_uri>", response_text)
+        if s3_uris:
+            generated_imgs = []
+            for s3_uri in s3_uris:
+                bucket, generated_s3_key = s3_uri.replace("s3://", "").split("/", 1)
+                generated_img = download_from_s3(bucket, generated_s3_key)
+                st.session_state["last_image"] = (bucket, generated_s3_key)
+
+                # Display the generated image in the chat message
+                show_image(col1, generated_img)
+                generated_imgs.append(generated_img)
 
-            # Add the generated image to the chat history
+            # Add the generated images to the chat history
             st.session_state["chat_history"].append(
                 {
                     "role": "assistant",
                     "content": response_text,
                     "trace": trace_text,
-                    "image": generated_img,
+                    "images": generated_imgs,
                 }
             )
         else:
@@ -1,7 +1,6 @@
 import streamlit as st
 
-from botocore.config import Config
-from boto3.session import Session
+from fashion_common import clients
 
 import uuid
 import json
@@ -33,11 +32,9 @@ class BedrockAgent:
     in secrets management.
     """
 
-    def __init__(self, agent_id, agent_alias_id) -> None:
+    def __init__(self, agent_id, agent_alias_id, settings=None) -> None:
         if "BEDROCK_RUNTIME_CLIENT" not in st.session_state:
-            st.session_state["BEDROCK_RUNTIME_CLIENT"] = Session().client(
-                "bedrock-agent-runtime", config=Config(read_timeout=600)
-            )
+            st.session_state["BEDROCK_RUNTIME_CLIENT"] = clients.client("bedrock-agent-runtime", settings)
 
         if "SESSION_ID" not in st.session_state:
             st.session_state["SESSION_ID"] = str(uuid.uuid1())
@@ -47,18 +44,21 @@ class BedrockAgent:
     def new_session(self):
         st.session_state["SESSION_ID"] = str(uuid.uuid1())
 
-    def invoke_agent(self, input_text, trace):
+    def invoke_agent(self, input_text, trace, tenant_id=None):
 
         response_text = ""
         trace_text = ""
         step = 0
 
+        # The agent Lambda serves the catalog of the tenant_id session attribute
+        session_state = {"sessionAttributes": {"tenant_id": tenant_id}} if tenant_id else {}
         response = st.session_state["BEDROCK_RUNTIME_CLIENT"].invoke_agent(
             inputText=input_text,
             agentId=self.agent_id,
             agentAliasId=self.agent_alias_id,
             sessionId=st.session_state["SESSION_ID"],
             enableTrace=True,
+            **({"sessionState": session_state} if session_state else {}),
         )
         try:
             for event in response["completion"]:
@@ -0,0 +1,58 @@
+"""
+Shared fixtures: the agent Lambda modules run against the replay stand-ins.
+
+The Lambda modules read their settings and clients when they are imported, so the
+harness is started once per session, before any test module imports them.
+"""
+
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from tools.replay.harness import Harness  # noqa: E402
+
+_harness = None
+
+
+def pytest_configure(config):
+    global _harness
+    _harness = Harness(Path(tempfile.mkdtemp(prefix="replay-tests-"))).start()
+
+
+def pytest_unconfigure(config):
+    if _harness is not None:
+        _harness.stop()
+        shutil.rmtree(_harness.workdir, ignore_errors=True)
+
+
+@pytest.fixture
+def harness():
+    """The started replay harness, its stand-ins in ``s3``, ``opensearch``, ``bedrock``."""
+    return _harness
+
+
+@pytest.fixture
+def lambda_function(harness):
+    return harness.lambda_function
+
+
+@pytest.fixture
+def job_mode(monkeypatch, lambda_function):
+    """Run the asynchronous actions as jobs, on an in-memory store and a local thread pool."""
+    import jobs
+
+    store = jobs.LocalJobStore()
+    queue = jobs.LocalJobQueue(lambda message: jobs.run(store, lambda_function.registry.dispatch, message))
+    monkeypatch.setattr(lambda_function, "JOB_MODE", True)
+    monkeypatch.setattr(lambda_function, "job_store", store)
+    monkeypatch.setattr(lambda_function, "job_queue", queue)
+    yield store
+    queue.executor.shutdown(wait=True)
+
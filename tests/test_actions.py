@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+import actions
+
+SPEC = {
+    "/weather": [["location_name", "string", True], ["days", "integer", False]],
+    "/batch_image_lookup": [["queries", "array", True]],
+    "/inpaint": [["text", "string", True], ["final", "boolean", False]],
+}
+
+
+@pytest.fixture
+def registry():
+    registry = actions.ActionRegistry(SPEC, ["/weather", "/batch_image_lookup", "/inpaint", "/outpaint"])
+
+    @registry.action("/weather")
+    def weather(event, params):
+        if params.location_name == "atlantis":
+            raise actions.ActionError("Could not find location atlantis")
+        return {"body": params, "response_code": 200}
+
+    @registry.action("/batch_image_lookup")
+    def batch(event, params):
+        return {"body": params.queries, "response_code": 200}
+
+    # Served by another function of the stack, see lambda_profiles
+    @registry.action("/outpaint")
+    def outpaint(event, params):
+        raise AssertionError("not served here")
+
+    return registry
+
+
+def event(api_path, **parameters):
+    return {"apiPath": api_path, "parameters": [{"name": name, "value": value} for name, value in parameters.items()]}
+
+
+def test_parse(registry):
+    params = registry.dispatch(event("/weather", location_name="Paris", days="3"))["body"]
+
+    assert (params.location_name, params.days) == ("Paris", 3)
+    with pytest.raises(AttributeError):
+        params.days = 4
+
+
+def test_boolean(registry):
+    params = registry.parse("/inpaint", event("/inpaint", text="x", final="True"))
+
+    assert params.final is True
+    assert registry.parse("/inpaint", event("/inpaint", text="x")).final is None
+
+
+@pytest.mark.parametrize(
+    "value", ['["red dress", "blue jeans"]', "[red dress, blue jeans]", "red dress|blue jeans", ["red dress", "blue jeans"]]
+)
+def test_arrays(registry, value):
+    assert registry.dispatch(event("/batch_image_lookup", queries=value))["body"] == ("red dress", "blue jeans")
+
+
+def test_invalid_requests(registry):
+    assert registry.dispatch(event("/weather")) == {
+        "body": "Invalid request: Missing required parameter(s): location_name",
+        "response_code": 400,
+    }
+    assert registry.dispatch(event("/weather", location_name="Paris", days="many"))["body"] == (
+        "Invalid request: Parameter days must be of type integer"
+    )
+    assert registry.dispatch(event("/inpaint", text="x")) == {"body": "Unknown API path", "response_code": 400}
+    assert registry.dispatch(event("/outpaint", text="x")) == {"body": "Unknown API path", "response_code": 400}
+
+
+def test_action_errors(registry):
+    assert registry.dispatch(event("/weather", location_name="atlantis")) == {
+        "body": "Could not find location atlantis",
+        "response_code": 400,
+    }
+
+
+def test_asynchronous_actions(registry):
+    submitted = []
+
+    @registry.action("/inpaint", asynchronous=True)
+    def inpaint(event, params):
+        return {"body": "inline", "response_code": 200}
+
+    def submit(event, params):
+        submitted.append(params.final)
+        return {"body": "Job 1 submitted", "response_code": 200}
+
+    assert registry.dispatch(event("/inpaint", text="x", final="true"), submit)["body"] == "Job 1 submitted"
+    assert submitted == [True]
+    assert registry.dispatch(event("/inpaint", text="x"))["body"] == "inline"
+    # Synchronous actions ignore the submitter
+    assert registry.dispatch(event("/weather", location_name="Paris"), submit)["body"].location_name == "Paris"
+
+
+def test_undeclared_path():
+    registry = actions.ActionRegistry(SPEC)
+
+    with pytest.raises(ValueError):
+        registry.action("/shopping_cart")(lambda event, params: None)
+
+
+def test_load_registry():
+    registry = actions.load_registry(json.dumps(SPEC), json.dumps(["/outpaint"]))
+
+    assert registry.action("/outpaint")(len) is len
+    with pytest.raises(ValueError):
+        registry.action("/shopping_cart")(len)
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from components.bedrock_agent import compact
+from components.bedrock_agent.prompt import agent_instructions
+from components.bedrock_agent.schema import action_spec, load_schema, subset_schema
+
+SCHEMA = load_schema("FashionAgent_Schema.json")
+
+
+def test_action_spec():
+    spec = action_spec(SCHEMA)
+
+    assert set(spec) == set(SCHEMA["paths"])
+    assert ["location_name", "string", True] in spec["/weather"]
+    assert spec["/batch_image_lookup"][0][:2] == ["queries", "array"]
+    assert all(len(parameter) == 3 for parameters in spec.values() for parameter in parameters)
+
+
+def test_subset_schema():
+    subset = subset_schema(SCHEMA, ["/weather"])
+
+    assert list(subset["paths"]) == ["/weather"]
+    assert subset["info"] == SCHEMA["info"]
+    with pytest.raises(ValueError):
+        subset_schema(SCHEMA, ["/weather", "/shopping_cart"])
+
+
+def strip_descriptions(value):
+    if isinstance(value, dict):
+        return {
+            key: strip_descriptions(item) for key, item in value.items() if key not in ("description", "summary")
+        }
+    if isinstance(value, list):
+        return [strip_descriptions(item) for item in value]
+    return value
+
+
+def test_compact_schema_keeps_the_contract():
+    compact_schema = compact.compact_schema(SCHEMA)
+
+    assert strip_descriptions(compact_schema) == strip_descriptions(SCHEMA)
+    assert action_spec(compact_schema) == action_spec(SCHEMA)
+    assert compact.estimate_tokens(compact.schema_payload(compact_schema)) < compact.estimate_tokens(json.dumps(SCHEMA))
+
+
+def test_compact_instructions():
+    instructions = compact.compact_instructions(agent_instructions)
+
+    assert compact.estimate_tokens(instructions) < compact.estimate_tokens(agent_instructions)
+    assert "" not in instructions.splitlines()
+
+
+def test_rewrites_match_the_sources():
+    compact.check_rewrites(agent_instructions, json.dumps(SCHEMA))
+
+    with pytest.raises(ValueError, match="no longer found in the sources"):
+        compact.check_rewrites("nothing of it")
+
+
+def test_compact_text():
+    assert compact.compact_text("  Follow these steps\n to handle   user requests: ") == "For each request:"
+    assert compact.stale_rewrites("nothing of it") == list(compact.REWRITES)
+
+
+def test_estimate_tokens():
+    assert compact.estimate_tokens("") == 0
+    assert compact.estimate_tokens("abcd abcde") == 3
+    assert compact.estimate_tokens("a, b.") == 4
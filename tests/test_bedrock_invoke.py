@@ -0,0 +1,88 @@
+import io
+import json
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+
+class FakeBedrock:
+    def __init__(self, errors=(), release=None):
+        self.errors = list(errors)
+        self.release = release
+        self.calls = 0
+
+    def invoke_model(self, body, modelId, **kwargs):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        if self.errors:
+            raise ClientError({"Error": {"Code": self.errors.pop(0), "Message": ""}}, "InvokeModel")
+        return {"body": io.BytesIO(json.dumps({"echo": json.loads(body)}).encode())}
+
+
+@pytest.fixture
+def bedrock(monkeypatch):
+    import bedrock_invoke
+
+    monkeypatch.setattr(bedrock_invoke.time, "sleep", lambda seconds: None)
+
+    def install(fake):
+        monkeypatch.setattr(bedrock_invoke, "bedrock_client", fake)
+        return fake
+
+    return install
+
+
+def test_retries_throttling(bedrock):
+    import bedrock_invoke
+
+    fake = bedrock(FakeBedrock(["ThrottlingException", "ServiceUnavailableException"]))
+
+    assert bedrock_invoke.invoke_model("model", json.dumps({"a": 1})) == {"echo": {"a": 1}}
+    assert fake.calls == 3
+
+
+def test_gives_up_after_max_attempts(bedrock):
+    import bedrock_invoke
+
+    fake = bedrock(FakeBedrock(["ThrottlingException"] * bedrock_invoke.MAX_ATTEMPTS))
+
+    with pytest.raises(ClientError):
+        bedrock_invoke.invoke_model("model", "{}")
+    assert fake.calls == bedrock_invoke.MAX_ATTEMPTS
+
+
+def test_other_errors_are_not_retried(bedrock):
+    import bedrock_invoke
+
+    fake = bedrock(FakeBedrock(["ValidationException"]))
+
+    with pytest.raises(ClientError):
+        bedrock_invoke.invoke_model("model", "{}")
+    assert fake.calls == 1
+
+
+def test_identical_requests_are_coalesced(bedrock):
+    import bedrock_invoke
+
+    release = threading.Event()
+    fake = bedrock(FakeBedrock(release=release))
+    results = []
+
+    def call():
+        results.append(bedrock_invoke.invoke_model("model", json.dumps({"same": True})))
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while not bedrock_invoke._inflight:
+        pass
+    # The followers wait on the flight of the first caller
+    threading.Timer(0.2, release.set).start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [{"echo": {"same": True}}] * 4
+    assert fake.calls == 1
+
@@ -0,0 +1,31 @@
+import numpy as np
+
+from tools.catalog_neighbours import top_neighbours
+
+
+def brute_force(vectors, neighbours):
+    distances = ((vectors[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    np.fill_diagonal(distances, np.inf)
+    order = np.argsort(distances, axis=1)[:, :neighbours]
+    return order, 1 / (1 + np.take_along_axis(distances, order, axis=1))
+
+
+def test_blocks_match_brute_force():
+    vectors = np.random.default_rng(0).standard_normal((50, 8)).astype(np.float32)
+
+    positions, scores = top_neighbours(vectors, 5, row_block=7, column_block=11)
+
+    expected_positions, expected_scores = brute_force(vectors.astype(np.float64), 5)
+    assert np.array_equal(positions, expected_positions)
+    assert np.allclose(scores, expected_scores, rtol=1e-4)
+    assert positions.dtype == np.int32 and scores.dtype == np.float32
+
+
+def test_fewer_rows_than_neighbours():
+    vectors = np.eye(3, dtype=np.float32)
+
+    positions, scores = top_neighbours(vectors, 4)
+
+    assert (positions[:, 2:] == -1).all() and (scores[:, 2:] == 0).all()
+    assert all(row not in positions[row] for row in range(3))
+    assert top_neighbours(vectors[:1], 4)[0].tolist() == [[-1, -1, -1, -1]]
@@ -0,0 +1,20 @@
+from fashion_common import ClientPolicy, Settings, clients
+
+
+def test_client_config():
+    settings = Settings(clients=ClientPolicy(read_timeout=30, max_attempts=4, max_pool_connections=32))
+
+    config = clients.client_config("s3", settings)
+    assert config.read_timeout == 30
+    assert config.retries == {"mode": "adaptive", "total_max_attempts": 4}
+    assert config.max_pool_connections == 32
+
+    # Long calls keep their own read timeout, callers retrying on their own ask for one attempt
+    config = clients.client_config("bedrock-runtime", settings, max_attempts=1)
+    assert config.read_timeout == clients.READ_TIMEOUTS["bedrock-runtime"]
+    assert config.retries["total_max_attempts"] == 1
+
+
+def test_session_is_shared():
+    assert clients.session(region_name="us-east-1") is clients.session(region_name="us-east-1")
+    assert clients.session(region_name="us-east-1") is not clients.session(region_name="eu-west-1")
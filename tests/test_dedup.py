@@ -0,0 +1,41 @@
+import numpy as np
+
+from tools import dedup
+
+
+def test_normalize():
+    unit = dedup.normalize(np.array([[3.0, 4.0], [0.0, 2.0]]))
+
+    assert np.allclose(np.linalg.norm(unit, axis=1), 1)
+
+
+def test_dedup_finds_noisy_copies():
+    vectors, source = dedup.synthetic(400, 64, duplicate_share=0.25, noise=0.05, seed=1)
+    ids = [f"{n:04d}" for n in range(len(vectors))]
+
+    keep, aliases = dedup.dedup(ids, vectors, threshold=0.95)
+
+    assert sorted(keep) == sorted(set(source))
+    for canonical, duplicates in aliases.items():
+        for duplicate in duplicates:
+            assert source[int(duplicate)] == source[int(canonical)]
+    assert sum(len(duplicates) for duplicates in aliases.values()) == len(vectors) - len(keep)
+
+
+def test_dedup_keeps_distinct_documents():
+    vectors, _ = dedup.synthetic(100, 64, duplicate_share=0.0, noise=0.0, seed=2)
+
+    keep, aliases = dedup.dedup([str(n) for n in range(100)], vectors)
+
+    assert len(keep) == 100 and aliases == {}
+
+
+def test_cluster_is_transitive():
+    base = np.zeros((3, 8))
+    base[:, 0] = 1
+    base[1, 1] = 0.05
+    base[2, 1] = 0.1
+
+    canonical = dedup.cluster(base, threshold=0.995)
+
+    assert len(set(canonical.tolist())) == 1
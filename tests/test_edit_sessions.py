@@ -0,0 +1,75 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tools.replay.stubs import LocalS3
+
+
+@pytest.fixture
+def edit_sessions(harness):
+    import edit_sessions
+
+    return edit_sessions
+
+
+@pytest.fixture
+def s3(tmp_path):
+    return LocalS3(tmp_path)
+
+
+def test_chain_prefix(edit_sessions):
+    prefix = edit_sessions.chain_prefix("session 1", "s3://bucket/model.png")
+    assert prefix.startswith("ephemeral/sessions/session_1/edits/") and prefix.endswith("/")
+
+    # A version of the chain continues the chain
+    assert edit_sessions.chain_prefix("session 1", f"s3://bucket/{prefix}v003.png") == prefix
+    # Another session starts its own chain from it
+    assert not edit_sessions.chain_prefix("session 2", f"s3://bucket/{prefix}v003.png").startswith(prefix)
+
+
+def test_chain_prefix_of_tenant(edit_sessions):
+    root = "tenants/boutique/"
+    prefix = edit_sessions.chain_prefix("s", "s3://bucket/tenants/boutique/ephemeral/model.png", root)
+
+    assert prefix.startswith(f"{root}ephemeral/sessions/s/edits/")
+    assert edit_sessions.chain_prefix("s", f"s3://bucket/{prefix}v001.png", root) == prefix
+
+
+def test_put_version(edit_sessions, s3):
+    prefix = edit_sessions.chain_prefix("s", "s3://bucket/model.png")
+    metadata = edit_sessions.mask_metadata("The Shirt!", mask_image=False)
+
+    first = edit_sessions.put_version(s3, "bucket", prefix, b"one", metadata)
+    second = edit_sessions.put_version(s3, "bucket", prefix, b"two", metadata)
+
+    assert (first, second) == (f"{prefix}v001.png", f"{prefix}v002.png")
+    assert s3.head_object(Bucket="bucket", Key=first)["Metadata"] == {"mask-prompt": "the shirt", "mask-source": "prompt"}
+
+
+def test_concurrent_versions_do_not_overwrite(edit_sessions, s3):
+    prefix = edit_sessions.chain_prefix("s", "s3://bucket/model.png")
+
+    with ThreadPoolExecutor(4) as executor:
+        keys = list(
+            executor.map(lambda n: edit_sessions.put_version(s3, "bucket", prefix, bytes([n]), {}), range(4))
+        )
+
+    assert sorted(keys) == [f"{prefix}v{n:03d}.png" for n in range(1, 5)]
+    assert sorted(s3.get_object(Bucket="bucket", Key=key)["Body"].read() for key in keys) == [bytes([n]) for n in range(4)]
+
+
+def test_masks(edit_sessions, s3):
+    prefix = edit_sessions.chain_prefix("s", "s3://bucket/model.png")
+    key = edit_sessions.mask_key(prefix, "Shirt")
+    assert key == edit_sessions.mask_key(prefix, "  shirt. ")
+
+    assert edit_sessions.get_mask(s3, "bucket", key) is None
+    edit_sessions.put_mask(s3, "bucket", key, b"mask")
+    assert edit_sessions.get_mask(s3, "bucket", key) == base64.b64encode(b"mask").decode()
+
+    version = f"{prefix}v001.png"
+    edit_sessions.put_version_mask(s3, "bucket", version, b"mask")
+    assert s3.get_object(Bucket="bucket", Key=f"{prefix}v001_mask.png")["Body"].read() == b"mask"
+    assert edit_sessions.mask_metadata("x" * 1000, mask_image=True)["mask-source"] == "image"
+    assert len(edit_sessions.mask_metadata("x" * 1000, mask_image=True)["mask-prompt"]) == edit_sessions.MAX_MASK_PROMPT_METADATA
@@ -0,0 +1,67 @@
+import datetime
+
+import pytest
+
+
+@pytest.fixture
+def forecast():
+    import forecast
+
+    return forecast
+
+
+DAILY = {
+    "time": ["2026-01-01", "2026-01-02", "2026-01-03"],
+    "temperature_2m_min": [30.2, None, 28.0],
+    "temperature_2m_max": [41.0, 40.0, 39.6],
+    "weathercode": [71, 3, 999],
+    "precipitation_sum": [1.25, 0.0, None],
+}
+
+
+def test_summarize_daily(forecast):
+    summaries = forecast.summarize_daily(DAILY)
+
+    # Days without temperatures are skipped
+    assert [day.date for day in summaries] == [datetime.date(2026, 1, 1), datetime.date(2026, 1, 3)]
+    assert summaries[0].describe() == "Thursday 2026-01-01: 30 to 41 F, Snow fall: Slight intensity, 1.2 mm of precipitation"
+    assert summaries[1].precipitation == 0.0
+    assert "Unknown" in summaries[1].describe()
+
+
+def test_select(forecast):
+    summaries = forecast.summarize_daily(DAILY)
+
+    assert forecast.select(summaries, datetime.date(2026, 1, 2), datetime.date(2026, 1, 5)) == [summaries[1]]
+
+
+def test_cache(forecast, monkeypatch):
+    cache = forecast.ForecastCache(ttl=60, max_locations=1)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return forecast.summarize_daily(DAILY)
+
+    assert cache.get("Paris", fetch) == cache.get(" paris ", fetch)
+    assert len(calls) == 1
+
+    # Entries expire after the TTL
+    now = forecast.time.monotonic()
+    monkeypatch.setattr(forecast.time, "monotonic", lambda: now + 61)
+    cache.get("Paris", fetch)
+    assert len(calls) == 2
+
+    # Only max_locations locations are kept
+    cache.get("Lisbon", fetch)
+    cache.get("Paris", fetch)
+    assert len(calls) == 4
+
+
+def test_cache_does_not_keep_failures(forecast):
+    cache = forecast.ForecastCache()
+    calls = []
+
+    assert cache.get("Paris", lambda: calls.append(1)) is None
+    assert cache.get("Paris", lambda: calls.append(1)) is None
+    assert len(calls) == 2
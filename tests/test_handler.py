@@ -0,0 +1,258 @@
+"""
+The agent Lambda handler on the recorded events of tools/replay, against the local
+stand-ins: the response of every API path and its error paths.
+"""
+
+import base64
+import copy
+import json
+import time
+
+import pytest
+
+from components.bedrock_agent.schema import load_schema
+from tools.replay.harness import BUCKET, INPUT_IMAGE_KEY, JOB_ID, TENANT_PREFIX, event_paths, load_event
+from tools.replay.stubs import LocalS3
+
+SCHEMA = load_schema("FashionAgent_Schema.json")
+EVENTS = {path.stem: path for path in event_paths()}
+
+
+def body(response: dict) -> str:
+    return response["response"]["responseBody"]["application/json"]["body"]
+
+
+def status(response: dict) -> int:
+    return response["response"]["httpStatusCode"]
+
+
+def event(name: str, **parameters) -> dict:
+    """A recorded event, with some of its parameter values replaced."""
+    recorded = load_event(EVENTS[name])
+    for parameter in recorded["parameters"]:
+        if parameter["name"] in parameters:
+            parameter["value"] = parameters[parameter["name"]]
+    return recorded
+
+
+def test_every_api_path_has_an_event():
+    assert {load_event(path)["apiPath"] for path in EVENTS.values()} == set(SCHEMA["paths"])
+
+
+@pytest.mark.parametrize("name", sorted(EVENTS))
+def test_recorded_event(harness, name):
+    recorded = load_event(EVENTS[name])
+    response, _ = harness.invoke(copy.deepcopy(recorded))
+
+    assert response["messageVersion"] == "1.0"
+    assert set(response["response"]) == {"actionGroup", "apiPath", "httpMethod", "httpStatusCode", "responseBody"}
+    for key in ("actionGroup", "apiPath", "httpMethod"):
+        assert response["response"][key] == recorded[key]
+    assert status(response) == 200
+    assert str(status(response)) in SCHEMA["paths"][recorded["apiPath"]][recorded["httpMethod"].lower()]["responses"]
+
+    text = body(response)
+    assert isinstance(text, str)
+    if recorded["apiPath"] == "/batch_image_lookup":
+        results = json.loads(text)
+        assert [result["query"] for result in results] == json.loads(recorded["parameters"][0]["value"])
+        assert all(result["image"].startswith(f"s3://{BUCKET}/") for result in results)
+    elif recorded["apiPath"] == "/weather":
+        assert "Fahrenheit" in text or text.startswith("Daily forecast")
+    else:
+        location = json.loads(text)["image"] if text.startswith("{") else text
+        assert location.startswith(f"s3://{BUCKET}/")
+        key = location.removeprefix(f"s3://{BUCKET}/")
+        assert harness.s3.head_object(Bucket=BUCKET, Key=key)["ContentLength"] > 0
+
+
+@pytest.mark.parametrize("name", ["batch_image_lookup_tenant", "imageGeneration_tenant", "image_lookup_tenant"])
+def test_tenant_objects_stay_under_tenant_prefix(harness, name):
+    response, _ = harness.invoke(load_event(EVENTS[name]))
+
+    assert status(response) == 200
+    text = body(response)
+    if text.startswith("["):
+        locations = [result["image"] for result in json.loads(text)]
+    else:
+        locations = [json.loads(text)["image"] if text.startswith("{") else text]
+    assert all(location.startswith(f"s3://{BUCKET}/{TENANT_PREFIX}") for location in locations)
+
+
+def test_unknown_tenant(harness):
+    recorded = load_event(EVENTS["image_lookup"])
+    recorded["sessionAttributes"] = {"tenant_id": "nobody"}
+    response, _ = harness.invoke(recorded)
+
+    assert status(response) == 400
+    assert body(response) == "Unknown tenant"
+
+
+def test_unknown_location(harness):
+    response, _ = harness.invoke(event("weather", location_name="atlantis"))
+
+    assert status(response) == 400
+    assert "Could not find location atlantis" in body(response)
+
+
+def test_missing_parameter(harness):
+    recorded = load_event(EVENTS["weather"])
+    recorded["parameters"] = []
+    response, _ = harness.invoke(recorded)
+
+    assert status(response) == 400
+    assert body(response).startswith("Invalid request: Missing required parameter(s): location_name")
+
+
+def test_unknown_api_path(harness):
+    recorded = load_event(EVENTS["weather"])
+    recorded["apiPath"] = "/shopping_cart"
+    response, _ = harness.invoke(recorded)
+
+    assert status(response) == 400
+    assert body(response) == "Unknown API path"
+
+
+def test_image_lookup_without_inputs(harness):
+    response, _ = harness.invoke(event("image_lookup", input_query="None"))
+
+    assert status(response) == 404
+
+
+def test_image_lookup_no_hit(harness, monkeypatch):
+    monkeypatch.setattr(harness.opensearch, "search", lambda index, body, **kwargs: {"hits": {"hits": []}})
+
+    response, _ = harness.invoke(event("image_lookup", input_query="a query nobody has asked before"))
+    assert status(response) == 400
+    assert body(response) == ""
+
+    # An image lookup without a match answers with the input image
+    input_image = f"s3://{BUCKET}/{INPUT_IMAGE_KEY}"
+    response, _ = harness.invoke(event("image_lookup_image", input_image=input_image))
+    assert status(response) == 400
+    assert body(response) == input_image
+
+
+def test_batch_image_lookup_no_hit(harness, monkeypatch):
+    monkeypatch.setattr(harness.opensearch, "search", lambda index, body, **kwargs: {"hits": {"hits": []}})
+    response, _ = harness.invoke(load_event(EVENTS["batch_image_lookup"]))
+
+    assert status(response) == 200
+    assert [result["image"] for result in json.loads(body(response))] == [None, None, None]
+
+
+def test_final_render_of_a_preview(harness, lambda_function, monkeypatch):
+    requests = []
+    invoke_model = lambda_function.invoke_model
+
+    def recording_invoke_model(model_id, body, *args, **kwargs):
+        requests.append(json.loads(body))
+        return invoke_model(model_id, body, *args, **kwargs)
+
+    monkeypatch.setattr(lambda_function, "invoke_model", recording_invoke_model)
+    preview_event = event("imageGeneration", render_tier="preview")
+    preview_event["parameters"].append({"name": "seed", "type": "integer", "value": "42"})
+
+    response, _ = harness.invoke(preview_event)
+    assert status(response) == 200
+    preview = json.loads(body(response))
+    assert preview["render_tier"] == "preview" and preview["seed"] == 42
+    key = preview["image"].removeprefix(f"s3://{BUCKET}/")
+    assert harness.s3.head_object(Bucket=BUCKET, Key=key)["Metadata"] == {"render-tier": "preview", "seed": "42"}
+
+    # The agent promotes the preview with the seed of its response
+    final_event = event("imageGeneration", render_tier="final")
+    final_event["parameters"].append({"name": "seed", "type": "integer", "value": str(preview["seed"])})
+    response, _ = harness.invoke(final_event)
+    final = json.loads(body(response))
+    assert final["render_tier"] == "final" and final["seed"] == 42
+    assert [request["imageGenerationConfig"]["quality"] for request in requests] == ["standard", "premium"]
+    assert {request["imageGenerationConfig"]["seed"] for request in requests} == {42}
+
+
+def test_store_lookup_image(lambda_function, monkeypatch, tmp_path):
+    s3 = LocalS3(tmp_path)
+    bucket = lambda_function.bucket_name
+    s3.put_object(Bucket="catalog", Key="catalog/0001.jpg", Body=b"dress", Metadata={"catalog-id": "0001"})
+    monkeypatch.setattr(lambda_function, "s3_client", s3)
+
+    # A catalog object of the agent bucket is served as is
+    in_bucket = f"s3://{bucket}/catalog/0001.jpg"
+    assert lambda_function.store_lookup_image("0001", {"s3_uri": in_bucket}) == in_bucket
+
+    # Other catalogs are copied server-side, once
+    location = lambda_function.store_lookup_image("0001", {"s3_uri": "s3://catalog/catalog/0001.jpg"})
+    assert location.startswith(f"s3://{bucket}/ephemeral/")
+    assert lambda_function.store_lookup_image("0001", {"s3_uri": "s3://catalog/catalog/0001.jpg"}) == location
+    key = location.split("/", 3)[3]
+    assert s3.get_object(Bucket=bucket, Key=key)["Body"].read() == b"dress"
+
+    # Documents ingested with the inline image are uploaded without a catalog id when they have none
+    location = lambda_function.store_lookup_image(None, {"image_b64": base64.b64encode(b"hat").decode()})
+    assert s3.head_object(Bucket=bucket, Key=location.split("/", 3)[3])["Metadata"] == {}
+
+
+def test_unknown_job(harness):
+    response, _ = harness.invoke(event("job_status", job_id="no-such-job"))
+
+    assert status(response) == 404
+    assert body(response) == "No job found with id no-such-job"
+
+
+def test_job_of_another_session(harness):
+    recorded = event("job_status", job_id=JOB_ID)
+    recorded["sessionId"] = "another-session"
+    response, _ = harness.invoke(recorded)
+
+    assert status(response) == 404
+
+
+def wait_for_job(harness, job_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        response, _ = harness.invoke(event("job_status", job_id=job_id))
+        if not body(response).startswith(f"Job {job_id} is still") or time.monotonic() > deadline:
+            return response
+        time.sleep(0.01)
+
+
+def test_job_mode(harness, job_mode):
+    response, _ = harness.invoke(load_event(EVENTS["imageGeneration"]))
+    assert status(response) == 200
+    job_id = body(response).split()[1]
+
+    response = wait_for_job(harness, job_id)
+    assert status(response) == 200
+    assert json.loads(body(response))["image"].startswith(f"s3://{BUCKET}/ephemeral/")
+
+    # Synchronous actions still run inline
+    response, _ = harness.invoke(load_event(EVENTS["image_lookup"]))
+    assert body(response).startswith(f"s3://{BUCKET}/catalog/")
+
+
+def test_job_mode_jobs_stay_with_their_tenant_and_session(harness, job_mode):
+    response, _ = harness.invoke(load_event(EVENTS["imageGeneration_tenant"]))
+    job_id = body(response).split()[1]
+    assert job_mode.get(job_id, TENANT_PREFIX)["tenant_id"] == "boutique"
+
+    for session_id, attributes in (
+        ("replay-session-boutique", {}),
+        ("replay-session", {"tenant_id": "boutique"}),
+    ):
+        recorded = event("job_status", job_id=job_id)
+        recorded["sessionId"] = session_id
+        recorded["sessionAttributes"] = attributes
+        response, _ = harness.invoke(recorded)
+        assert status(response) == 404
+
+    recorded = event("job_status", job_id=job_id)
+    recorded["sessionId"] = "replay-session-boutique"
+    recorded["sessionAttributes"] = {"tenant_id": "boutique"}
+    response, _ = harness.invoke(recorded)
+    assert status(response) == 200
+
+
+def test_job_handler_reports_failed_messages(lambda_function):
+    result = lambda_function.job_handler({"Records": [{"messageId": "m1", "body": "not json"}]}, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
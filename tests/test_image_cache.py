@@ -0,0 +1,66 @@
+import base64
+
+import pytest
+
+from tools.replay.stubs import LocalS3
+
+
+class CountingS3(LocalS3):
+    def __init__(self, root):
+        super().__init__(root)
+        self.downloads = 0
+
+    def get_object(self, **kwargs):
+        response = super().get_object(**kwargs)
+        self.downloads += 1
+        return response
+
+
+@pytest.fixture
+def image_cache(harness):
+    import image_cache
+
+    return image_cache
+
+
+@pytest.fixture
+def s3(tmp_path):
+    s3 = CountingS3(tmp_path)
+    for name in ("a", "b", "c"):
+        s3.put_object(Bucket="bucket", Key=f"{name}.png", Body=name.encode() * 30)
+    return s3
+
+
+def test_revalidates_with_etag(image_cache, s3):
+    cache = image_cache.SessionImageCache()
+
+    assert cache.load(s3, "s3://bucket/a.png", "s") == base64.b64encode(b"a" * 30).decode()
+    assert cache.load(s3, "s3://bucket/a.png", "s") == base64.b64encode(b"a" * 30).decode()
+    assert s3.downloads == 1
+
+    # A changed object is downloaded again
+    s3.put_object(Bucket="bucket", Key="a.png", Body=b"new")
+    assert cache.load(s3, "s3://bucket/a.png", "s") == base64.b64encode(b"new").decode()
+    assert s3.downloads == 2
+
+
+def test_sessions_do_not_share_entries(image_cache, s3):
+    cache = image_cache.SessionImageCache()
+
+    cache.load(s3, "s3://bucket/a.png", "one")
+    cache.load(s3, "s3://bucket/a.png", "two")
+
+    assert s3.downloads == 2
+
+
+def test_evicts_least_recently_used(image_cache, s3):
+    cache = image_cache.SessionImageCache(max_bytes=100)
+
+    for name in ("a", "b", "a", "c"):
+        cache.load(s3, f"s3://bucket/{name}.png")
+
+    assert cache.size <= 100
+    cache.load(s3, "s3://bucket/a.png")
+    assert s3.downloads == 3
+    cache.load(s3, "s3://bucket/b.png")
+    assert s3.downloads == 4
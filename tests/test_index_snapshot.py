@@ -0,0 +1,178 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from fashion_common import vectors
+from tools import index_snapshot
+
+DIMENSION = 4
+MAPPINGS = {"properties": {"vector_field": {"type": "knn_vector", "dimension": DIMENSION}, "image_id": {"type": "keyword"}}}
+
+
+class Indices:
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.settings = {}
+        self.aliases = {}
+
+    def get_mapping(self, index):
+        name = self.aliases.get(index, [index])[0]
+        return {name: {"mappings": MAPPINGS}}
+
+    def exists(self, index):
+        return index in self.cluster.documents
+
+    def create(self, index, body):
+        self.cluster.documents[index] = {}
+        self.settings[index] = {"index": {"refresh_interval": "1s"}}
+
+    def get_settings(self, index):
+        return {index: {"settings": self.settings[index]}}
+
+    def put_settings(self, index, body):
+        self.settings[index]["index"].update(body["index"])
+
+    def refresh(self, index):
+        pass
+
+    def exists_alias(self, name):
+        return name in self.aliases
+
+    def get_alias(self, name):
+        return {index: {} for index in self.aliases[name]}
+
+    def update_aliases(self, body):
+        for action in body["actions"]:
+            if "add" in action:
+                self.aliases.setdefault(action["add"]["alias"], []).append(action["add"]["index"])
+            elif "remove" in action:
+                self.aliases[action["remove"]["alias"]].remove(action["remove"]["index"])
+            else:
+                del self.cluster.documents[action["remove_index"]["index"]]
+
+    def delete(self, index):
+        del self.cluster.documents[index]
+
+
+class Cluster:
+    """Enough of an OpenSearch client for a snapshot export and import."""
+
+    def __init__(self, digits=9):
+        self.documents = {}
+        self.indices = Indices(self)
+        self.transport = SimpleNamespace(serializer=vectors.VectorSerializer(digits))
+        self.pits = {}
+
+    def create_pit(self, index, params):
+        index = self.indices.aliases.get(index, [index])[0]
+        self.pits["pit"] = sorted(self.documents[index].items())
+        return {"pit_id": "pit"}
+
+    def delete_pit(self, body):
+        del self.pits[body["pit_id"][0]]
+
+    def search(self, body):
+        start = body.get("search_after", [0])[0]
+        page = self.pits[body["pit"]["id"]][start : start + body["size"]]
+        return {
+            "hits": {
+                "hits": [
+                    {"_id": doc_id, "_source": dict(source), "sort": [start + row + 1]}
+                    for row, (doc_id, source) in enumerate(page)
+                ]
+            }
+        }
+
+    def bulk(self, body, **kwargs):
+        lines = body.splitlines()
+        items = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            target = json.loads(action)["index"]
+            doc_id = target.get("_id") or f"auto-{len(self.documents[target['_index']])}"
+            self.documents[target["_index"]][doc_id] = json.loads(source)
+            items.append({"index": {"_index": target["_index"], "_id": doc_id, "status": 201}})
+        return {"errors": False, "items": items}
+
+
+def as_float32(source):
+    return {**source, "vector_field": np.float32(source["vector_field"]).tolist()}
+
+
+@pytest.fixture
+def cluster():
+    cluster = Cluster()
+    rng = np.random.default_rng(0)
+    cluster.documents["images-1"] = {
+        f"doc-{n}": {"vector_field": rng.standard_normal(DIMENSION).astype("f4").tolist(), "image_id": f"{n:04d}"}
+        for n in range(7)
+    }
+    cluster.indices.aliases["images"] = ["images-1"]
+    return cluster
+
+
+@pytest.fixture
+def snapshot(cluster, tmp_path, monkeypatch):
+    monkeypatch.setattr(index_snapshot, "PAGE_SIZE", 3)
+    index_snapshot.export_index(cluster, "images", tmp_path)
+    return tmp_path
+
+
+def test_export(snapshot, cluster):
+    manifest = json.loads((snapshot / "manifest.json").read_text())
+    matrix = np.load(snapshot / "vectors.npy")
+    rows = list(index_snapshot.iter_metadata(snapshot / "metadata.jsonl"))
+
+    assert manifest["count"] == 7 and manifest["dimension"] == DIMENSION
+    assert manifest["mappings"] == MAPPINGS
+    assert matrix.shape == (7, DIMENSION) and matrix.dtype == np.float32
+    for row, metadata in zip(matrix, rows):
+        source = cluster.documents["images-1"][metadata["_id"]]
+        assert row.tolist() == source["vector_field"]
+        assert metadata["image_id"] == source["image_id"]
+    assert cluster.pits == {}
+
+
+@pytest.mark.parametrize("keep_ids", [False, True])
+def test_import(snapshot, cluster, keep_ids):
+    loaded = index_snapshot.import_index(cluster, snapshot, "images-2", threads=2, chunk_size=2, keep_ids=keep_ids)
+
+    assert loaded == 7
+    # The index stores float32, restored vectors are the exact float32 values
+    restored = {doc_id: as_float32(source) for doc_id, source in cluster.documents["images-2"].items()}
+    original = {doc_id: as_float32(source) for doc_id, source in cluster.documents["images-1"].items()}
+    if keep_ids:
+        assert restored == original
+    else:
+        by_image_id = {source["image_id"]: source for source in original.values()}
+        assert sorted(restored.values(), key=lambda s: s["image_id"]) == [by_image_id[i] for i in sorted(by_image_id)]
+    # Refreshes are restored after the load
+    assert cluster.indices.settings["images-2"]["index"]["refresh_interval"] == "1s"
+
+
+def test_import_with_fewer_digits(snapshot, cluster):
+    cluster.transport.serializer = vectors.VectorSerializer(digits=4)
+
+    index_snapshot.import_index(cluster, snapshot, "images-2", keep_ids=True)
+
+    for doc_id, source in cluster.documents["images-2"].items():
+        expected = [float("%.4g" % value) for value in np.float32(cluster.documents["images-1"][doc_id]["vector_field"])]
+        assert source["vector_field"] == expected
+
+
+def test_rebuild_swaps_alias(snapshot, cluster):
+    index = index_snapshot.rebuild(cluster, snapshot, "images")
+
+    assert cluster.indices.aliases["images"] == [index]
+    assert "images-1" not in cluster.documents
+    assert len(cluster.documents[index]) == 7
+
+
+def test_swap_alias_replaces_an_index_of_the_same_name(cluster):
+    cluster.documents["legacy"] = {}
+    cluster.documents["legacy-2"] = {}
+
+    assert index_snapshot.swap_alias(cluster, "legacy", "legacy-2") == []
+    assert cluster.indices.aliases["legacy"] == ["legacy-2"]
+    assert "legacy" not in cluster.documents
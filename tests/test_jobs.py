@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+from tools.replay.stubs import LocalS3
+
+
+@pytest.fixture
+def jobs(harness):
+    import jobs
+
+    return jobs
+
+
+@pytest.fixture
+def tenants(harness):
+    from fashion_common import Tenant
+
+    return Tenant("default", "images-index", ""), Tenant("boutique", "boutique-images", "tenants/boutique/")
+
+
+class Queue:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+class BrokenQueue(Queue):
+    def send(self, message):
+        super().send(message)
+        raise RuntimeError("queue unavailable")
+
+
+def test_job_key(jobs):
+    assert jobs.job_key("abc") == "jobs/abc.json"
+    assert jobs.job_key("abc", "tenants/boutique/") == "tenants/boutique/jobs/abc.json"
+
+
+@pytest.mark.parametrize("store", ["local", "s3"])
+def test_submit_run_find(jobs, tenants, tmp_path, store):
+    store = jobs.LocalJobStore() if store == "local" else jobs.S3JobStore(LocalS3(tmp_path), "bucket")
+    default, boutique = tenants
+    queue = Queue()
+    event = {"apiPath": "/inpaint", "sessionId": "session"}
+
+    job_id = jobs.submit(store, queue, event, boutique)
+    assert jobs.find(store, job_id, boutique, "session")["status"] == jobs.PENDING
+    (message,) = queue.messages
+    assert message == {"job_id": job_id, "event": event, "prefix": "tenants/boutique/", "tenant_id": "boutique"}
+
+    final = jobs.run(store, lambda event: {"body": "s3://bucket/out.png", "response_code": 200}, message)
+    assert final["status"] == jobs.SUCCEEDED
+    assert jobs.find(store, job_id, boutique, "session")["result"] == "s3://bucket/out.png"
+
+    # Jobs are only found by the tenant and the session that submitted them
+    assert jobs.find(store, job_id, default, "session") is None
+    assert jobs.find(store, job_id, boutique, "other-session") is None
+    assert jobs.find(store, "unknown", boutique, "session") is None
+
+
+def test_submit_records_queue_failures(jobs, tenants):
+    store = jobs.LocalJobStore()
+    default, _ = tenants
+
+    queue = BrokenQueue()
+
+    with pytest.raises(RuntimeError):
+        jobs.submit(store, queue, {"apiPath": "/inpaint", "sessionId": "session"}, default)
+
+    # Never polled as pending
+    status = jobs.find(store, queue.messages[0]["job_id"], default, "session")
+    assert status["status"] == jobs.FAILED
+    assert status["result"] == "The job could not be queued, please try again."
+
+
+def test_run_records_failures(jobs, tenants):
+    store = jobs.LocalJobStore()
+    queue = Queue()
+    default, _ = tenants
+    jobs.submit(store, queue, {"apiPath": "/outpaint", "sessionId": "s"}, default)
+    jobs.submit(store, queue, {"apiPath": "/outpaint", "sessionId": "s"}, default)
+
+    def fail(event):
+        raise RuntimeError("boom")
+
+    assert jobs.run(store, lambda event: {"body": "Invalid", "response_code": 400}, queue.messages[0])["status"] == jobs.FAILED
+    status = jobs.run(store, fail, queue.messages[1])
+    assert status["status"] == jobs.FAILED
+    assert status["result"] == "The job failed, please try again."
+
+
+def test_local_job_queue(jobs):
+    done = threading.Event()
+    queue = jobs.LocalJobQueue(lambda message: done.set())
+
+    queue.send({"job_id": "a"})
+
+    assert done.wait(5)
+    queue.executor.shutdown(wait=True)
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def log_fields(monkeypatch):
+    import log_fields
+
+    monkeypatch.setattr(log_fields, "MAX_FIELD_CHARS", 16)
+    monkeypatch.setattr(log_fields, "_sampled", False)
+    return log_fields
+
+
+def test_summarize(log_fields):
+    event = {
+        "inputText": "a very long request text",
+        "image": "QUJD" * 10,
+        "Authorization": "Bearer abc",
+        "parameters": list(range(12)),
+        "body": b"bytes",
+    }
+
+    summary = log_fields.summarize(event)
+
+    assert summary["inputText"] == "a very long requ...<24 chars>"
+    assert summary["image"] == "<40 chars of base64>"
+    assert summary["Authorization"] == log_fields.REDACTED
+    assert summary["parameters"] == list(range(10)) + ["...<12 items>"]
+    assert summary["body"] == "<5 bytes>"
+
+
+def test_parameters_are_redacted_by_name(log_fields):
+    event = {
+        "parameters": [
+            {"name": "location_name", "type": "string", "value": "Paris"},
+            {"name": "Token", "type": "string", "value": "abc"},
+        ],
+        "requestBody": {"content": {"application/json": {"properties": [{"name": "password", "value": "hunter2"}]}}},
+    }
+
+    summary = log_fields.summarize(event, full=True)
+
+    assert summary["parameters"][0]["value"] == "Paris"
+    assert summary["parameters"][1] == {"name": "Token", "type": "string", "value": log_fields.REDACTED}
+    properties = summary["requestBody"]["content"]["application/json"]["properties"]
+    assert properties == [{"name": "password", "value": log_fields.REDACTED}]
+
+
+def test_sampled_invocations_log_in_full(log_fields):
+    summary = log_fields.summarize({"inputText": "a very long request text", "image": "QUJD" * 10}, full=True)
+
+    assert summary["inputText"] == "a very long request text"
+    # base64 payloads are cut even then
+    assert summary["image"] == "<40 chars of base64>"
+
+
+def test_capped_renders_lazily(log_fields, monkeypatch):
+    calls = []
+    summarize = log_fields.summarize
+    monkeypatch.setattr(log_fields, "summarize", lambda value, full=False: calls.append(value) or summarize(value, full))
+
+    capped = log_fields.capped({"token": "abc"})
+    assert calls == []
+    assert json.loads(str(capped)) == {"token": log_fields.REDACTED}
+
+
+def test_sample_invocation(log_fields, monkeypatch):
+    monkeypatch.setattr(log_fields, "SAMPLE_RATE", 0.0)
+    assert not log_fields.sample_invocation()
+    monkeypatch.setattr(log_fields, "SAMPLE_RATE", 1.0)
+    assert log_fields.sample_invocation()
+
+
+def test_error_text(log_fields):
+    assert log_fields.error_text(ValueError("bad")) == "ValueError: bad"
+    assert log_fields.error_text(ValueError("x" * 300), limit=20) == "ValueError: xxxxxxxx..."
@@ -0,0 +1,85 @@
+from array import array
+
+import pytest
+
+from tools.replay.harness import BUCKET
+
+
+@pytest.fixture
+def neighbours(harness, monkeypatch):
+    import neighbours
+
+    monkeypatch.setattr(neighbours, "_indexes", {})
+    return neighbours
+
+
+@pytest.fixture
+def index(neighbours):
+    # The last document was deleted from the catalog, its id is blank
+    ids = ["0000", "0001", "0002", ""]
+    positions = array("i", [1, 3, 0, 2, 1, 0, 0, 1])
+    scores = array("f", [0.9, 0.8, 0.9, 0.5, 0.7, 0.6, 0.5, 0.5])
+    return neighbours.NeighbourIndex(ids, 2, positions, scores)
+
+
+def test_round_trip(neighbours, index):
+    loaded = neighbours.NeighbourIndex.from_bytes(index.to_bytes())
+
+    assert loaded.get("0000") == [("0001", pytest.approx(0.9))]
+    assert [neighbour for neighbour, _ in loaded.get("0001")] == ["0000", "0002"]
+    assert loaded.get("9999") is None
+
+
+def test_truncated(neighbours, index):
+    with pytest.raises(ValueError):
+        neighbours.NeighbourIndex.from_bytes(index.to_bytes()[:-4])
+
+
+def test_lookup(neighbours, index, harness):
+    harness.s3.put_object(Bucket=BUCKET, Key="tests/neighbours.bin", Body=index.to_bytes())
+
+    assert neighbours.lookup(harness.s3, BUCKET, "0002", "tests/neighbours.bin")[0][0] == "0001"
+    assert neighbours.lookup(harness.s3, BUCKET, "9999", "tests/neighbours.bin") is None
+    # Every catalog has its own file
+    assert neighbours.lookup(harness.s3, BUCKET, "0002", "tests/missing.bin") is None
+
+
+def test_find_catalog_neighbours(neighbours, index, lambda_function, monkeypatch):
+    monkeypatch.setattr(neighbours, "_load", lambda s3_client, bucket_name, key: index)
+
+    found = lambda_function.find_catalog_neighbours("0001", k=2)
+
+    assert [catalog_id for catalog_id, _ in found] == ["0000", "0002"]
+    assert found[0][1]["s3_uri"] == f"s3://{BUCKET}/catalog/0000.jpg"
+
+
+def test_stale_index(neighbours, lambda_function, monkeypatch):
+    stale = neighbours.NeighbourIndex(["0000", "retired"], 1, array("i", [1, 0]), array("f", [0.9, 0.9]))
+    monkeypatch.setattr(neighbours, "_load", lambda s3_client, bucket_name, key: stale)
+
+    # Neighbours missing from the index fall back to a kNN search
+    assert lambda_function.find_catalog_neighbours("0000") is None
+
+
+def test_lookup_of_catalog_image_uses_neighbours(neighbours, index, harness, monkeypatch):
+    from tests.test_handler import body, event
+
+    monkeypatch.setattr(neighbours, "_load", lambda s3_client, bucket_name, key: index)
+
+    # The catalog objects of the harness carry their image id
+    response, _ = harness.invoke(event("image_lookup_image", input_image=f"s3://{BUCKET}/catalog/0002.jpg"))
+
+    assert body(response) == f"s3://{BUCKET}/catalog/0001.jpg"
+
+
+def test_catalog_image_of_another_tenant(neighbours, index, harness, lambda_function, monkeypatch):
+    from fashion_common import Tenant
+
+    from tools.replay.harness import TENANT_INDEX, TENANT_PREFIX
+
+    monkeypatch.setattr(neighbours, "_load", lambda s3_client, bucket_name, key: index)
+    boutique = Tenant("boutique", TENANT_INDEX, TENANT_PREFIX)
+
+    # Catalog ids only mean something in the neighbour lists of their own catalog
+    assert lambda_function.get_catalog_id(f"s3://{BUCKET}/catalog/0002.jpg", boutique) is None
+    assert lambda_function.get_catalog_id(f"s3://{BUCKET}/{TENANT_PREFIX}catalog/0002.jpg", boutique) == "0002"
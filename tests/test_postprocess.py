@@ -0,0 +1,85 @@
+import base64
+import io
+import json
+
+import pytest
+
+from tools.replay.stubs import LocalS3, stub_image
+
+
+@pytest.fixture
+def postprocess(harness):
+    import postprocess
+
+    return postprocess
+
+
+class Chunks(io.BytesIO):
+    """A streaming body returning small chunks, so images span several reads."""
+
+    def read(self, size=-1):
+        return super().read(7 if size is None or size < 0 else min(size, 7))
+
+
+def test_extract_first_image(postprocess, monkeypatch):
+    monkeypatch.setattr(postprocess, "CHUNK_SIZE", 7)
+    image = stub_image(32, 32, b"extract")
+    encoded = base64.b64encode(image).decode().replace("/", "\\/")
+    body = Chunks(('{"images": ["' + encoded + '", "second"], "error": null}').encode())
+
+    assert postprocess.extract_first_image(body) == image
+
+
+def test_extract_first_image_error(postprocess):
+    body = io.BytesIO(json.dumps({"images": [], "error": "blocked by content filters"}).encode())
+
+    with pytest.raises(Exception, match="blocked by content filters"):
+        postprocess.extract_first_image(body)
+
+
+def test_extract_first_image_truncated(postprocess):
+    body = io.BytesIO(b'{"images": ["aGVsbG8')
+
+    with pytest.raises(Exception, match="Truncated response"):
+        postprocess.extract_first_image(body)
+
+
+def test_variant_key(postprocess):
+    assert postprocess.variant_key("ephemeral/ab/abc.png", "full") == "ephemeral/ab/abc.png"
+    assert postprocess.variant_key("ephemeral/ab/abc.png", "thumbnail") == "ephemeral/ab/abc_thumb.jpg"
+
+
+def test_store_variants(postprocess, tmp_path):
+    s3 = LocalS3(tmp_path)
+    image = stub_image(600, 400, b"variants")
+
+    locations = postprocess.store_variants(s3, image, "bucket", "out/image.png", {"seed": "1"})
+
+    assert locations == {"full": "s3://bucket/out/image.png", "thumbnail": "s3://bucket/out/image_thumb.jpg"}
+    assert s3.get_object(Bucket="bucket", Key="out/image.png")["Body"].read() == image
+    thumbnail = s3.head_object(Bucket="bucket", Key="out/image_thumb.jpg")
+    assert thumbnail["Metadata"] == {"seed": "1"}
+    assert thumbnail["ContentLength"] < len(image)
+
+
+def test_store_variants_thumbnail_is_best_effort(postprocess, tmp_path):
+    s3 = LocalS3(tmp_path)
+
+    # Not an image: the thumbnail fails, the full-size object is still stored
+    locations = postprocess.store_variants(s3, b"not an image", "bucket", "out/blob.png")
+
+    assert locations == {"full": "s3://bucket/out/blob.png"}
+
+
+def test_store_variants_records_worker_spans(postprocess, monkeypatch, tmp_path):
+    import tracing
+
+    records = []
+    monkeypatch.setattr(tracing, "emit", records.append)
+
+    with tracing.invocation("/imageGeneration"):
+        postprocess.store_variants(LocalS3(tmp_path), stub_image(64, 64, b"spans"), "bucket", "out/image.png")
+
+    assert records[0]["pp_thumbnail.calls"] == 1
+    assert records[0]["s3_put.calls"] == 2
+    assert records[0]["peak_rss_bytes"] > 0
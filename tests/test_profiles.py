@@ -0,0 +1,53 @@
+import json
+
+from tools import profiles
+
+
+def test_collect(tmp_path):
+    (tmp_path / "inpaint").mkdir()
+    for name in ("a.collapsed", "a.alloc.json", "inpaint/b.pstats", "notes.txt"):
+        (tmp_path / name).write_text("")
+
+    found = profiles.collect(str(tmp_path))
+
+    assert {kind: [path.name for path in paths] for kind, paths in found.items()} == {
+        ".collapsed": ["a.collapsed"],
+        ".alloc.json": ["a.alloc.json"],
+        ".pstats": ["b.pstats"],
+    }
+
+
+def test_stacks(tmp_path):
+    (tmp_path / "one.collapsed").write_text("main;handler;embed 3\nmain;handler 1\n")
+    (tmp_path / "two.collapsed").write_text("main;handler;embed 4\n")
+
+    stacks = profiles.load_stacks(sorted(tmp_path.glob("*.collapsed")))
+    assert stacks == {"main;handler;embed": 7, "main;handler": 1}
+
+    shares = profiles.frame_shares(stacks)
+    assert shares["embed"] == (87.5, 87.5)
+    assert shares["handler"] == (12.5, 100.0)
+
+
+def test_allocation_sites(tmp_path):
+    for name, size, peak in (("one", 100, 1000), ("two", 300, 3000)):
+        report = {"peak_bytes": peak, "sites": [{"site": "postprocess.py:10", "size": size, "count": 1}]}
+        (tmp_path / f"{name}.alloc.json").write_text(json.dumps(report))
+
+    sites, peak = profiles.allocation_sites(sorted(tmp_path.glob("*.alloc.json")))
+
+    assert sites == {"postprocess.py:10": 200}
+    assert peak == 2000
+
+
+def test_function_times(tmp_path):
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.runcall(sorted, range(1000))
+    profiler.dump_stats(tmp_path / "one.pstats")
+
+    times = profiles.function_times([tmp_path / "one.pstats"])
+
+    assert any("sorted" in function for function in times)
+    assert all(own <= cumulative for own, cumulative in times.values())
@@ -0,0 +1,64 @@
+import json
+import time
+
+import pytest
+
+
+@pytest.fixture
+def profiling(harness, monkeypatch, tmp_path):
+    import profiling
+
+    monkeypatch.setattr(profiling, "OUTPUT", str(tmp_path))
+    monkeypatch.setattr(profiling, "MODE", "")
+    return profiling
+
+
+def busy(event, context):
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    return {"done": True}
+
+
+def test_requested_mode(profiling, monkeypatch):
+    assert profiling.requested_mode({"sessionAttributes": {"profiling": "Sample"}}) == "sample"
+    assert profiling.requested_mode({"sessionAttributes": {"profiling": "perf"}}) == ""
+    assert profiling.requested_mode({"Records": []}) == ""
+    assert profiling.requested_mode("not an event") == ""
+    monkeypatch.setattr(profiling, "MODE", "cprofile")
+    assert profiling.requested_mode({"Records": []}) == "cprofile"
+
+
+def test_not_profiled(profiling, tmp_path):
+    assert profiling.profiled(busy)({"apiPath": "/weather"}, None) == {"done": True}
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("mode, profile", [("sample", ".collapsed"), ("cprofile", ".pstats")])
+def test_profiled(profiling, tmp_path, mode, profile):
+    event = {"apiPath": "/inpaint", "sessionAttributes": {"profiling": mode}}
+
+    assert profiling.profiled(busy)(event, None) == {"done": True}
+
+    files = sorted(path.name for path in (tmp_path / "inpaint").iterdir())
+    assert [name.split("-", 1)[1].split(".", 1)[1] for name in files] == sorted(["alloc.json", profile[1:]])
+    report = json.loads(next((tmp_path / "inpaint").glob("*.alloc.json")).read_text())
+    assert report["peak_bytes"] >= 0 and isinstance(report["sites"], list)
+    if mode == "sample":
+        stacks = next((tmp_path / "inpaint").glob("*.collapsed")).read_text()
+        assert "test_profiling.py:busy" in stacks
+
+
+def test_write_failures_do_not_fail_the_invocation(profiling, monkeypatch):
+    def fail(name, data):
+        raise OSError("read-only file system")
+
+    monkeypatch.setattr(profiling, "write", fail)
+
+    assert profiling.profiled(busy)({"sessionAttributes": {"profiling": "cprofile"}}, None) == {"done": True}
+
+
+def test_collapse(profiling):
+    import sys
+
+    assert profiling.collapse(sys._getframe()).endswith("test_profiling.py:test_collapse")
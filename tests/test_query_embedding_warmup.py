@@ -0,0 +1,26 @@
+import numpy as np
+
+from tools.query_embedding_warmup import build_table, mine_queries
+from tools.replay.stubs import BedrockStub, stub_embedding
+
+
+def test_mine_queries():
+    lines = [
+        "[INFO] 2026-01-01 Input image: None, Input query: Red  Dress!\n",
+        "[INFO] 2026-01-01 Input image: None, Input query: red dress\n",
+        "[INFO] 2026-01-01 Input image: s3://bucket/a.png, Input query: red dress\n",
+        "[INFO] 2026-01-01 Input image: None, Input query: None\n",
+        "[INFO] unrelated line\n",
+    ]
+
+    assert mine_queries(lines) == {"red dress": 2}
+
+
+def test_build_table():
+    bedrock = BedrockStub()
+
+    table = build_table(bedrock, ["red dress", "blue jeans"], 256)
+
+    assert bedrock.calls == 2
+    assert table.embedding_size == 256
+    assert np.allclose(table.get("Blue jeans"), stub_embedding(256, text="blue jeans"), atol=1e-7)
@@ -0,0 +1,47 @@
+from array import array
+
+import pytest
+
+
+@pytest.fixture
+def query_embeddings(monkeypatch):
+    import query_embeddings
+
+    monkeypatch.setattr(query_embeddings, "_table", None)
+    monkeypatch.setattr(query_embeddings, "_loaded", False)
+    return query_embeddings
+
+
+@pytest.fixture
+def table(query_embeddings):
+    return query_embeddings.QueryEmbeddingTable(2, ["red dress", "blue jeans"], array("f", [1, 0, 0, 1]))
+
+
+def test_round_trip(query_embeddings, table):
+    loaded = query_embeddings.QueryEmbeddingTable.from_bytes(table.to_bytes())
+
+    assert loaded.embedding_size == 2
+    assert list(loaded.get("Blue  jeans!")) == [0.0, 1.0]
+    assert loaded.get("green coat") is None
+
+
+def test_truncated(query_embeddings, table):
+    with pytest.raises(ValueError):
+        query_embeddings.QueryEmbeddingTable.from_bytes(table.to_bytes()[:-1])
+
+
+def test_lookup(query_embeddings, table, monkeypatch):
+    monkeypatch.setattr(query_embeddings, "_load", lambda s3_client, bucket_name: table)
+
+    assert list(query_embeddings.lookup(None, "bucket", "red dress", 2)) == [1.0, 0.0]
+    # A table of another embedding size is ignored
+    assert query_embeddings.lookup(None, "bucket", "red dress", 1024) is None
+
+
+def test_lookup_without_table(query_embeddings, monkeypatch):
+    def fail(s3_client, bucket_name):
+        raise ValueError("Query embedding table is truncated")
+
+    monkeypatch.setattr(query_embeddings, "_load", fail)
+
+    assert query_embeddings.lookup(None, "bucket", "red dress", 2) is None
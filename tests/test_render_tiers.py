@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+import render_tiers
+
+
+def test_resolve():
+    assert render_tiers.resolve(" Final ") == "final"
+    assert render_tiers.resolve("ultra") == render_tiers.DEFAULT_TIER
+    assert render_tiers.resolve(None) == render_tiers.DEFAULT_TIER
+
+
+def test_generation_config():
+    config = render_tiers.generation_config("final", seed=7, num_image=2)
+    assert config == {"numberOfImages": 2, "quality": "premium", "cfgScale": 10.0, "seed": 7, "height": 1024, "width": 1024}
+
+    # Edits keep the resolution of their input image
+    config = render_tiers.generation_config("preview", seed=7, edit=True)
+    assert "height" not in config and "width" not in config
+    assert config["quality"] == "standard"
+
+
+def test_record_counts_cost(monkeypatch):
+    import tracing
+
+    records = []
+    monkeypatch.setattr(tracing, "emit", records.append)
+    with tracing.invocation("/inpaint"):
+        render_tiers.record("preview", num_image=2, edit=True)
+
+    assert records[0]["render_preview"] == 2
+    assert records[0]["render_preview_cost_usd"] == pytest.approx(2 * render_tiers.RENDER_TIERS["preview"]["edit_cost_usd"])
+
+
+def test_object_metadata():
+    assert render_tiers.object_metadata("final", 42) == {"render-tier": "final", "seed": "42"}
+
+
+def test_response_body():
+    assert json.loads(render_tiers.response_body("s3://bucket/image.jpg", "preview", 42)) == {
+        "image": "s3://bucket/image.jpg",
+        "render_tier": "preview",
+        "seed": 42,
+    }
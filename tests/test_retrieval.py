@@ -0,0 +1,53 @@
+import pytest
+
+
+@pytest.fixture
+def retrieval():
+    import retrieval
+
+    return retrieval
+
+
+def test_embedding_request(retrieval):
+    assert retrieval.embedding_request(256, text="red dress") == {
+        "inputText": "red dress",
+        "embeddingConfig": {"outputEmbeddingLength": 256},
+    }
+    assert retrieval.embedding_request(1024, image_b64="aGk=", text="None") == {
+        "inputImage": "aGk=",
+        "embeddingConfig": {"outputEmbeddingLength": 1024},
+    }
+
+
+def test_knn_query(retrieval):
+    query = retrieval.knn_query([0.1, 0.2], k=1)
+
+    assert query["query"]["knn"][retrieval.VECTOR_FIELD] == {"vector": [0.1, 0.2], "k": 1}
+    assert query["size"] == retrieval.SEARCH_SIZE
+    assert query["_source"] == retrieval.SOURCE_FIELDS
+
+
+def test_catalog_ids_query_matches_keyword_subfield(retrieval):
+    query = retrieval.catalog_ids_query(["0001", "0002"])
+
+    assert query["size"] == 2
+    fields = [next(iter(term["terms"])) for term in query["query"]["bool"]["should"]]
+    assert fields == ["image_id", "image_id.keyword"]
+
+
+def test_catalog_id(retrieval):
+    assert retrieval.catalog_id({"_source": {"image_id": 7}}) == "7"
+    assert retrieval.catalog_id({"_source": {"image_id": ""}}) is None
+    assert retrieval.catalog_id({"_source": {}}) is None
+
+
+def test_matching_hits(retrieval):
+    hits = [{"_score": 0.9}, {"_score": 0.2}, {"_score": 0.1}]
+
+    assert retrieval.matching_hits(hits) == [{"_score": 0.9}]
+    assert retrieval.matching_hits(hits, threshold=0.0) == hits
+
+
+def test_normalize_query(retrieval):
+    assert retrieval.normalize_query("  Red,  DRESS! ") == "red dress"
+    assert retrieval.normalize_query(None) == ""
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from tools import index_snapshot
+from tools.retrieval_eval import SnapshotBackend, evaluate, summarize
+
+
+class Cluster:
+    """A one-page index for the snapshot export."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.indices = self
+
+    def get_mapping(self, index):
+        return {index: {"mappings": {"properties": {"vector_field": {"dimension": 2}}}}}
+
+    def create_pit(self, index, params):
+        return {"pit_id": "pit"}
+
+    def delete_pit(self, body):
+        pass
+
+    def search(self, body):
+        if "search_after" in body:
+            return {"hits": {"hits": []}}
+        hits = [{"_id": doc_id, "_source": dict(source), "sort": [n]} for n, (doc_id, source) in enumerate(self.documents.items())]
+        return {"hits": {"hits": hits}}
+
+
+class Embedder:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed(self, query):
+        return self.vectors[query["text"]]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    documents = {
+        "a": {"vector_field": [0.0, 0.0], "image_id": "0001"},
+        "b": {"vector_field": [1.0, 0.0], "image_id": "0002", "aliases": ["0012"]},
+        "c": {"vector_field": [0.0, 3.0], "image_id": "0003"},
+    }
+    index_snapshot.export_index(Cluster(documents), "images", tmp_path)
+    return SnapshotBackend(tmp_path)
+
+
+def test_snapshot_backend(backend):
+    hits = backend.search({"size": 2, "query": {"knn": {"vector_field": {"vector": [0.9, 0.0], "k": 2}}}})
+
+    assert [hit["_source"]["image_id"] for hit in hits] == ["0002", "0001"]
+    assert hits[0]["_score"] == pytest.approx(1 / (1 + 0.01))
+
+
+def test_evaluate_and_summarize(backend):
+    queries = [
+        {"query_id": "q1", "text": "near b", "relevant": ["0012"]},
+        {"query_id": "q2", "text": "near a", "relevant": ["0003"]},
+    ]
+    embedder = Embedder({"near b": np.array([1.0, 0.1]), "near a": np.array([0.0, 0.2])})
+
+    rows = evaluate(queries, embedder, backend, ks=[1, 3])
+
+    # Aliases of a document count as the document
+    assert [row["first_rank"] for row in rows] == [1, 3]
+    assert [row["found_at"] for row in rows] == [{1: 1, 3: 1}, {1: 0, 3: 1}]
+
+    summary = summarize(rows, ks=[1, 3], thresholds=[0.0, 0.98])
+    assert summary["queries"] == 2
+    assert summary["recall"] == {1: 0.5, 3: 1.0}
+    assert summary["mrr"] == pytest.approx((1 + 1 / 3) / 2)
+    assert summary["thresholds"][0] == {"threshold": 0.0, "answered": 1.0, "precision": 0.5, "recall": 0.5}
+    assert summary["thresholds"][1]["answered"] == 0.5
+    assert set(summary["latency_ms"]) == {"embed_ms", "search_ms"}
@@ -0,0 +1,105 @@
+import pytest
+
+from fashion_common import ClientPolicy, Settings, Tenant, load_config
+
+BOUTIQUE = Tenant("boutique", "boutique-images", "tenants/boutique/")
+
+
+def test_from_config_reads_config_yml():
+    settings = Settings.from_config(load_config(), {"BucketName": "bucket", "StackOSSEndpoint": "https://abc.aoss.amazonaws.com/"})
+
+    assert settings.bucket_name == "bucket"
+    assert settings.aoss_host == "abc.aoss.amazonaws.com"
+    assert not settings.job_mode
+
+
+def test_load_config_path(tmp_path):
+    # The Lambda layer has no repository root, only callers of load_config() need one
+    path = tmp_path / "config.yml"
+    path.write_text("embeddingSize: 384\n")
+
+    assert load_config(path) == {"embeddingSize": 384}
+
+
+def test_from_config_sections():
+    config = {
+        "embeddingSize": 256,
+        "jobs": {"job_mode": True},
+        "logging": {"redact_keys": ["Cookie"], "payload_sample_rate": 0.5},
+        "profiling": {"mode": "Sample"},
+        "tenants": {"boutique": {"index_name": "boutique-images"}},
+        "clients": {"max_attempts": 7},
+    }
+
+    settings = Settings.from_config(config, region="eu-west-1", action_spec='{"/weather":[]}')
+
+    assert settings.region == "eu-west-1"
+    assert settings.embedding_size == 256
+    assert settings.job_mode
+    assert settings.log_redact_keys == ("cookie",)
+    assert settings.profiling_mode == "sample"
+    assert settings.tenants == (BOUTIQUE,)
+    assert settings.clients.max_attempts == 7
+    assert settings.action_spec == '{"/weather":[]}'
+
+
+def test_env_round_trip():
+    settings = Settings(
+        region="us-east-1",
+        bucket_name="bucket",
+        index_name="images",
+        embedding_size=384,
+        tracing_enabled=True,
+        action_spec='{"/weather":[["location","string",true]]}',
+        action_paths='["/weather"]',
+        job_mode=True,
+        log_redact_keys=("cookie", "x-api-key"),
+        weather_cache_ttl=60.0,
+        tenants=(BOUTIQUE,),
+        clients=ClientPolicy(retry_mode="standard"),
+    )
+
+    assert Settings.from_env(settings.to_env()) == settings
+    assert Settings.from_env({}) == Settings()
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        {"embedding_size": 512},
+        {"default_render_tier": "draft"},
+        {"vector_digits": 3},
+        {"profiling_mode": "perf"},
+        {"log_payload_sample_rate": 2},
+        {"postprocess_workers": 0},
+        {"tenants": (Tenant("default", "images"),)},
+        {"tenants": (BOUTIQUE, Tenant("outlet", "outlet-images", "tenants/boutique/outlet/"))},
+        {"clients": {"retry_mode": "eager"}},
+    ],
+)
+def test_invalid(values):
+    with pytest.raises(ValueError):
+        if "clients" in values:
+            ClientPolicy(**values["clients"])
+        else:
+            Settings(**values)
+
+
+def test_tenants():
+    settings = Settings(index_name="images", neighbours_key="neighbours.bin", tenants=(BOUTIQUE,))
+
+    assert settings.tenant() == Tenant("default", "images", "", "neighbours.bin")
+    assert settings.tenant("boutique") == BOUTIQUE
+    with pytest.raises(KeyError):
+        settings.tenant("nobody")
+    assert settings.tenant_for_key("tenants/boutique/catalog/0001.jpg") == BOUTIQUE
+    assert settings.tenant_for_key("catalog/0001.jpg").tenant_id == "default"
+    assert BOUTIQUE.key("jobs/a.json") == "tenants/boutique/jobs/a.json"
+    with pytest.raises(ValueError):
+        Tenant("bad id", "images")
+
+
+def test_require():
+    assert Settings(bucket_name="bucket").require("bucket_name").bucket_name == "bucket"
+    with pytest.raises(ValueError, match="aoss_host"):
+        Settings().require("bucket_name", "aoss_host")
@@ -0,0 +1,39 @@
+import hashlib
+
+import pytest
+
+from tools.replay.stubs import LocalS3
+
+
+@pytest.fixture
+def storage(harness):
+    import storage
+
+    return storage
+
+
+def test_content_key(storage):
+    digest = hashlib.sha256(b"image").hexdigest()
+
+    assert storage.content_key(b"image") == f"ephemeral/{digest[:2]}/{digest}.jpg"
+    assert storage.content_key(b"image", storage.PERSISTED, ".png") == f"persisted/{digest[:2]}/{digest}.png"
+
+
+def test_copy_key(storage):
+    key = storage.copy_key("s3://catalog/catalog/0001.jpg")
+
+    assert key.startswith(storage.EPHEMERAL) and key.endswith(".jpg")
+    assert key == storage.copy_key("s3://catalog/catalog/0001.jpg")
+    assert key != storage.copy_key("s3://catalog/catalog/0002.jpg")
+
+
+def test_exists(storage, tmp_path):
+    s3 = LocalS3(tmp_path)
+    s3.put_object(Bucket="bucket", Key="a.jpg", Body=b"a")
+
+    assert storage.exists(s3, "bucket", "a.jpg")
+    assert not storage.exists(s3, "bucket", "b.jpg")
+
+
+def test_uri(storage):
+    assert storage.uri("bucket", "ephemeral/a.jpg") == "s3://bucket/ephemeral/a.jpg"
@@ -0,0 +1,55 @@
+import io
+
+from tools import trace_report
+
+
+def record(api_path, total, s3_get, cache_hit):
+    return (
+        '2026-01-01T00:00:00 stream {"apiPath": "%s", "total": %s, "s3_get": %s, "s3_get.bytes": 100, "s3_get.%s": 1, '
+        '"_aws": {"CloudWatchMetrics": [{"Metrics": [{"Name": "total", "Unit": "Milliseconds"}, '
+        '{"Name": "s3_get", "Unit": "Milliseconds"}, {"Name": "s3_get.bytes", "Unit": "Bytes"}]}]}}'
+        % (api_path, total, s3_get, "cache_hit" if cache_hit else "cache_miss")
+    )
+
+
+LINES = [
+    "START RequestId: 1",
+    record("/inpaint", 100, 40, True),
+    '{"not": "emf"}',
+    "{broken json with \"_aws\"",
+    record("/inpaint", 300, 60, False),
+]
+
+
+def test_iter_records():
+    records = list(trace_report.iter_records(LINES))
+
+    assert [record["total"] for record in records] == [100, 300]
+
+
+def test_rows():
+    rows = trace_report.build_rows(trace_report.aggregate(trace_report.iter_records(LINES)))
+
+    assert [(row["apiPath"], row["stage"]) for row in rows] == [("/inpaint", "total"), ("/inpaint", "s3_get")]
+    total, s3_get = rows
+    assert total["n"] == 2 and total["mean_ms"] == 200.0 and total["max_ms"] == 300.0
+    assert s3_get["share_pct"] == 25.0
+    assert s3_get["mean_bytes"] == 100
+    assert s3_get["hit_rate"] == 0.5
+    assert total["hit_rate"] == ""
+
+
+def test_percentile():
+    assert trace_report.percentile([], 50) == 0.0
+    assert trace_report.percentile([5, 1, 3, 2, 4], 50) == 2
+    assert trace_report.percentile([5, 1, 3, 2, 4], 99) == 5
+
+
+def test_print_table():
+    out = io.StringIO()
+
+    trace_report.print_table(trace_report.build_rows(trace_report.aggregate(trace_report.iter_records(LINES))), out)
+
+    header, *lines = out.getvalue().splitlines()
+    assert header.split()[:3] == ["apiPath", "stage", "n"]
+    assert len(lines) == 2
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def records(monkeypatch):
+    import tracing
+
+    emitted = []
+    monkeypatch.setattr(tracing, "emit", emitted.append)
+    return emitted
+
+
+def test_invocation_emits_one_record(records):
+    import tracing
+
+    with tracing.invocation("/weather", "request-1"):
+        with tracing.span("http_weather", bytes=10) as span:
+            span.set("cache", False)
+        with tracing.span("http_weather", bytes=5):
+            pass
+        tracing.incr("retries")
+        tracing.incr("retries", 2)
+        tracing.gauge("peak", 3)
+        tracing.gauge("peak", 1)
+
+    (record,) = records
+    assert record["apiPath"] == "/weather"
+    assert record["requestId"] == "request-1"
+    assert record["http_weather.calls"] == 2
+    assert record["http_weather.bytes"] == 15
+    assert record["http_weather.cache_miss"] == 1
+    assert record["retries"] == 3
+    assert record["peak"] == 3
+    (directive,) = record["_aws"]["CloudWatchMetrics"]
+    units = {metric["Name"]: metric["Unit"] for metric in directive["Metrics"]}
+    assert units["total"] == units["http_weather"] == "Milliseconds"
+    assert units["http_weather.bytes"] == "Bytes"
+    assert units["retries"] == "Count"
+
+
+def test_span_errors_are_counted(records):
+    import tracing
+
+    with tracing.invocation("/inpaint"):
+        with pytest.raises(RuntimeError):
+            with tracing.span("s3_get"):
+                raise RuntimeError("boom")
+
+    assert records[0]["s3_get.errors"] == 1
+
+
+def test_propagate_records_worker_spans(records):
+    import tracing
+
+    def work():
+        with tracing.span("worker"):
+            pass
+
+    with tracing.invocation("/batch_image_lookup"):
+        thread = threading.Thread(target=tracing.propagate(work))
+        thread.start()
+        thread.join()
+        # Without propagate, the worker thread has no invocation
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    assert records[0]["worker.calls"] == 1
+
+
+def test_disabled(records, monkeypatch):
+    import tracing
+
+    monkeypatch.setattr(tracing, "_enabled", False)
+    with tracing.invocation("/weather"):
+        with tracing.span("http_weather") as span:
+            span.set("bytes", 1)
+        tracing.incr("retries")
+
+    assert records == []
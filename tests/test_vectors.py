@@ -0,0 +1,64 @@
+import io
+import json
+from array import array
+
+import numpy as np
+import pytest
+
+from fashion_common import vectors
+
+VALUES = [0.1234567891, -1.5e-07, 3.0, 0.0, -123456.789]
+
+
+def test_parse_embedding():
+    response = vectors.parse_embedding(io.BytesIO(json.dumps({"embedding": VALUES, "inputTextTokenCount": 3}).encode()))
+
+    assert isinstance(response["embedding"], array) and response["embedding"].typecode == "f"
+    assert response["inputTextTokenCount"] == 3
+
+
+@pytest.mark.parametrize("digits", [4, 7, 9])
+def test_format_vector(digits):
+    vector = array("f", VALUES)
+    expected = [float(f"%.{digits}g" % value) for value in vector]
+
+    assert json.loads(vectors.format_vector(vector, digits)) == expected
+    # numpy vectors are rounded to the same values
+    formatted = json.loads(vectors.format_vector(np.array(vector, dtype=np.float32), digits))
+    if digits < vectors.FLOAT32_DIGITS:
+        assert formatted == expected
+    else:
+        assert np.array_equal(np.array(formatted, dtype=np.float32), np.array(vector, dtype=np.float32))
+
+
+def test_dumps():
+    body = {"size": 1, "query": {"knn": {"vector_field": {"vector": array("f", [0.5, 0.25]), "k": 1}}}, "tags": ["a", 1]}
+
+    assert json.loads(vectors.dumps(body)) == {
+        "size": 1,
+        "query": {"knn": {"vector_field": {"vector": [0.5, 0.25], "k": 1}}},
+        "tags": ["a", 1],
+    }
+    assert vectors.is_vector(np.zeros(3)) and not vectors.is_vector(np.zeros((2, 2)))
+    assert not vectors.is_vector(array("i", [1]))
+
+
+def test_serializer():
+    serializer = vectors.VectorSerializer(digits=4)
+
+    assert serializer.dumps('{"index": {}}') == '{"index": {}}'
+    assert serializer.dumps([array("f", [0.123456])]) == "[[0.1235]]"
+    assert serializer.loads('{"a": 1}') == {"a": 1}
+    with pytest.raises(Exception):
+        serializer.loads("not json")
+
+
+@pytest.mark.parametrize("digits", [7, 9])
+def test_format_vector_of_memory_mapped_rows(tmp_path, digits):
+    matrix = np.arange(12, dtype=np.float32).reshape(3, 4) / 7
+    np.save(tmp_path / "vectors.npy", matrix)
+    mapped = np.load(tmp_path / "vectors.npy", mmap_mode="r")
+
+    assert vectors.format_vector(mapped[1], digits) == vectors.format_vector(matrix[1].copy(), digits)
+    # A column is not contiguous
+    assert vectors.format_vector(matrix[:, 1], digits) == vectors.format_vector(matrix[:, 1].copy(), digits)
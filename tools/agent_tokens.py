@@ -0,0 +1,233 @@
+"""
+Build the compact agent instructions and schema and count the input tokens per agent step.
+
+The agent sends its instructions and the description of every action to the
+foundation model on each orchestration step, followed by the conversation so far.
+``build`` produces the compact variants deployed with ``compact_agent_prompt``
+(components/bedrock_agent/compact.py) and reports their token counts. ``turns``
+replays scripted conversations offline and reports the input tokens of every step
+with the source and the compact variants. Counts are estimates unless
+``--bedrock-model`` is given, which counts them with the Bedrock CountTokens API.
+
+Usage:
+    python -m tools.agent_tokens build --output build/agent
+    python -m tools.agent_tokens turns
+    python -m tools.agent_tokens --bedrock-model anthropic.claude-3-sonnet-20240229-v1:0 turns --scenarios scenarios.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import boto3
+
+from components.bedrock_agent import compact
+from components.bedrock_agent.prompt import agent_instructions
+from components.bedrock_agent.schema import load_schema, subset_schema
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "components/layers/common_layer"))
+from fashion_common import load_config  # noqa: E402
+
+# Conversations replayed by `turns` when no --scenarios file is given. Each step is
+# an action call with its observation; the final answer is one more model call.
+SCENARIOS = [
+    {
+        "input": "What should I wear in Paris next week?",
+        "steps": [
+            {
+                "api_path": "/weather",
+                "parameters": {"location_name": "Paris", "start_date": "2024-06-10", "end_date": "2024-06-16"},
+                "observation": "Daily forecast for Paris:\n"
+                + "\n".join(
+                    f"2024-06-{day}: 55 to 68 F, Rain: Slight intensity, 2.1 mm of precipitation" for day in range(10, 17)
+                ),
+            },
+            {
+                "api_path": "/imageGeneration",
+                "parameters": {"input_query": "outfit for a week in Paris", "weather": "Mild and rainy"},
+                "observation": "s3://fashion-agent-bucket/ephemeral/3f/3f8a52c1d09b7e64a2f1c8d5e3b0a97f6d4c2e1b8a7f5d3c9e0b6a4f2d1c8e7b.jpg",
+            },
+        ],
+    },
+    {
+        "input": "Find me a dress like this one but in red. s3://fashion-agent-bucket/ephemeral/5e/5e8a52c1d09b7e64a2f1c8d5e3b0a97f6d4c2e1b8a7f5d3c9e0b6a4f2d1c8e7b.png",
+        "steps": [
+            {
+                "api_path": "/image_lookup",
+                "parameters": {"input_image": "s3://fashion-agent-bucket/ephemeral/5e/5e8a52c1d09b7e64a2f1c8d5e3b0a97f6d4c2e1b8a7f5d3c9e0b6a4f2d1c8e7b.png", "input_query": "red dress"},
+                "observation": "s3://fashion-agent-bucket/ephemeral/a9/a98a52c1d09b7e64a2f1c8d5e3b0a97f6d4c2e1b8a7f5d3c9e0b6a4f2d1c8e7b.jpg",
+            },
+        ],
+    },
+    {
+        "input": "Put together a beach outfit: a linen shirt, shorts and sandals, then show it on a beach at sunset.",
+        "steps": [
+            {
+                "api_path": "/batch_image_lookup",
+                "parameters": {"queries": ["linen shirt", "shorts", "sandals"]},
+                "observation": json.dumps(
+                    [
+                        {"query": query, "image": f"s3://fashion-agent-bucket/ephemeral/{i}c/{i}c8a52c1d09b7e64a2f1c8d5e3b0a97f6d4c2e1b8a7f5d3c9e0b6a4f2d1c8e7b.jpg"}
+                        for i, query in enumerate(["linen shirt", "shorts", "sandals"])
+                    ]
+                ),
+            },
+            {
+                "api_path": "/outpaint",
+                "parameters": {
+                    "text": "a beach at sunset",
+                    "mask": "linen shirt",
+                    "image_location": "s3://fashion-agent-bucket/ephemeral/0c/0c8a52c1d09b7e64a2f1c8d5e3b0a97f6d4c2e1b8a7f5d3c9e0b6a4f2d1c8e7b.jpg",
+                },
+                "observation": "s3://fashion-agent-bucket/ephemeral/sessions/1/edits/0/v001.png",
+            },
+        ],
+    },
+]
+
+
+def variants(config: dict) -> dict:
+    """Return {"source": (instructions, {group: schema}), "compact": (...)} for the deployed action groups."""
+    schema = load_schema(config["schema_name"])
+    compact_schema = compact.compact_schema(schema)
+    profiles = config["lambda_profiles"]
+    return {
+        "source": (agent_instructions, {name: subset_schema(schema, p["actions"]) for name, p in profiles.items()}),
+        "compact": (
+            compact.compact_instructions(agent_instructions),
+            {name: subset_schema(compact_schema, p["actions"]) for name, p in profiles.items()},
+        ),
+    }
+
+
+def render_tools(schemas: dict) -> str:
+    """Render the action groups roughly as the agent presents them to the model."""
+    tools = []
+    for group, schema in schemas.items():
+        for api_path, methods in schema["paths"].items():
+            for method, operation in methods.items():
+                parameters = "".join(
+                    f"<parameter><name>{p['name']}</name><type>{p.get('schema', {}).get('type', 'string')}</type>"
+                    f"<description>{p.get('description', '')}</description><is_required>{str(p.get('required', False)).lower()}</is_required></parameter>"
+                    for p in operation.get("parameters", [])
+                )
+                responses = "".join(
+                    f"<response><code>{code}</code><description>{json.dumps(response)}</description></response>"
+                    for code, response in operation.get("responses", {}).items()
+                )
+                description = " ".join(filter(None, [operation.get("summary"), operation.get("description")]))
+                tools.append(
+                    f"<tool_description><tool_name>{method.upper()}::{group}::{api_path}</tool_name>"
+                    f"<description>{description}</description><parameters>{parameters}</parameters>"
+                    f"<returns>{responses}</returns></tool_description>"
+                )
+    return "<tools>" + "".join(tools) + "</tools>"
+
+
+def step_inputs(instructions: str, schemas: dict, scenario: dict):
+    """Yield (step name, system text, conversation text) for every model call of a turn."""
+    system = f"{instructions}\n{render_tools(schemas)}"
+    conversation = f"Human: {scenario['input']}\n\nAssistant:"
+    for step in scenario["steps"]:
+        yield step["api_path"], system, conversation
+        conversation += (
+            f"<thinking>Call {step['api_path']}.</thinking><function_calls><invoke><tool_name>{step['api_path']}</tool_name>"
+            f"<parameters>{json.dumps(step['parameters'])}</parameters></invoke></function_calls>"
+            f"<function_results><stdout>{step['observation']}</stdout></function_results>"
+        )
+    yield "answer", system, conversation
+
+
+class Counter:
+    """Count tokens with the offline estimate, or with Bedrock CountTokens for ``model_id``."""
+
+    def __init__(self, model_id: str = None, session=None):
+        self.model_id = model_id
+        self.client = session.client("bedrock-runtime") if model_id else None
+
+    def count(self, system: str, conversation: str) -> int:
+        if not self.client:
+            return compact.estimate_tokens(system) + compact.estimate_tokens(conversation)
+        response = self.client.count_tokens(
+            modelId=self.model_id,
+            input={
+                "converse": {
+                    "system": [{"text": system}],
+                    # CountTokens rejects empty messages
+                    "messages": [{"role": "user", "content": [{"text": conversation or "."}]}],
+                }
+            },
+        )
+        return response["inputTokens"]
+
+
+def build(args):
+    config = load_config()
+    try:
+        compact.check_rewrites(agent_instructions, json.dumps(load_schema(config["schema_name"])))
+    except ValueError as e:
+        sys.exit(str(e))
+    built = variants(config)
+    counter = Counter(args.bedrock_model, boto3.Session(profile_name=args.profile, region_name=args.region))
+    print(f"{'part':32}  {'source':>7}  {'compact':>7}  {'saved':>6}")
+    parts = [("instructions", built["source"][0], built["compact"][0])] + [
+        (f"schema {group}", compact.schema_payload(built["source"][1][group]), compact.schema_payload(schemas))
+        for group, schemas in built["compact"][1].items()
+    ]
+    for name, source, compacted in parts:
+        before, after = counter.count(source, ""), counter.count(compacted, "")
+        print(f"{name:32}  {before:>7}  {after:>7}  {1 - after / before:>6.0%}")
+    if args.output:
+        args.output.mkdir(parents=True, exist_ok=True)
+        (args.output / "agent_instructions.txt").write_text(built["compact"][0])
+        compact_schema = compact.compact_schema(load_schema(config["schema_name"]))
+        (args.output / config["schema_name"]).write_text(json.dumps(compact_schema, indent=2))
+        print(f"wrote {args.output / 'agent_instructions.txt'} and {args.output / config['schema_name']}")
+
+
+def turns(args):
+    config = load_config()
+    built = variants(config)
+    scenarios = json.loads(args.scenarios.read_text()) if args.scenarios else SCENARIOS
+    counter = Counter(args.bedrock_model, boto3.Session(profile_name=args.profile, region_name=args.region))
+    totals = {"source": 0, "compact": 0}
+    print(f"{'turn':4}  {'step':20}  {'source':>7}  {'compact':>7}  {'saved':>6}")
+    for number, scenario in enumerate(scenarios, 1):
+        counts = {
+            name: [counter.count(system, conversation) for _, system, conversation in step_inputs(*built[name], scenario)]
+            for name in ("source", "compact")
+        }
+        steps = [name for name, _, _ in step_inputs(*built["source"], scenario)]
+        for step, before, after in zip(steps, counts["source"], counts["compact"]):
+            print(f"{number:<4}  {step:20}  {before:>7}  {after:>7}  {1 - after / before:>6.0%}")
+        for name in totals:
+            totals[name] += sum(counts[name])
+    print(
+        f"{'all':4}  {'input tokens':20}  {totals['source']:>7}  {totals['compact']:>7}  "
+        f"{1 - totals['compact'] / totals['source']:>6.0%}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bedrock-model", help="Count tokens with Bedrock CountTokens for this model id")
+    parser.add_argument("--profile", help="AWS profile to use")
+    parser.add_argument("--region", help="AWS region to use")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Build the compact variants and report their token counts")
+    build_parser.add_argument("--output", type=Path, help="Write the compact instructions and schema to this directory")
+    build_parser.set_defaults(func=build)
+
+    turns_parser = commands.add_parser("turns", help="Count the input tokens of every step of scripted conversations")
+    turns_parser.add_argument("--scenarios", type=Path, help="JSON list of {input, steps: [{api_path, parameters, observation}]}")
+    turns_parser.set_defaults(func=turns)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
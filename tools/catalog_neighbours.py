@@ -0,0 +1,127 @@
+"""
+Precompute the nearest neighbours of every catalog image for the agent Lambda.
+
+Reads an index snapshot (see tools/index_snapshot.py) with the vectors memory-mapped,
+and finds the top-N neighbours of each document with blocked NumPy matrix multiplies,
+so only one block of distances is in memory at a time. Scores use the OpenSearch l2
+space (1 / (1 + squared distance)). The result is written in the format read by
+components/lambda/agent/neighbours.py; lookups whose input is a catalog image are
+then served from it without an embedding call or kNN search. Documents are
+identified by their image_id field, so the table stays valid when the index is
+restored or rebuilt with new document ids; documents without one are left out.
+
+Usage:
+    python -m tools.index_snapshot export snapshots/images-index
+    python -m tools.catalog_neighbours snapshots/images-index --neighbours 10 --upload
+    python -m tools.catalog_neighbours snapshots/boutique --upload --tenant boutique
+"""
+
+import argparse
+import json
+import sys
+import time
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from tools import index_snapshot
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "components/lambda/agent"))
+from fashion_common import clients  # noqa: E402
+from neighbours import NeighbourIndex  # noqa: E402
+
+ROW_BLOCK = 1024
+COLUMN_BLOCK = 8192
+
+
+def top_neighbours(
+    vectors: np.ndarray, neighbours: int, row_block: int = ROW_BLOCK, column_block: int = COLUMN_BLOCK
+):
+    """
+    Find the nearest neighbours of every row, excluding the row itself.
+
+    Args:
+        vectors: Matrix with one embedding per row, may be memory-mapped.
+        neighbours (int): Neighbours to keep per row.
+
+    Returns:
+        tuple: int32 positions and float32 scores, both of shape (rows, neighbours),
+        best first. Positions are -1 when there are fewer rows than neighbours.
+    """
+    count = len(vectors)
+    keep = min(neighbours, count - 1)
+    positions = np.full((count, neighbours), -1, dtype=np.int32)
+    scores = np.zeros((count, neighbours), dtype=np.float32)
+    if keep <= 0:
+        return positions, scores
+    norms = np.einsum("ij,ij->i", vectors, vectors, dtype=np.float32)
+    for start in range(0, count, row_block):
+        rows = np.asarray(vectors[start : start + row_block], dtype=np.float32)
+        best_distances = np.full((len(rows), keep), np.inf, dtype=np.float32)
+        best_positions = np.full((len(rows), keep), -1, dtype=np.int64)
+        for column in range(0, count, column_block):
+            columns = np.asarray(vectors[column : column + column_block], dtype=np.float32)
+            # squared l2 distance from the dot products
+            distances = norms[start : start + len(rows), None] + norms[None, column : column + len(columns)]
+            distances -= 2 * rows @ columns.T
+            # exclude each row itself
+            own = np.arange(start, start + len(rows))
+            inside = (own >= column) & (own < column + len(columns))
+            distances[np.flatnonzero(inside), own[inside] - column] = np.inf
+            merged_distances = np.concatenate([best_distances, distances], axis=1)
+            merged_positions = np.concatenate(
+                [best_positions, np.broadcast_to(np.arange(column, column + len(columns)), distances.shape)], axis=1
+            )
+            top = np.argpartition(merged_distances, keep - 1, axis=1)[:, :keep]
+            best_distances = np.take_along_axis(merged_distances, top, axis=1)
+            best_positions = np.take_along_axis(merged_positions, top, axis=1)
+        order = np.argsort(best_distances, axis=1)
+        best_distances = np.maximum(np.take_along_axis(best_distances, order, axis=1), 0)
+        positions[start : start + len(rows), :keep] = np.take_along_axis(best_positions, order, axis=1)
+        scores[start : start + len(rows), :keep] = 1 / (1 + best_distances)
+        print(f"{min(start + row_block, count)} of {count} documents", file=sys.stderr)
+    return positions, scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("snapshot", type=Path, help="Index snapshot directory")
+    parser.add_argument("--neighbours", type=int, default=10, help="Neighbours kept per document")
+    parser.add_argument("--output", type=Path, help="Write the neighbour index to this file")
+    parser.add_argument("--upload", action="store_true", help="Upload the neighbour index to the agent bucket")
+    parser.add_argument("--bucket", help="Defaults to the BucketName output in variables.json")
+    parser.add_argument("--tenant", help="Upload to the neighbours_key of this tenant of config.yml")
+    parser.add_argument("--profile", help="AWS profile to use")
+    parser.add_argument("--region", help="AWS region to use")
+    args = parser.parse_args(argv)
+
+    with open(args.snapshot / "manifest.json", "r") as f:
+        manifest = json.load(f)
+    vectors = np.load(args.snapshot / "vectors.npy", mmap_mode="r")
+    ids = [str(row.get("image_id") or "") for row in index_snapshot.iter_metadata(args.snapshot / manifest["metadata"])]
+    if "" in ids:
+        print(f"{ids.count('')} documents have no image_id and are left out of the neighbours", file=sys.stderr)
+    start = time.perf_counter()
+    positions, scores = top_neighbours(vectors, args.neighbours)
+    print(f"computed {args.neighbours} neighbours of {len(ids)} documents in {time.perf_counter() - start:.1f} s")
+    data = NeighbourIndex(
+        ids, args.neighbours, array("i", positions.ravel().tobytes()), array("f", scores.ravel().tobytes())
+    ).to_bytes()
+
+    if args.output:
+        args.output.write_bytes(data)
+        print(f"wrote {args.output} ({len(data) / 1e6:.1f} MB)")
+    if args.upload:
+        settings = index_snapshot.stack_settings(bucket_name=args.bucket, region=args.region)
+        if not settings.bucket_name:
+            parser.error("--bucket is required when variables.json has no BucketName output")
+        key = settings.tenant(args.tenant).neighbours_key
+        if not key:
+            parser.error("the tenant has no neighbours_key in config.yml")
+        clients.client("s3", settings, args.profile).put_object(Bucket=settings.bucket_name, Key=key, Body=data)
+        print(f"uploaded s3://{settings.bucket_name}/{key} ({len(data) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
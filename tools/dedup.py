@@ -0,0 +1,173 @@
+"""
+Find near-duplicate images from their embeddings before they are indexed.
+
+Vectors are first bucketed with random-hyperplane LSH (several tables, so a pair of
+near-duplicates only has to collide once), then the cosine similarity of the vectors
+sharing a bucket is computed in NumPy blocks. Pairs above the threshold are joined
+into clusters; the first document of each cluster is kept as the canonical one and
+the others are recorded as its aliases.
+
+Run the benchmark on a synthetic set with injected near-duplicates:
+    python -m tools.dedup --count 100000 --dim 1024
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+THRESHOLD = 0.97
+LSH_BITS = 12
+LSH_TABLES = 8
+# Similarity entries computed per block, bounds the memory of a block to ~64 MB
+BLOCK_ELEMENTS = 16 * 1024 * 1024
+
+
+def normalize(vectors) -> np.ndarray:
+    """Return the vectors as float32 rows of unit length."""
+    unit = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(unit, axis=1, keepdims=True)
+    return unit / np.maximum(norms, 1e-12)
+
+
+def _buckets(unit: np.ndarray, bits: int, tables: int, seed: int):
+    """Yield the row indices of every LSH bucket holding more than one vector."""
+    rng = np.random.default_rng(seed)
+    weights = 1 << np.arange(bits, dtype=np.int64)
+    for _ in range(tables):
+        planes = rng.standard_normal((unit.shape[1], bits)).astype(np.float32)
+        signatures = ((unit @ planes) > 0).astype(np.int64) @ weights
+        order = np.argsort(signatures, kind="stable")
+        boundaries = np.flatnonzero(np.diff(signatures[order])) + 1
+        for bucket in np.split(order, boundaries):
+            if len(bucket) > 1:
+                yield bucket
+
+
+def _similar_pairs(unit: np.ndarray, bucket: np.ndarray, threshold: float):
+    """Return the (left, right) row indices of the pairs of a bucket above the threshold."""
+    rows = max(1, BLOCK_ELEMENTS // len(bucket))
+    vectors = unit[bucket]
+    lefts, rights = [], []
+    for start in range(0, len(bucket), rows):
+        similarities = vectors[start : start + rows] @ vectors.T
+        i, j = np.nonzero(similarities >= threshold)
+        i += start
+        keep = i < j
+        lefts.append(bucket[i[keep]])
+        rights.append(bucket[j[keep]])
+    return np.concatenate(lefts), np.concatenate(rights)
+
+
+def _components(count: int, lefts: np.ndarray, rights: np.ndarray) -> np.ndarray:
+    """Label every row with the smallest row index of its connected component."""
+    labels = np.arange(count)
+    while True:
+        smallest = np.minimum(labels[lefts], labels[rights])
+        updated = labels.copy()
+        np.minimum.at(updated, lefts, smallest)
+        np.minimum.at(updated, rights, smallest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def cluster(
+    vectors,
+    threshold: float = THRESHOLD,
+    bits: int = LSH_BITS,
+    tables: int = LSH_TABLES,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Cluster near-duplicate vectors.
+
+    Args:
+        vectors: Matrix with one embedding per row.
+        threshold (float): Cosine similarity from which two vectors are duplicates.
+        bits (int): Hyperplanes per LSH table; fewer bits give larger buckets.
+        tables (int): Number of LSH tables; more tables miss fewer duplicates.
+        seed (int): Seed of the random hyperplanes.
+
+    Returns:
+        np.ndarray: For every row, the row index of its canonical document.
+    """
+    unit = normalize(vectors)
+    lefts, rights = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for bucket in _buckets(unit, bits, tables, seed):
+        left, right = _similar_pairs(unit, bucket, threshold)
+        lefts.append(left)
+        rights.append(right)
+    return _components(len(unit), np.concatenate(lefts), np.concatenate(rights))
+
+
+def dedup(ids: list, vectors, threshold: float = THRESHOLD, **kwargs):
+    """
+    Split documents into canonical ones and aliases.
+
+    Args:
+        ids (list): Document ids, in the order of the vectors.
+        vectors: Matrix with one embedding per row.
+        threshold (float): Cosine similarity from which two documents are duplicates.
+
+    Returns:
+        tuple: The row indices of the canonical documents, and a dict mapping the id of
+        every canonical document with duplicates to the ids of its aliases.
+    """
+    canonical = cluster(vectors, threshold, **kwargs)
+    keep = np.flatnonzero(canonical == np.arange(len(canonical)))
+    aliases = {}
+    for row in np.flatnonzero(canonical != np.arange(len(canonical))):
+        aliases.setdefault(ids[canonical[row]], []).append(ids[row])
+    return keep, aliases
+
+
+def synthetic(count: int, dim: int, duplicate_share: float, noise: float, seed: int = 0):
+    """
+    Random embeddings where ``duplicate_share`` of the rows are noisy copies of others.
+
+    Returns:
+        tuple: The vectors, and for every row the index of the row it was copied from
+        (itself for original rows).
+    """
+    rng = np.random.default_rng(seed)
+    originals = int(count * (1 - duplicate_share))
+    vectors = normalize(rng.standard_normal((count, dim)))
+    source = np.arange(count)
+    source[originals:] = rng.integers(0, originals, count - originals)
+    perturbation = normalize(rng.standard_normal((count - originals, dim))) * noise
+    vectors[originals:] = normalize(vectors[source[originals:]] + perturbation)
+    return vectors, source
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=100_000, help="Synthetic vectors")
+    parser.add_argument("--dim", type=int, default=1024, help="Embedding size")
+    parser.add_argument("--duplicate-share", type=float, default=0.3, help="Share of injected near-duplicates")
+    parser.add_argument("--noise", type=float, default=0.15, help="Relative norm of the noise added to duplicates")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--bits", type=int, default=LSH_BITS)
+    parser.add_argument("--tables", type=int, default=LSH_TABLES)
+    args = parser.parse_args(argv)
+
+    vectors, source = synthetic(args.count, args.dim, args.duplicate_share, args.noise)
+    start = time.perf_counter()
+    canonical = cluster(vectors, args.threshold, args.bits, args.tables)
+    elapsed = time.perf_counter() - start
+
+    kept = int(np.sum(canonical == np.arange(args.count)))
+    copies = source != np.arange(args.count)
+    found = np.mean(canonical[copies] == canonical[source[copies]]) if copies.any() else 1.0
+    # Distinct originals that ended up in the same cluster
+    originals = np.flatnonzero(~copies)
+    false_merges = len(originals) - len(np.unique(canonical[originals]))
+    print(f"vectors:          {args.count} x {args.dim}")
+    print(f"documents kept:   {kept} ({1 - kept / args.count:.1%} smaller index)")
+    print(f"duplicates found: {found:.2%} of injected, {false_merges} false merges")
+    print(f"throughput:       {args.count / elapsed:,.0f} vectors/s ({elapsed:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Export the image vector index to a snapshot on disk and restore it with bulk requests.
+
+A snapshot is a directory holding:
+
+    manifest.json     index name, mapping, document count and vector dimension
+    vectors.npy       float32 matrix, one row per document
+    metadata.jsonl    one line per document: its id and every field but the vector
+                      (metadata.parquet with --format parquet, requires pyarrow)
+
+Rows of vectors.npy and metadata lines are in the same order. Export pages through
+the index with a point in time (falling back to a scroll where PIT is not
+available) and streams both files, so the index never has to fit in memory.
+Restore sends parallel chunked _bulk requests with refresh disabled during the load,
+which takes minutes instead of re-embedding every image through Bedrock. Rows are
+read from the memory-mapped matrix and written straight into each bulk line by
+fashion_common.vectors, with --digits significant digits (opensearch.vector_digits of
+config.yml by default, 9 is exact for float32), never as a list of Python floats.
+The client is the shared one of fashion_common.clients, configured from config.yml
+and the deployed stack outputs.
+
+With --swap, import builds a new index next to the live one and then points the
+alias searched by the agent (the index name of the tenant in config.yml) at it in
+one atomic _aliases request, so a catalog is rebuilt without downtime.
+
+Usage:
+    python -m tools.index_snapshot export snapshots/images-2024-06-01
+    python -m tools.index_snapshot import snapshots/images-2024-06-01 --index images-index-restore
+    python -m tools.index_snapshot import snapshots/boutique-2024-06-01 --tenant boutique --swap
+"""
+
+import argparse
+import dataclasses
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from opensearchpy import OpenSearch, helpers
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "components/layers/common_layer"))
+from fashion_common import Settings, clients, load_config  # noqa: E402
+
+VECTOR_FIELD = "vector_field"
+PAGE_SIZE = 500
+PIT_KEEP_ALIVE = "5m"
+# Upper bound of a bulk request body, whatever the chunk size
+MAX_CHUNK_BYTES = 10 * 1024 * 1024
+# Bulk loads send large requests from several threads
+BULK_TIMEOUT = 300
+BULK_POOL_MAXSIZE = 20
+
+
+def stack_settings(**overrides) -> Settings:
+    """
+    The settings of config.yml and of the deployed stack (variables.json, if present).
+
+    Overrides set to None are ignored, so command line options can be passed as is.
+    """
+    config = load_config()
+    try:
+        with open(ROOT / "variables.json", "r") as f:
+            outputs = json.load(f)[config["stack_name"]]
+    except (OSError, KeyError):
+        outputs = {}
+    return Settings.from_config(config, outputs, **{k: v for k, v in overrides.items() if v is not None})
+
+
+def opensearch_client(settings: Settings, profile_name: str = None) -> OpenSearch:
+    """The shared collection client of fashion_common.clients, with the timeout and pool of bulk loads."""
+    policy = dataclasses.replace(
+        settings.clients, opensearch_timeout=BULK_TIMEOUT, opensearch_pool_maxsize=BULK_POOL_MAXSIZE
+    )
+    return clients.opensearch(dataclasses.replace(settings, clients=policy), profile_name)
+
+
+def iter_documents(client: OpenSearch, index: str, page_size: int = PAGE_SIZE):
+    """
+    Yield (id, source) for every document of an index.
+
+    Uses a point in time with search_after so the export is a consistent view of the
+    index, and falls back to a scroll on clusters without PIT support.
+    """
+    try:
+        pit = client.create_pit(index=index, params={"keep_alive": PIT_KEEP_ALIVE})["pit_id"]
+    except Exception as e:
+        print(f"Point in time not available ({e}), using a scroll", file=sys.stderr)
+        for hit in helpers.scan(client, index=index, size=page_size, query={"query": {"match_all": {}}}):
+            yield hit["_id"], hit["_source"]
+        return
+
+    try:
+        search_after = None
+        while True:
+            body = {
+                "size": page_size,
+                "query": {"match_all": {}},
+                "pit": {"id": pit, "keep_alive": PIT_KEEP_ALIVE},
+                "sort": [{"_shard_doc": "asc"}],
+            }
+            if search_after:
+                body["search_after"] = search_after
+            hits = client.search(body=body)["hits"]["hits"]
+            if not hits:
+                return
+            for hit in hits:
+                yield hit["_id"], hit["_source"]
+            search_after = hits[-1]["sort"]
+    finally:
+        client.delete_pit(body={"pit_id": [pit]})
+
+
+class _MetadataWriter:
+    """Writes metadata rows as JSON lines, or as Parquet row groups."""
+
+    def __init__(self, directory: Path, fmt: str, batch_size: int = PAGE_SIZE):
+        self.fmt = fmt
+        self.batch = []
+        self.batch_size = batch_size
+        if fmt == "parquet":
+            self.path = directory / "metadata.parquet"
+            self.writer = None
+        else:
+            self.path = directory / "metadata.jsonl"
+            self.file = open(self.path, "w")
+
+    def write(self, row: dict) -> None:
+        if self.fmt == "parquet":
+            self.batch.append(row)
+            if len(self.batch) >= self.batch_size:
+                self._flush()
+        else:
+            self.file.write(json.dumps(row) + "\n")
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self.batch:
+            return
+        table = pa.Table.from_pylist(self.batch)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        self.batch = []
+
+    def close(self) -> None:
+        if self.fmt == "parquet":
+            self._flush()
+            if self.writer is not None:
+                self.writer.close()
+        else:
+            self.file.close()
+
+
+def _write_npy(raw_path: Path, npy_path: Path, rows: int, dimension: int) -> None:
+    """Prepend an .npy header to a file of raw float32 rows."""
+    with open(npy_path, "wb") as out:
+        header = {
+            "descr": np.lib.format.dtype_to_descr(np.dtype("<f4")),
+            "fortran_order": False,
+            "shape": (rows, dimension),
+        }
+        np.lib.format.write_array_header_1_0(out, header)
+        with open(raw_path, "rb") as raw:
+            shutil.copyfileobj(raw, out, 16 * 1024 * 1024)
+    raw_path.unlink()
+
+
+def export_index(client: OpenSearch, index: str, directory: Path, fmt: str = "jsonl") -> dict:
+    """
+    Stream every document of an index into a snapshot directory.
+
+    Returns:
+        dict: The manifest written next to the data.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    # Keyed by the concrete index when ``index`` is an alias
+    mapping = next(iter(client.indices.get_mapping(index=index).values()))["mappings"]
+    dimension = int(mapping["properties"][VECTOR_FIELD]["dimension"])
+    raw_path = directory / "vectors.f32"
+    metadata = _MetadataWriter(directory, fmt)
+    count = 0
+    start = time.perf_counter()
+    with open(raw_path, "wb") as vector_file:
+        for doc_id, source in iter_documents(client, index):
+            vector = np.asarray(source.pop(VECTOR_FIELD), dtype="<f4")
+            if vector.shape != (dimension,):
+                raise ValueError(f"Document {doc_id} has a vector of shape {vector.shape}, expected ({dimension},)")
+            vector_file.write(vector.tobytes())
+            metadata.write({"_id": doc_id, **source})
+            count += 1
+            if count % 1000 == 0:
+                print(f"exported {count} documents", file=sys.stderr)
+    metadata.close()
+    _write_npy(raw_path, directory / "vectors.npy", count, dimension)
+    manifest = {
+        "index": index,
+        "count": count,
+        "dimension": dimension,
+        "vector_field": VECTOR_FIELD,
+        "metadata": metadata.path.name,
+        "mappings": mapping,
+    }
+    with open(directory / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"exported {count} documents in {time.perf_counter() - start:.1f} s to {directory}")
+    return manifest
+
+
+def iter_metadata(path: Path):
+    """Yield the metadata rows of a snapshot, in the order of its vectors."""
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=PAGE_SIZE):
+            yield from batch.to_pylist()
+    else:
+        with open(path, "r") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def _actions(directory: Path, manifest: dict, index: str, keep_ids: bool):
+    matrix = np.load(directory / "vectors.npy", mmap_mode="r")
+    for row, source in enumerate(iter_metadata(directory / manifest["metadata"])):
+        doc_id = source.pop("_id")
+        # The float32 row is formatted by the client's serializer when the bulk line is built
+        action = {"_index": index, "_source": {**source, manifest["vector_field"]: matrix[row]}}
+        if keep_ids:
+            action["_id"] = doc_id
+        yield action
+
+
+def _disable_refresh(client: OpenSearch, index: str):
+    """
+    Disable refreshes of an index for the duration of a load.
+
+    Returns:
+        tuple: Whether refreshes were disabled, and the previous refresh interval.
+    """
+    try:
+        settings = client.indices.get_settings(index=index)[index]["settings"]
+        previous = settings.get("index", {}).get("refresh_interval")
+        client.indices.put_settings(index=index, body={"index": {"refresh_interval": "-1"}})
+        return True, previous
+    except Exception as e:
+        # OpenSearch Serverless manages refreshes itself
+        print(f"Could not disable refreshes ({e}), loading with the default interval", file=sys.stderr)
+        return False, None
+
+
+def import_index(
+    client: OpenSearch,
+    directory: Path,
+    index: str = None,
+    threads: int = 4,
+    chunk_size: int = 200,
+    keep_ids: bool = False,
+) -> int:
+    """
+    Load a snapshot into an index with parallel chunked _bulk requests.
+
+    The index is created with the mapping of the snapshot if it does not exist.
+    Document ids are assigned by the index unless ``keep_ids``: vector search
+    collections of OpenSearch Serverless reject explicit ids, and catalog images are
+    identified by their ``image_id`` field, which the load keeps.
+
+    Returns:
+        int: The number of documents loaded.
+    """
+    with open(directory / "manifest.json", "r") as f:
+        manifest = json.load(f)
+    index = index or manifest["index"]
+    if not client.indices.exists(index=index):
+        client.indices.create(index=index, body={"settings": {"index.knn": True}, "mappings": manifest["mappings"]})
+
+    refresh_disabled, previous = _disable_refresh(client, index)
+    loaded, failed = 0, 0
+    start = time.perf_counter()
+    try:
+        for ok, item in helpers.parallel_bulk(
+            client,
+            _actions(directory, manifest, index, keep_ids),
+            thread_count=threads,
+            chunk_size=chunk_size,
+            max_chunk_bytes=MAX_CHUNK_BYTES,
+            raise_on_error=False,
+        ):
+            if ok:
+                loaded += 1
+            else:
+                failed += 1
+                print(f"failed: {item}", file=sys.stderr)
+    finally:
+        if refresh_disabled:
+            # None resets the interval to the index default
+            client.indices.put_settings(index=index, body={"index": {"refresh_interval": previous}})
+            client.indices.refresh(index=index)
+    print(f"loaded {loaded} of {manifest['count']} documents ({failed} failed) in {time.perf_counter() - start:.1f} s")
+    return loaded
+
+
+def swap_alias(client: OpenSearch, alias: str, index: str) -> list:
+    """
+    Point an alias at an index in one atomic _aliases request.
+
+    An index named like the alias, left by a load made before aliases were used, is
+    deleted in the same request, so searches on the name never fail.
+
+    Returns:
+        list: The indexes the alias pointed to before.
+    """
+    actions = [{"add": {"index": index, "alias": alias}}]
+    previous = []
+    if client.indices.exists_alias(name=alias):
+        previous = sorted(client.indices.get_alias(name=alias))
+        actions = [{"remove": {"index": name, "alias": alias}} for name in previous] + actions
+    elif client.indices.exists(index=alias):
+        actions.append({"remove_index": {"index": alias}})
+    client.indices.update_aliases(body={"actions": actions})
+    return previous
+
+
+def rebuild(client: OpenSearch, directory: Path, alias: str, keep_previous: bool = False, **options) -> str:
+    """
+    Load a snapshot into a new index and swap the alias over to it once complete.
+
+    The alias keeps serving the previous index until the new one holds every
+    document of the snapshot; a partial load is left aside and never swapped in.
+
+    Returns:
+        str: The name of the new index.
+    """
+    with open(directory / "manifest.json", "r") as f:
+        expected = json.load(f)["count"]
+    index = f"{alias}-{time.strftime('%Y%m%d%H%M%S')}"
+    loaded = import_index(client, directory, index, **options)
+    if loaded != expected:
+        raise RuntimeError(f"{index} holds {loaded} of {expected} documents, {alias} was not swapped")
+    previous = swap_alias(client, alias, index)
+    print(f"{alias} -> {index}" + (f", was {', '.join(previous)}" if previous else ""))
+    if not keep_previous:
+        for name in previous:
+            client.indices.delete(index=name)
+            print(f"deleted {name}")
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("directory", type=Path, help="Snapshot directory")
+    parser.add_argument("--host", help="Collection endpoint, defaults to the one in variables.json")
+    parser.add_argument("--index", help="Index to export or restore into, defaults to the one of the tenant")
+    parser.add_argument("--tenant", help="Tenant of config.yml whose index is used, the default catalog otherwise")
+    parser.add_argument(
+        "--swap",
+        action="store_true",
+        help="Import into a new index, then point the index name (an alias) at it and delete the previous one",
+    )
+    parser.add_argument("--keep-previous", action="store_true", help="With --swap, keep the previous index")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl", help="Metadata format")
+    parser.add_argument("--threads", type=int, default=4, help="Parallel bulk requests")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Documents per bulk request")
+    parser.add_argument(
+        "--digits",
+        type=int,
+        choices=range(4, 10),
+        help="Significant digits of the restored vectors, defaults to opensearch.vector_digits of config.yml",
+    )
+    parser.add_argument(
+        "--keep-ids",
+        action="store_true",
+        help="Restore the exported document ids, on OpenSearch domains only (vector search collections reject them)",
+    )
+    parser.add_argument("--profile", help="AWS profile to use")
+    parser.add_argument("--region", help="AWS region to use")
+    args = parser.parse_args(argv)
+
+    settings = stack_settings(aoss_host=args.host, vector_digits=args.digits, region=args.region)
+    if not settings.aoss_host:
+        parser.error("--host is required when variables.json has no collection endpoint")
+    client = opensearch_client(settings, args.profile)
+    if args.command == "export":
+        export_index(client, args.index or settings.tenant(args.tenant).index_name, args.directory, args.format)
+    elif args.swap:
+        options = {"threads": args.threads, "chunk_size": args.chunk_size, "keep_ids": args.keep_ids}
+        alias = args.index or settings.tenant(args.tenant).index_name
+        rebuild(client, args.directory, alias, args.keep_previous, **options)
+    else:
+        index = args.index or (settings.tenant(args.tenant).index_name if args.tenant else None)
+        import_index(client, args.directory, index, args.threads, args.chunk_size, args.keep_ids)
+
+
+if __name__ == "__main__":
+    main()
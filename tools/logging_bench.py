@@ -0,0 +1,104 @@
+"""
+Measure the logging overhead of the agent Lambda handler per invocation, before
+and after the capped lazy log fields of components/lambda/agent/log_fields.py.
+
+Replays the handler's event and response log lines for a synthetic agent event
+with large inline content, at INFO (records emitted) and WARNING (records
+dropped), and reports the time spent and the bytes written per invocation.
+
+Usage:
+    python -m tools.logging_bench --inline-kb 512 --runs 200
+"""
+
+import argparse
+import base64
+import io
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "components/lambda/agent"), str(ROOT / "components/layers/common_layer")]
+import log_fields  # noqa: E402
+
+
+def _event(inline_kb: int) -> dict:
+    image = base64.b64encode(os.urandom(inline_kb * 768)).decode()
+    return {
+        "messageVersion": "1.0",
+        "actionGroup": "search",
+        "apiPath": "/image_lookup",
+        "httpMethod": "GET",
+        "sessionId": "123456789012345",
+        "inputText": "Find me a dress like this one but in red, for a summer wedding. " * 20,
+        "parameters": [
+            {"name": "input_image", "type": "string", "value": "s3://bucket/uploads/photo.jpg"},
+            {"name": "input_query", "type": "string", "value": "red summer dress"},
+        ],
+        "sessionAttributes": {"last_image": image, "token": "secret-value"},
+        "promptSessionAttributes": {},
+    }
+
+
+def _response(event: dict) -> dict:
+    return {
+        "messageVersion": "1.0",
+        "response": {
+            "actionGroup": event["actionGroup"],
+            "apiPath": event["apiPath"],
+            "httpMethod": event["httpMethod"],
+            "httpStatusCode": 200,
+            "responseBody": {"application/json": {"body": "s3://bucket/OutputImages/lookup_image_1.jpg"}},
+        },
+    }
+
+
+def before(logger, event, response):
+    logger.info(f"Received event: {event}")
+    logger.info(f"Processing action: {event['actionGroup']}, API path: {event['apiPath']}")
+    logger.info(f"Returning response: {response}")
+
+
+def after(logger, event, response):
+    log_fields.sample_invocation()
+    logger.info("Received event: %s", log_fields.capped(event))
+    logger.info("Processing action: %s, API path: %s", event["actionGroup"], event["apiPath"])
+    logger.info("Returning response: %s", log_fields.capped(response))
+
+
+def measure(style, level: str, event: dict, runs: int):
+    """Return (microseconds, bytes logged) per invocation."""
+    stream = io.StringIO()
+    logger = logging.getLogger(f"bench.{style.__name__}.{level}")
+    logger.propagate = False
+    logger.handlers = [logging.StreamHandler(stream)]
+    logger.setLevel(level)
+    response = _response(event)
+    style(logger, event, response)  # warm-up
+    stream.seek(0)
+    stream.truncate()
+    start = time.perf_counter()
+    for _ in range(runs):
+        style(logger, event, response)
+    elapsed = time.perf_counter() - start
+    return elapsed / runs * 1e6, len(stream.getvalue().encode("utf8")) / runs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--inline-kb", type=int, default=512, help="Size of the inline image in the event")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    event = _event(args.inline_kb)
+    print(f"{'level':8}  {'style':7}  {'us/invocation':>13}  {'bytes/invocation':>16}")
+    for level in ("INFO", "WARNING"):
+        for style in (before, after):
+            micros, logged = measure(style, level, event, args.runs)
+            print(f"{level:8}  {style.__name__:7}  {micros:>13.1f}  {logged:>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare the memory and time of decoding a Titan image response by parsing the
+whole JSON body against the streaming extractor in postprocess.py, and time the
+variant stage.
+
+Usage:
+    python -m tools.postprocess_bench --size 1024
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "components/lambda/agent"), str(ROOT / "components/layers/common_layer")]
+import postprocess  # noqa: E402
+
+
+class _S3Stub:
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        fileobj.read()
+
+
+def _response(size: int) -> bytes:
+    from PIL import Image
+
+    # Noise compresses poorly, like a photo-realistic render
+    image = Image.frombytes("RGB", (size, size), os.urandom(size * size * 3))
+    output = BytesIO()
+    image.save(output, format="PNG")
+    return json.dumps({"images": [base64.b64encode(output.getvalue()).decode()], "error": None}).encode()
+
+
+def _parse_whole(raw: bytes) -> bytes:
+    response_body = json.loads(BytesIO(raw).read())
+    return base64.b64decode(response_body.get("images")[0].encode("ascii"))
+
+
+def _measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed_ms, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=1024, help="Image width and height")
+    args = parser.parse_args(argv)
+
+    raw = _response(args.size)
+    print(f"response body: {len(raw) / 1e6:.1f} MB")
+    # Peaks exclude the response body itself, which both paths receive
+    whole, whole_ms, whole_peak = _measure(_parse_whole, raw)
+    streamed, streamed_ms, streamed_peak = _measure(
+        lambda: postprocess.extract_first_image(BytesIO(raw))
+    )
+    assert whole == streamed
+    print(f"json.loads + b64decode: {whole_ms:7.1f} ms  peak {whole_peak / 1e6:6.1f} MB")
+    print(f"streaming extractor:    {streamed_ms:7.1f} ms  peak {streamed_peak / 1e6:6.1f} MB")
+
+    start = time.perf_counter()
+    postprocess.store_variants(_S3Stub(), streamed, "bucket", "OutputImages/bench.png")
+    print(f"variants (full + thumbnail, concurrent): {(time.perf_counter() - start) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Run agent actions locally across Lambda memory settings to pick memory sizes for
+the lambda_profiles in config.yml.
+
+Lambda allocates CPU in proportion to memory (1,769 MB is one full vCPU). Each
+event is replayed in a child process whose CPU share is throttled to match the
+memory setting: the child is pinned to as many cores as the setting gets, and for
+fractional vCPU it is paused and resumed on a short duty cycle. The report lists
+duration, peak RSS and cost per million invocations for every setting.
+
+The child imports components/lambda/agent/lambda_function.py, so it needs the
+same environment variables as the Lambda (s3_bucket, aoss_host, index_name,
+embeddingSize, action_spec and action_paths, see Settings.to_env in
+components/layers/common_layer/fashion_common/settings.py) and access to the
+services they point to.
+
+Usage:
+    python -m tools.power_tuning events/inpaint.json --memory 512 1024 1769 3008
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).resolve().parent.parent / "components/lambda/agent"
+COMMON_LAYER_DIR = Path(__file__).resolve().parent.parent / "components/layers/common_layer"
+
+FULL_VCPU_MB = 1769
+DUTY_CYCLE_S = 0.02
+# x86 on-demand prices in us-east-1 at the time of writing
+PRICE_PER_GB_S = 0.0000166667
+PRICE_PER_REQUEST = 0.0000002
+
+
+def run_child(event_path: str, repeat: int) -> None:
+    """Child process: replay an event ``repeat`` times and print timings as JSON."""
+    sys.path[:0] = [str(AGENT_DIR), str(COMMON_LAYER_DIR)]
+    import lambda_function
+
+    with open(event_path, "r") as f:
+        event = json.load(f)
+    lambda_function.lambda_handler(event, None)  # warm-up, not measured
+    runs = []
+    for _ in range(repeat):
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        lambda_function.lambda_handler(event, None)
+        runs.append(
+            {"wall_ms": (time.perf_counter() - start) * 1000, "cpu_ms": (time.process_time() - cpu_start) * 1000}
+        )
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("POWER_TUNING " + json.dumps({"runs": runs, "peak_rss_mb": peak_rss_mb}))
+
+
+def _throttle(process: subprocess.Popen, share: float) -> None:
+    """Pause/resume the child so it gets ``share`` of one core."""
+    run_s = DUTY_CYCLE_S * share
+    while process.poll() is None:
+        time.sleep(run_s)
+        os.kill(process.pid, signal.SIGSTOP)
+        time.sleep(DUTY_CYCLE_S - run_s)
+        os.kill(process.pid, signal.SIGCONT)
+
+
+def measure(event_path: str, memory_mb: int, repeat: int) -> dict:
+    """Replay an event in a child process throttled to the CPU share of ``memory_mb``."""
+    vcpus = memory_mb / FULL_VCPU_MB
+    cores = sorted(os.sched_getaffinity(0))[: max(1, math.ceil(vcpus))]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "tools.power_tuning", "--child", event_path, "--repeat", str(repeat)],
+        stdout=subprocess.PIPE,
+        text=True,
+        preexec_fn=lambda: os.sched_setaffinity(0, cores),
+        cwd=str(Path(__file__).resolve().parent.parent),
+    )
+    if vcpus < 1:
+        _throttle(process, vcpus)
+    stdout, _ = process.communicate()
+    for line in stdout.splitlines():
+        if line.startswith("POWER_TUNING "):
+            return json.loads(line[len("POWER_TUNING "):])
+    raise RuntimeError(f"Replay of {event_path} at {memory_mb} MB failed")
+
+
+def report(event_path: str, memory_settings: list, repeat: int) -> list:
+    rows = []
+    for memory_mb in memory_settings:
+        result = measure(event_path, memory_mb, repeat)
+        wall = [run["wall_ms"] for run in result["runs"]]
+        p50_ms = statistics.median(wall)
+        # Lambda bills duration rounded up to the millisecond
+        cost = math.ceil(p50_ms) / 1000 * memory_mb / 1024 * PRICE_PER_GB_S + PRICE_PER_REQUEST
+        rows.append(
+            {
+                "memory_mb": memory_mb,
+                "p50_ms": p50_ms,
+                "max_ms": max(wall),
+                "cpu_ms": statistics.median(run["cpu_ms"] for run in result["runs"]),
+                "peak_rss_mb": result["peak_rss_mb"],
+                "usd_per_1m": cost * 1_000_000,
+                "fits": result["peak_rss_mb"] < memory_mb,
+            }
+        )
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("events", nargs="*", help="Agent event JSON files to replay")
+    parser.add_argument("--memory", type=int, nargs="+", default=[256, 512, 1024, 1769, 3008])
+    parser.add_argument("--repeat", type=int, default=5, help="Measured runs per setting")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child, args.repeat)
+        return
+
+    for event_path in args.events:
+        rows = report(event_path, args.memory, args.repeat)
+        print(f"\n{event_path}")
+        print(f"{'memory_mb':>9}  {'p50_ms':>8}  {'max_ms':>8}  {'cpu_ms':>8}  {'rss_mb':>7}  {'usd/1M':>8}")
+        for row in rows:
+            flag = "" if row["fits"] else "  (exceeds memory)"
+            print(
+                f"{row['memory_mb']:>9}  {row['p50_ms']:>8.1f}  {row['max_ms']:>8.1f}  {row['cpu_ms']:>8.1f}  "
+                f"{row['peak_rss_mb']:>7.1f}  {row['usd_per_1m']:>8.2f}{flag}"
+            )
+        fitting = [row for row in rows if row["fits"]]
+        if fitting:
+            cheapest = min(fitting, key=lambda row: row["usd_per_1m"])
+            fastest = min(fitting, key=lambda row: row["p50_ms"])
+            print(f"cheapest: {cheapest['memory_mb']} MB, fastest: {fastest['memory_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Summarize, merge and compare the profiles written by the agent Lambda's profiling mode.
+
+Profiles come from components/lambda/agent/profiling.py, one set per profiled
+invocation: collapsed stacks (``.collapsed``, sample mode) or cProfile stats
+(``.pstats``, cprofile mode), and the largest allocation sites (``.alloc.json``).
+Sources are files, directories or s3:// prefixes, read recursively. Stacks are
+compared as a share of all samples and cProfile and allocation figures as a mean
+per invocation, so sources with a different number of runs compare fairly.
+
+Usage:
+    python -m tools.profiles top s3://fashion-agent-bucket/ephemeral/profiles/inpaint/
+    python -m tools.profiles merge profiles/inpaint --output build/inpaint
+    python -m tools.profiles diff before/inpaint after/inpaint --folded build/inpaint.diff.collapsed
+    flamegraph.pl build/inpaint.collapsed > inpaint.svg
+"""
+
+import argparse
+import json
+import marshal
+import pstats
+import tempfile
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import boto3
+
+KINDS = (".collapsed", ".pstats", ".alloc.json")
+
+
+def _kind(path: Path):
+    return next((kind for kind in KINDS if path.name.endswith(kind)), None)
+
+
+def collect(source: str, session: boto3.Session = None) -> dict:
+    """
+    Return the profile files of a source, by kind.
+
+    Args:
+        source (str): A file, a directory, or an s3:// prefix (downloaded to a
+            temporary directory).
+        session (boto3.Session): The session used for s3:// prefixes.
+
+    Returns:
+        dict: {kind: [Path, ...]} for the kinds found.
+    """
+    if source.startswith("s3://"):
+        bucket, prefix = source[len("s3://"):].split("/", 1)
+        s3 = (session or boto3.Session()).client("s3")
+        directory = Path(tempfile.mkdtemp(prefix="profiles-"))
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                if _kind(Path(item["Key"])):
+                    target = directory / item["Key"]
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    s3.download_file(bucket, item["Key"], str(target))
+        source = directory
+    path = Path(source)
+    files = [path] if path.is_file() else sorted(p for p in path.rglob("*") if p.is_file())
+    found = defaultdict(list)
+    for file in files:
+        if _kind(file):
+            found[_kind(file)].append(file)
+    return found
+
+
+def load_stacks(paths: list) -> Counter:
+    """Sum the sample counts of collapsed stack files."""
+    stacks = Counter()
+    for path in paths:
+        for line in path.read_text().splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def frame_shares(stacks: Counter) -> dict:
+    """Return {frame: (self share, total share)} of the samples, in percent."""
+    total = sum(stacks.values()) or 1
+    own, inclusive = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    return {frame: (100 * own[frame] / total, 100 * inclusive[frame] / total) for frame in inclusive}
+
+
+def load_stats(paths: list) -> pstats.Stats:
+    stats = pstats.Stats(str(paths[0]))
+    for path in paths[1:]:
+        stats.add(str(path))
+    return stats
+
+
+def function_times(paths: list) -> dict:
+    """Return {function: (own seconds, cumulative seconds)} per invocation."""
+    stats = load_stats(paths).stats
+    return {
+        f"{Path(filename).name}:{line}({name})": (tt / len(paths), ct / len(paths))
+        for (filename, line, name), (_, _, tt, ct, _) in stats.items()
+    }
+
+
+def allocation_sites(paths: list) -> tuple:
+    """Return ({site: mean bytes per invocation}, mean peak bytes)."""
+    sizes, peaks = Counter(), []
+    for path in paths:
+        report = json.loads(path.read_text())
+        peaks.append(report["peak_bytes"])
+        for site in report["sites"]:
+            sizes[site["site"]] += site["size"]
+    return {site: size / len(paths) for site, size in sizes.items()}, sum(peaks) / len(peaks)
+
+
+def _table(header: list, rows: list) -> None:
+    cells = [[f"{v:.2f}" if isinstance(v, float) else str(v) for v in row] for row in rows]
+    widths = [max([len(h)] + [len(r[i]) for r in cells]) for i, h in enumerate(header)]
+    print("  ".join(h.rjust(w) if i else h.ljust(w) for i, (h, w) in enumerate(zip(header, widths))))
+    for row in cells:
+        print("  ".join(v.rjust(w) if i else v.ljust(w) for i, (v, w) in enumerate(zip(row, widths))))
+
+
+def top(args):
+    found = collect(args.source, args.session)
+    if ".collapsed" in found:
+        stacks = load_stacks(found[".collapsed"])
+        shares = sorted(frame_shares(stacks).items(), key=lambda item: -item[1][0])[: args.limit]
+        print(f"{len(found['.collapsed'])} sampled invocations, {sum(stacks.values())} samples")
+        _table(["frame", "self %", "total %"], [(frame, own, inclusive) for frame, (own, inclusive) in shares])
+    if ".pstats" in found:
+        print(f"\n{len(found['.pstats'])} cProfile invocations, per invocation")
+        times = sorted(function_times(found[".pstats"]).items(), key=lambda item: -item[1][0])[: args.limit]
+        _table(["function", "own ms", "cum ms"], [(f, own * 1000, cum * 1000) for f, (own, cum) in times])
+    if ".alloc.json" in found:
+        sites, peak = allocation_sites(found[".alloc.json"])
+        print(f"\nallocations, mean peak {peak / 1e6:.2f} MB per invocation")
+        rows = sorted(sites.items(), key=lambda item: -item[1])[: args.limit]
+        _table(["site", "KB"], [(site, size / 1e3) for site, size in rows])
+
+
+def merge(args):
+    found = collect(args.source, args.session)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    if ".collapsed" in found:
+        path = Path(f"{args.output}.collapsed")
+        path.write_text("".join(f"{s} {c}\n" for s, c in load_stacks(found[".collapsed"]).most_common()))
+        print(f"wrote {path}")
+    if ".pstats" in found:
+        path = Path(f"{args.output}.pstats")
+        path.write_bytes(marshal.dumps(load_stats(found[".pstats"]).stats))
+        print(f"wrote {path}")
+    if ".alloc.json" in found:
+        sites, peak = allocation_sites(found[".alloc.json"])
+        path = Path(f"{args.output}.alloc.json")
+        ranked = sorted(sites.items(), key=lambda item: -item[1])
+        report = {"peak_bytes": int(peak), "sites": [{"site": site, "size": int(size)} for site, size in ranked]}
+        path.write_text(json.dumps(report))
+        print(f"wrote {path}")
+
+
+def _deltas(before: dict, after: dict, value, limit: int) -> list:
+    keys = set(before) | set(after)
+    rows = [(key, value(before.get(key)), value(after.get(key))) for key in keys]
+    rows = [(key, b, a, a - b) for key, b, a in rows]
+    return sorted(rows, key=lambda row: -abs(row[3]))[:limit]
+
+
+def diff(args):
+    before, after = collect(args.before, args.session), collect(args.after, args.session)
+    if ".collapsed" in before and ".collapsed" in after:
+        stacks_before, stacks_after = load_stacks(before[".collapsed"]), load_stacks(after[".collapsed"])
+        rows = _deltas(
+            frame_shares(stacks_before), frame_shares(stacks_after), lambda v: v[1] if v else 0.0, args.limit
+        )
+        print("sampled stacks, share of all samples")
+        _table(["frame", "total % before", "total % after", "delta"], rows)
+        if args.folded:
+            # difffolded input of flamegraph.pl, "after" scaled to the sample count of "before"
+            scale = sum(stacks_before.values()) / (sum(stacks_after.values()) or 1)
+            lines = [
+                f"{stack} {stacks_before.get(stack, 0)} {round(stacks_after.get(stack, 0) * scale)}\n"
+                for stack in sorted(set(stacks_before) | set(stacks_after))
+            ]
+            args.folded.parent.mkdir(parents=True, exist_ok=True)
+            args.folded.write_text("".join(lines))
+            print(f"wrote {args.folded}")
+    if ".pstats" in before and ".pstats" in after:
+        rows = _deltas(
+            function_times(before[".pstats"]),
+            function_times(after[".pstats"]),
+            lambda v: v[1] * 1000 if v else 0.0,
+            args.limit,
+        )
+        print("\ncProfile, cumulative ms per invocation")
+        _table(["function", "before", "after", "delta"], rows)
+    if ".alloc.json" in before and ".alloc.json" in after:
+        sites_before, peak_before = allocation_sites(before[".alloc.json"])
+        sites_after, peak_after = allocation_sites(after[".alloc.json"])
+        print(f"\nallocations, mean peak {peak_before / 1e6:.2f} MB -> {peak_after / 1e6:.2f} MB per invocation")
+        rows = _deltas(sites_before, sites_after, lambda v: (v or 0) / 1e3, args.limit)
+        _table(["site", "KB before", "KB after", "delta"], rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--profile", help="AWS profile to use for s3:// sources")
+    parser.add_argument("--region", help="AWS region to use")
+    parser.add_argument("--limit", type=int, default=25, help="Rows per table")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    top_parser = commands.add_parser("top", help="Show the hottest frames, functions and allocation sites")
+    top_parser.add_argument("source", help="Profile file, directory or s3:// prefix")
+    top_parser.set_defaults(func=top)
+
+    merge_parser = commands.add_parser("merge", help="Merge the profiles of several invocations")
+    merge_parser.add_argument("source", help="Profile directory or s3:// prefix")
+    merge_parser.add_argument("--output", type=Path, required=True, help="Output path, without extension")
+    merge_parser.set_defaults(func=merge)
+
+    diff_parser = commands.add_parser("diff", help="Compare two sets of profiles, e.g. before and after a change")
+    diff_parser.add_argument("before", help="Profile file, directory or s3:// prefix")
+    diff_parser.add_argument("after", help="Profile file, directory or s3:// prefix")
+    diff_parser.add_argument("--folded", type=Path, help="Write the stacks as flamegraph.pl difffolded input")
+    diff_parser.set_defaults(func=diff)
+
+    args = parser.parse_args(argv)
+    args.session = boto3.Session(profile_name=args.profile, region_name=args.region)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
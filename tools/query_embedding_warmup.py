@@ -0,0 +1,104 @@
+"""
+Precompute the embeddings of frequent text lookups for the agent Lambda.
+
+Mines the text-only /image_lookup queries logged by the Lambda ("Input image: None,
+Input query: ..."), normalizes them like the Lambda does before matching, embeds the
+most frequent ones with Titan and writes the table read by
+components/lambda/agent/query_embeddings.py. Queries found in the table skip the
+Bedrock call at lookup time.
+
+Usage:
+    aws logs tail /aws/lambda/FashionAgentLambda-search --since 7d > lookup.log
+    python -m tools.query_embedding_warmup lookup.log --top 1000 --upload
+"""
+
+import argparse
+import json
+import re
+import sys
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from tools import index_snapshot
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "components/lambda/agent"))
+import retrieval  # noqa: E402
+from fashion_common import clients  # noqa: E402
+from query_embeddings import QueryEmbeddingTable  # noqa: E402
+
+_QUERY_LINE = re.compile(r"Input image: (?P<image>.*?), Input query: (?P<query>.*)$")
+
+
+def mine_queries(lines) -> Counter:
+    """Count the normalized text-only lookup queries found in log lines."""
+    counts = Counter()
+    for line in lines:
+        match = _QUERY_LINE.search(line.rstrip("\n"))
+        if not match or match.group("image") not in ("None", ""):
+            continue
+        query = retrieval.normalize_query(match.group("query"))
+        if query and query != "none":
+            counts[query] += 1
+    return counts
+
+
+def build_table(bedrock_client, queries: list, embedding_size: int) -> QueryEmbeddingTable:
+    """Embed the queries with Titan and return them as a table."""
+    vectors = array("f")
+    for number, query in enumerate(queries, 1):
+        response = bedrock_client.invoke_model(
+            body=json.dumps(retrieval.embedding_request(embedding_size, text=query)),
+            modelId=retrieval.EMBEDDING_MODEL_ID,
+            accept="application/json",
+            contentType="application/json",
+        )
+        vectors.extend(json.loads(response["body"].read())["embedding"])
+        if number % 100 == 0:
+            print(f"embedded {number} of {len(queries)} queries", file=sys.stderr)
+    return QueryEmbeddingTable(embedding_size, queries, vectors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("logs", nargs="+", help="Lambda log exports, - for stdin")
+    parser.add_argument("--top", type=int, default=1000, help="Number of queries to precompute")
+    parser.add_argument("--min-count", type=int, default=2, help="Minimum occurrences of a query")
+    parser.add_argument("--output", type=Path, help="Write the table to this file")
+    parser.add_argument("--upload", action="store_true", help="Upload the table to the agent bucket")
+    parser.add_argument("--bucket", help="Defaults to the BucketName output in variables.json")
+    parser.add_argument("--profile", help="AWS profile to use")
+    parser.add_argument("--region", help="AWS region to use")
+    args = parser.parse_args(argv)
+
+    counts = Counter()
+    for path in args.logs:
+        if path == "-":
+            counts.update(mine_queries(sys.stdin))
+        else:
+            with open(path, "r") as f:
+                counts.update(mine_queries(f))
+    queries = [query for query, count in counts.most_common(args.top) if count >= args.min_count]
+    covered = sum(counts[query] for query in queries)
+    share = covered / max(1, sum(counts.values()))
+    print(f"{len(counts)} distinct queries, the top {len(queries)} cover {share:.1%} of lookups")
+    if not queries:
+        return
+
+    settings = index_snapshot.stack_settings(bucket_name=args.bucket, region=args.region)
+    table = build_table(clients.client("bedrock-runtime", settings, args.profile), queries, settings.embedding_size)
+    data = table.to_bytes()
+
+    if args.output:
+        args.output.write_bytes(data)
+        print(f"wrote {args.output} ({len(data) / 1e6:.1f} MB)")
+    if args.upload:
+        if not settings.bucket_name or not settings.query_embeddings_key:
+            parser.error("--upload needs a bucket (--bucket or variables.json) and query_embeddings_key in config.yml")
+        key = settings.query_embeddings_key
+        clients.client("s3", settings, args.profile).put_object(Bucket=settings.bucket_name, Key=key, Body=data)
+        print(f"uploaded s3://{settings.bucket_name}/{key} ({len(data) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
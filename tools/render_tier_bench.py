@@ -0,0 +1,70 @@
+"""
+Measure Titan image generation latency and cost per render tier.
+
+Renders the same prompt with the same seed at each tier defined in
+components/lambda/agent/render_tiers.py and reports latency percentiles and
+the estimated cost per image.
+
+Usage:
+    python -m tools.render_tier_bench --prompt "red summer dress" --runs 5
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import boto3
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "components/lambda/agent"), str(ROOT / "components/layers/common_layer")]
+import render_tiers  # noqa: E402
+
+MODEL_ID = "amazon.titan-image-generator-v2:0"
+
+
+def render(client, prompt: str, tier: str, seed: int) -> float:
+    """Run one text-to-image render and return its latency in seconds."""
+    body = json.dumps(
+        {
+            "taskType": "TEXT_IMAGE",
+            "textToImageParams": {"text": prompt},
+            "imageGenerationConfig": render_tiers.generation_config(tier, seed),
+        }
+    )
+    start = time.perf_counter()
+    response = client.invoke_model(
+        body=body, modelId=MODEL_ID, accept="application/json", contentType="application/json"
+    )
+    response["body"].read()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--prompt", default="A red summer dress on a mannequin")
+    parser.add_argument("--runs", type=int, default=5, help="Renders per tier")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--profile", help="AWS profile to use")
+    parser.add_argument("--region", help="AWS region to use")
+    args = parser.parse_args(argv)
+
+    session = boto3.Session(profile_name=args.profile, region_name=args.region)
+    client = session.client("bedrock-runtime")
+
+    print(f"{'tier':8}  {'quality':8}  {'size':9}  {'mean_s':>6}  {'p50_s':>6}  {'max_s':>6}  {'usd/img':>7}")
+    for tier, settings in render_tiers.RENDER_TIERS.items():
+        # one warm-up call so connection setup is not counted
+        render(client, args.prompt, tier, args.seed)
+        latencies = [render(client, args.prompt, tier, args.seed) for _ in range(args.runs)]
+        size = f"{settings['width']}x{settings['height']}"
+        print(
+            f"{tier:8}  {settings['quality']:8}  {size:9}  {statistics.mean(latencies):6.2f}  "
+            f"{statistics.median(latencies):6.2f}  {max(latencies):6.2f}  {settings['cost_usd']:7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""
+Offline replay of agent events against local stand-ins for Bedrock, S3, OpenSearch
+and the weather API, to benchmark and profile the actions without AWS.
+
+    stubs.py     the stand-ins: a directory-backed S3 client, a Bedrock runtime stub
+                 with deterministic embeddings and images and configurable latency,
+                 an in-memory kNN index and an Open-Meteo server on a local port
+    harness.py   imports lambda_function wired to the stand-ins, seeds a small catalog
+    events/      recorded agent events for every API path of the schema
+
+Usage:
+    python -m tools.replay
+    python -m tools.replay tools/replay/events/image_lookup.json --repeat 20 --image-latency 4
+"""
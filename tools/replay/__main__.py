@@ -0,0 +1,67 @@
+"""
+Replay recorded agent events offline and report their latency per event and per stage.
+
+With --profile, every replayed invocation is profiled (components/lambda/agent/profiling.py)
+and its profiles are written under the work directory, ready for ``python -m tools.profiles``.
+
+Usage:
+    python -m tools.replay
+    python -m tools.replay tools/replay/events/image_lookup.json --repeat 20 --image-latency 4
+    python -m tools.replay tools/replay/events/inpaint.json --profile sample --workdir build/replay
+"""
+
+import argparse
+import statistics
+from pathlib import Path
+
+from tools import trace_report
+from tools.replay.harness import Harness, event_paths, load_event
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("events", nargs="*", type=Path, help="Agent event JSON files, all recorded events by default")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per event")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Bedrock embedding call time, seconds")
+    parser.add_argument("--image-latency", type=float, default=0.0, help="Bedrock image call time, seconds")
+    parser.add_argument("--weather-latency", type=float, default=0.0, help="Weather API call time, seconds")
+    parser.add_argument("--embedding-size", type=int, default=1024, choices=[256, 384, 1024])
+    parser.add_argument("--workdir", type=Path, help="Directory of the local S3 objects, temporary by default")
+    parser.add_argument("--profile", choices=["sample", "cprofile"], help="Profile every invocation in this mode")
+    args = parser.parse_args(argv)
+
+    harness = Harness(
+        args.workdir, args.embedding_size, args.embedding_latency, args.image_latency, args.weather_latency
+    )
+    if args.profile:
+        harness.settings["profiling_output"] = str(harness.workdir / "profiles")
+    harness.start()
+    import tracing
+
+    # Collect the EMF lines instead of printing them
+    records = []
+    tracing.emit = records.append
+    try:
+        print(f"{'event':28}  {'status':>6}  {'p50 ms':>8}  {'max ms':>8}  body")
+        for path in args.events or event_paths():
+            event = load_event(path)
+            if args.profile:
+                event["sessionAttributes"] = {**event.get("sessionAttributes", {}), "profiling": args.profile}
+            runs = [harness.invoke(event) for _ in range(args.repeat)]
+            response = runs[-1][0]["response"]
+            wall = [elapsed_ms for _, elapsed_ms in runs]
+            body = response["responseBody"]["application/json"]["body"].replace("\n", " ")
+            print(
+                f"{path.stem:28}  {response['httpStatusCode']:>6}  {statistics.median(wall):>8.1f}  "
+                f"{max(wall):>8.1f}  {body[:60]}"
+            )
+    finally:
+        harness.stop()
+    print()
+    trace_report.print_table(trace_report.build_rows(trace_report.aggregate(records)))
+    if args.profile:
+        print(f"\nprofiles written to {harness.workdir / 'profiles'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Run the agent Lambda in-process against the local stand-ins of stubs.py.
+"""
+
+import datetime
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+AGENT_DIR = ROOT / "components/lambda/agent"
+COMMON_LAYER_DIR = ROOT / "components/layers/common_layer"
+EVENTS_DIR = Path(__file__).resolve().parent / "events"
+
+BUCKET = "replay-bucket"
+INDEX = "images-index"
+# Images referenced by the recorded events
+INPUT_IMAGE_KEY = "ephemeral/replay/model.png"
+JOB_ID = "replay-job"
+# Catalog documents seeded into the index, embedded from their description
+CATALOG = [
+    "red midi dress",
+    "white linen shirt",
+    "blue denim jeans",
+    "black leather jacket",
+    "tan leather sandals",
+    "beige trench coat",
+    "green wool sweater",
+    "navy linen shorts",
+    "floral summer dress",
+    "grey wool coat",
+    "white canvas sneakers",
+    "black evening gown",
+]
+# A second catalog, served to sessions with the tenant_id session attribute
+TENANT = "boutique"
+TENANT_INDEX = "boutique-images"
+TENANT_PREFIX = f"tenants/{TENANT}/"
+TENANT_CATALOG = ["silk slip dress", "cashmere cardigan", "pleated midi skirt", "suede ankle boots"]
+_PLACEHOLDER = re.compile(r"\{today([+-]\d+)?\}")
+
+
+def load_event(path: Path) -> dict:
+    """
+    Load a recorded agent event.
+
+    ``{today}`` and ``{today+N}`` in parameter values are replaced with ISO dates
+    relative to the current UTC day, so forecast events stay within the horizon.
+    """
+    with open(path, "r") as f:
+        event = json.load(f)
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    for parameter in event.get("parameters", []):
+        parameter["value"] = _PLACEHOLDER.sub(
+            lambda match: (today + datetime.timedelta(days=int(match.group(1) or 0))).isoformat(),
+            str(parameter["value"]),
+        )
+    return event
+
+
+def event_paths() -> list:
+    """The recorded events shipped with the harness, one or more per API path."""
+    return sorted(EVENTS_DIR.glob("*.json"))
+
+
+class Harness:
+    """
+    Imports lambda_function with its clients replaced by local stand-ins.
+
+    The settings module of the common layer is configured through the same
+    environment variables as the deployed Lambda, and ``fashion_common.clients``
+    hands out the stand-ins, so the handler and the actions run unchanged. Only one
+    harness can be started per process, since the Lambda modules keep their clients
+    at module level.
+
+    Args:
+        workdir (Path): Directory of the local S3 objects, a temporary one by default.
+        embedding_size (int): Output length of the stub embeddings.
+        embedding_latency (float): Service time of a Bedrock embedding call, seconds.
+        image_latency (float): Service time of a Bedrock image call, seconds.
+        weather_latency (float): Service time of a weather API call, seconds.
+        **settings: Settings of the replayed Lambda, e.g. job_queue_url="local" or
+            profiling_output.
+    """
+
+    def __init__(
+        self,
+        workdir: Path = None,
+        embedding_size: int = 1024,
+        embedding_latency: float = 0.0,
+        image_latency: float = 0.0,
+        weather_latency: float = 0.0,
+        **settings,
+    ):
+        self.workdir = Path(workdir or tempfile.mkdtemp(prefix="replay-"))
+        self.embedding_size = embedding_size
+        self.latencies = (embedding_latency, image_latency, weather_latency)
+        self.settings = settings
+        self.lambda_function = None
+
+    def start(self) -> "Harness":
+        for path in (COMMON_LAYER_DIR, AGENT_DIR):
+            if str(path) not in sys.path:
+                sys.path.insert(0, str(path))
+        from fashion_common import Settings, Tenant, clients, settings
+        from components.bedrock_agent.schema import action_spec, load_schema
+
+        from tools.replay.stubs import BedrockStub, LocalOpenSearch, LocalS3, WeatherServer
+
+        embedding_latency, image_latency, weather_latency = self.latencies
+        self.s3 = LocalS3(self.workdir / "s3")
+        self.bedrock = BedrockStub(embedding_latency, image_latency)
+        self.opensearch = LocalOpenSearch()
+        self.weather = WeatherServer(weather_latency).start()
+
+        schema = load_schema("FashionAgent_Schema.json")
+        config = Settings(
+            region="us-east-1",
+            bucket_name=BUCKET,
+            aoss_host="localhost",
+            index_name=INDEX,
+            embedding_size=self.embedding_size,
+            tracing_enabled=True,
+            action_spec=json.dumps(action_spec(schema)),
+            action_paths=json.dumps(sorted(schema["paths"])),
+            tenants=(Tenant(TENANT, TENANT_INDEX, TENANT_PREFIX),),
+            **self.settings,
+        )
+        os.environ.update(config.to_env())
+        settings.get_settings.cache_clear()
+        services = {"s3": self.s3, "bedrock-runtime": self.bedrock}
+        clients.client = lambda service, *args, **kwargs: services[service]
+        clients.opensearch = lambda *args, **kwargs: self.opensearch
+
+        import forecast
+        import lambda_function
+
+        forecast.FORECAST_URL = self.weather.url("/v1/forecast")
+        forecast.GEOCODING_URL = self.weather.url("/v1/search")
+        self.lambda_function = lambda_function
+        self.seed()
+        return self
+
+    def stop(self) -> None:
+        self.weather.stop()
+
+    def seed(self) -> None:
+        """Put the catalogs, the input image and a finished job in the local services."""
+        from tools.replay.stubs import stub_image
+
+        self.seed_catalog(INDEX, "", CATALOG)
+        self.seed_catalog(TENANT_INDEX, TENANT_PREFIX, TENANT_CATALOG)
+        self.s3.put_object(
+            Bucket=BUCKET, Key=INPUT_IMAGE_KEY, Body=stub_image(512, 512, b"model"), ContentType="image/png"
+        )
+        self.s3.put_object(
+            Bucket=BUCKET,
+            Key=f"jobs/{JOB_ID}.json",
+            Body=json.dumps(
+                {
+                    "job_id": JOB_ID,
+                    "apiPath": "/imageGeneration",
+                    "tenant_id": "default",
+                    "session_id": "replay-session",
+                    "status": "succeeded",
+                    "result": f"s3://{BUCKET}/{INPUT_IMAGE_KEY}",
+                }
+            ).encode("utf8"),
+            ContentType="application/json",
+        )
+
+    def seed_catalog(self, index: str, prefix: str, descriptions: list) -> None:
+        """Index a catalog embedded from its descriptions, its images under ``<prefix>catalog/``."""
+        from tools.replay.stubs import stub_embedding, stub_image
+
+        for number, description in enumerate(descriptions):
+            key = f"{prefix}catalog/{number:04d}.jpg"
+            self.opensearch.index(
+                index=index,
+                body={
+                    "vector_field": stub_embedding(self.embedding_size, text=description),
+                    "s3_uri": f"s3://{BUCKET}/{key}",
+                    "image_id": f"{number:04d}",
+                },
+            )
+            self.s3.put_object(
+                Bucket=BUCKET,
+                Key=key,
+                Body=stub_image(256, 256, description.encode("utf8")),
+                ContentType="image/jpeg",
+                Metadata={"catalog-id": f"{number:04d}"},
+            )
+
+    def invoke(self, event: dict) -> tuple:
+        """Run the Lambda handler on an event, return (response, elapsed ms)."""
+        start = time.perf_counter()
+        response = self.lambda_function.lambda_handler(event, None)
+        return response, (time.perf_counter() - start) * 1000
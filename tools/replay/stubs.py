@@ -0,0 +1,321 @@
+"""
+Local stand-ins for the services called by the agent Lambda.
+
+They implement only the calls the Lambda makes, with the same request and response
+shapes as boto3 and opensearch-py, so the action code runs unchanged against them.
+"""
+
+import base64
+import datetime
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+
+class NoSuchKey(ClientError):
+    """Raised by get_object for a missing key, like ``s3_client.exceptions.NoSuchKey``."""
+
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+class LocalS3:
+    """
+    S3 client backed by a directory: objects are files under ``<root>/<bucket>/<key>``,
+    their content type and user metadata are kept in memory.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.exceptions = SimpleNamespace(NoSuchKey=NoSuchKey)
+        self._attributes = {}
+        self._lock = threading.Lock()
+
+    def _path(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+
+    def _read(self, bucket: str, key: str, operation: str) -> bytes:
+        path = self._path(bucket, key)
+        if not path.is_file():
+            if operation == "GetObject":
+                raise NoSuchKey({"Error": {"Code": "NoSuchKey", "Message": key}}, operation)
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, operation)
+        return path.read_bytes()
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, Metadata=None, IfNoneMatch=None, **kwargs):
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if IfNoneMatch == "*" and path.exists():
+                raise ClientError({"Error": {"Code": "PreconditionFailed", "Message": Key}}, "PutObject")
+            path.write_bytes(data)
+            self._attributes[(Bucket, Key)] = {
+                "ContentType": ContentType or "binary/octet-stream",
+                "Metadata": dict(Metadata or {}),
+            }
+        return {"ETag": _etag(data)}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        extra = ExtraArgs or {}
+        self.put_object(Bucket, Key, Fileobj.read(), ContentType=extra.get("ContentType"), Metadata=extra.get("Metadata"))
+
+    def head_object(self, Bucket, Key, **kwargs):
+        data = self._read(Bucket, Key, "HeadObject")
+        return {"ETag": _etag(data), "ContentLength": len(data), **self._attributes.get((Bucket, Key), {"Metadata": {}})}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        data = self._read(Bucket, Key, "GetObject")
+        etag = _etag(data)
+        if IfNoneMatch == etag:
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+        return {
+            "Body": io.BytesIO(data),
+            "ETag": etag,
+            "ContentLength": len(data),
+            **self._attributes.get((Bucket, Key), {"Metadata": {}}),
+        }
+
+    def copy_object(self, Bucket, Key, CopySource, Metadata=None, MetadataDirective="COPY", **kwargs):
+        data = self._read(CopySource["Bucket"], CopySource["Key"], "CopyObject")
+        source = self._attributes.get((CopySource["Bucket"], CopySource["Key"]), {})
+        if MetadataDirective != "REPLACE":
+            Metadata = source.get("Metadata")
+        return self.put_object(Bucket, Key, data, ContentType=source.get("ContentType"), Metadata=Metadata)
+
+    def get_paginator(self, operation_name: str):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(operation_name)
+        return SimpleNamespace(paginate=self._list_pages)
+
+    def _list_pages(self, Bucket, Prefix="", Delimiter=None, **kwargs):
+        bucket_root = self.root / Bucket
+        keys = sorted(
+            path.relative_to(bucket_root).as_posix() for path in bucket_root.rglob("*") if path.is_file()
+        ) if bucket_root.is_dir() else []
+        keys = [key for key in keys if key.startswith(Prefix)]
+        if Delimiter:
+            keys = [key for key in keys if Delimiter not in key[len(Prefix):]]
+        yield {"Contents": [{"Key": key, "Size": self._path(Bucket, key).stat().st_size} for key in keys], "KeyCount": len(keys)}
+
+
+def stub_embedding(size: int, text: str = None, image_b64: str = None) -> list:
+    """A deterministic unit vector for an image and/or text: the same input always gets the same vector."""
+    seed = hashlib.sha256(f"{image_b64 or ''}\0{text or ''}".encode("utf8")).digest()
+    vector = np.random.default_rng(list(seed)).standard_normal(size)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def stub_image(width: int, height: int, seed: bytes) -> bytes:
+    """A deterministic noise PNG, which compresses about as poorly as a photo-realistic render."""
+    from PIL import Image
+
+    pixels = random.Random(seed).randbytes(width * height * 3)
+    output = io.BytesIO()
+    Image.frombytes("RGB", (width, height), pixels).save(output, format="PNG")
+    return output.getvalue()
+
+
+class BedrockStub:
+    """
+    Bedrock runtime client answering Titan embedding and image requests.
+
+    Responses are deterministic in the request body. ``embedding_latency`` and
+    ``image_latency`` (seconds) set the service time of a call, including the time
+    spent building the response.
+    """
+
+    def __init__(self, embedding_latency: float = 0.0, image_latency: float = 0.0):
+        self.embedding_latency = embedding_latency
+        self.image_latency = image_latency
+        self.calls = 0
+
+    def invoke_model(self, body, modelId, accept=None, contentType=None, **kwargs):
+        start = time.perf_counter()
+        self.calls += 1
+        request = json.loads(body)
+        if "embed" in modelId:
+            size = request.get("embeddingConfig", {}).get("outputEmbeddingLength", 1024)
+            payload = {"embedding": stub_embedding(size, request.get("inputText"), request.get("inputImage"))}
+            latency = self.embedding_latency
+        else:
+            width, height = self._size(request)
+            image = stub_image(width, height, hashlib.sha256(body.encode("utf8")).digest())
+            payload = {"images": [base64.b64encode(image).decode("ascii")], "error": None}
+            latency = self.image_latency
+        time.sleep(max(0.0, latency - (time.perf_counter() - start)))
+        return {
+            "body": io.BytesIO(json.dumps(payload).encode("utf8")),
+            "ResponseMetadata": {"HTTPStatusCode": 200, "HTTPHeaders": {}, "RetryAttempts": 0},
+        }
+
+    @staticmethod
+    def _size(request: dict) -> tuple:
+        config = request.get("imageGenerationConfig", {})
+        if "width" in config:
+            return config["width"], config["height"]
+        # Editing tasks keep the size of the input image
+        from PIL import Image
+
+        task = request.get("inPaintingParams") or request.get("outPaintingParams") or {}
+        with Image.open(io.BytesIO(base64.b64decode(task["image"]))) as image:
+            return image.size
+
+
+class LocalOpenSearch:
+    """
+    In-memory stand-in for the collection: exact kNN (scored like the OpenSearch l2
+    space), ids and terms queries, on documents added with ``index``. Every index is kept
+    apart, so tenants are routed as in the collection. Bodies go through the
+    serializer of the real client, so its cost is part of the replayed latency.
+    """
+
+    def __init__(self, vector_field: str = "vector_field"):
+        from fashion_common import vectors
+
+        self.vector_field = vector_field
+        self.serializer = vectors.VectorSerializer()
+        self.indexes = {}
+
+    def _send(self, body):
+        return self.serializer.loads(self.serializer.dumps(body))
+
+    def index(self, index, body, id=None, **kwargs):
+        body = self._send(body)
+        documents = self.indexes.setdefault(
+            index, SimpleNamespace(ids=[], sources=[], vectors=np.zeros((0, 0), dtype=np.float32))
+        )
+        doc_id = id or hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf8")).hexdigest()[:20]
+        vector = np.asarray(body[self.vector_field], dtype=np.float32)[None, :]
+        documents.ids.append(doc_id)
+        documents.sources.append({key: value for key, value in body.items() if key != self.vector_field})
+        documents.vectors = vector if not len(documents.vectors) else np.vstack([documents.vectors, vector])
+        return {"_id": doc_id, "result": "created"}
+
+    def search(self, index, body, **kwargs):
+        body = self._send(body)
+        documents = self.indexes.get(index)
+        if documents is None:
+            return {"hits": {"total": {"value": 0}, "hits": []}}
+        query = body["query"]
+        if "knn" in query:
+            knn = query["knn"][self.vector_field]
+            distances = np.sum((documents.vectors - np.asarray(knn["vector"], dtype=np.float32)) ** 2, axis=1)
+            rows = np.argsort(distances)[: min(knn["k"], body.get("size", 10))]
+            scored = [(row, float(1 / (1 + distances[row]))) for row in rows]
+        elif "ids" in query:
+            wanted = set(query["ids"]["values"])
+            scored = [(row, 1.0) for row, doc_id in enumerate(documents.ids) if doc_id in wanted]
+        elif "bool" in query:
+            # should clauses of terms queries, on a field or its .keyword subfield
+            wanted = {
+                (name.removesuffix(".keyword"), str(value))
+                for clause in query["bool"]["should"]
+                for name, values in clause["terms"].items()
+                for value in values
+            }
+            names = {name for name, _ in wanted}
+            scored = [
+                (row, 1.0)
+                for row, source in enumerate(documents.sources)
+                if any((name, str(source.get(name))) in wanted for name in names)
+            ]
+        else:
+            scored = [(row, 1.0) for row in range(len(documents.ids))]
+        fields = body.get("_source")
+        hits = [
+            {
+                "_index": index,
+                "_id": documents.ids[row],
+                "_score": score,
+                "_source": {k: v for k, v in documents.sources[row].items() if fields is None or k in fields},
+            }
+            for row, score in scored[: body.get("size", 10)]
+        ]
+        return {"hits": {"total": {"value": len(hits)}, "hits": hits}}
+
+    def msearch(self, body, index=None, **kwargs):
+        # body alternates headers and search bodies, like the _msearch NDJSON lines
+        return {
+            "responses": [
+                self.search(header.get("index", index), search) for header, search in zip(body[::2], body[1::2])
+            ]
+        }
+
+
+class WeatherServer:
+    """
+    Open-Meteo stand-in on a local port: geocoding, current weather and daily
+    forecasts, deterministic in the location. Locations in ``unknown`` are not found.
+    """
+
+    def __init__(self, latency: float = 0.0, unknown=("atlantis",)):
+        self.latency = latency
+        self.unknown = {name.lower() for name in unknown}
+        self._server = None
+
+    def start(self) -> "WeatherServer":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(stub.latency)
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                payload = stub.geocode(params) if url.path.endswith("/search") else stub.forecast(params)
+                data = json.dumps(payload).encode("utf8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}{path}"
+
+    def geocode(self, params: dict) -> dict:
+        name = params.get("name", "")
+        if name.lower() in self.unknown:
+            return {"generationtime_ms": 0.1}
+        rng = random.Random(name.lower())
+        return {"results": [{"name": name, "latitude": round(rng.uniform(-60, 60), 4), "longitude": round(rng.uniform(-180, 180), 4)}]}
+
+    def forecast(self, params: dict) -> dict:
+        rng = random.Random(f"{params.get('latitude')},{params.get('longitude')}")
+        if "daily" not in params:
+            return {"current_weather": {"temperature": round(rng.uniform(20, 95), 1), "weathercode": rng.choice([0, 2, 3, 61, 71])}}
+        days = int(params.get("forecast_days", 7))
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        lows = [round(rng.uniform(20, 70), 1) for _ in range(days)]
+        return {
+            "daily": {
+                "time": [(today + datetime.timedelta(days=day)).isoformat() for day in range(days)],
+                "temperature_2m_min": lows,
+                "temperature_2m_max": [round(low + rng.uniform(5, 20), 1) for low in lows],
+                "weathercode": [rng.choice([0, 1, 2, 3, 45, 61, 63, 71, 80, 95]) for _ in range(days)],
+                "precipitation_sum": [round(rng.uniform(0, 8), 1) for _ in range(days)],
+            }
+        }
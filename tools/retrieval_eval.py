@@ -0,0 +1,262 @@
+"""
+Evaluate image lookup retrieval quality and latency on a labelled query set.
+
+Each line of the query set is a JSON object with a text and/or an image query and
+the catalog ids relevant to it:
+
+    {"query_id": "q1", "text": "red floral summer dress", "relevant": ["1043", "2210"]}
+    {"query_id": "q2", "image": "queries/blue_gown.jpg", "relevant": ["877"]}
+
+Queries are embedded and searched with the request builders of
+components/lambda/agent/retrieval.py, against OpenSearch or a local brute-force
+search over an index snapshot (see tools/index_snapshot.py). The report gives
+recall@k, MRR, precision/recall of the top hit across score thresholds (the lookup
+returns the top hit when it scores above RETRIEVE_THRESHOLD) and per-query latency.
+
+Usage:
+    python -m tools.retrieval_eval queries.jsonl --snapshot snapshots/images-index
+    python -m tools.retrieval_eval queries.jsonl --opensearch --history evals.jsonl
+"""
+
+import argparse
+import base64
+import csv
+import hashlib
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from tools import index_snapshot
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "components/lambda/agent"))
+import retrieval  # noqa: E402
+from fashion_common import Settings, clients  # noqa: E402
+
+THRESHOLDS = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8]
+
+
+class SnapshotBackend:
+    """Exact kNN over an index snapshot, scored like the OpenSearch l2 space."""
+
+    def __init__(self, directory: Path):
+        with open(directory / "manifest.json", "r") as f:
+            manifest = json.load(f)
+        self.vectors = np.load(directory / "vectors.npy")
+        self.sources = [
+            {"image_id": row.get("image_id", row["_id"]), "aliases": row.get("aliases", [])}
+            for row in index_snapshot.iter_metadata(directory / manifest["metadata"])
+        ]
+        self.vector_field = manifest["vector_field"]
+
+    def search(self, body: dict) -> list:
+        knn = body["query"]["knn"][self.vector_field]
+        query = np.asarray(knn["vector"], dtype=np.float32)
+        distances = np.sum((self.vectors - query) ** 2, axis=1)
+        count = min(knn["k"], body["size"], len(distances))
+        top = np.argpartition(distances, count - 1)[:count]
+        top = top[np.argsort(distances[top])]
+        return [{"_score": float(1 / (1 + distances[row])), "_source": self.sources[row]} for row in top]
+
+
+class OpenSearchBackend:
+    """Searches the deployed index, like the Lambda."""
+
+    def __init__(self, client, index: str):
+        self.client = client
+        self.index = index
+
+    def search(self, body: dict) -> list:
+        # Only fetch the ids, not the stored images
+        body = {**body, "_source": ["image_id", "aliases"]}
+        hits = self.client.search(index=self.index, body=body)["hits"]["hits"]
+        for hit in hits:
+            hit["_source"].setdefault("image_id", hit["_id"])
+        return hits
+
+
+class Embedder:
+    """Embeds queries with Titan, caching vectors on disk between runs."""
+
+    def __init__(self, settings: Settings, embedding_size: int, cache_path: Path = None, profile_name: str = None):
+        self.bedrock = clients.client("bedrock-runtime", settings, profile_name)
+        self.s3 = clients.client("s3", settings, profile_name)
+        self.embedding_size = embedding_size
+        self.cache_path = cache_path
+        self.cache = {}
+        if cache_path and cache_path.exists():
+            with open(cache_path, "r") as f:
+                self.cache = json.load(f)
+
+    def _load_image(self, image: str) -> str:
+        if image.startswith("s3://"):
+            bucket, key = image.replace("s3://", "").split("/", 1)
+            content = self.s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+        else:
+            with open(image, "rb") as f:
+                content = f.read()
+        return base64.b64encode(content).decode("utf8")
+
+    def embed(self, query: dict) -> list:
+        image_b64 = self._load_image(query["image"]) if query.get("image") else None
+        body = json.dumps(retrieval.embedding_request(self.embedding_size, image_b64, query.get("text")))
+        key = hashlib.sha256(body.encode("utf8")).hexdigest()
+        if key not in self.cache:
+            response = self.bedrock.invoke_model(
+                body=body,
+                modelId=retrieval.EMBEDDING_MODEL_ID,
+                accept="application/json",
+                contentType="application/json",
+            )
+            self.cache[key] = json.loads(response["body"].read())["embedding"]
+        return self.cache[key]
+
+    def save(self) -> None:
+        if self.cache_path:
+            with open(self.cache_path, "w") as f:
+                json.dump(self.cache, f)
+
+
+def _hit_ids(hit: dict) -> set:
+    return {str(hit["_source"]["image_id"]), *map(str, hit["_source"].get("aliases", []))}
+
+
+def evaluate(queries: list, embedder, backend, ks: list) -> list:
+    """Run every query and return one result row per query."""
+    rows = []
+    for query in queries:
+        relevant = set(map(str, query["relevant"]))
+        start = time.perf_counter()
+        vector = embedder.embed(query)
+        embedded = time.perf_counter()
+        hits = backend.search(retrieval.knn_query(vector, max(ks), size=max(ks)))
+        searched = time.perf_counter()
+        ranks = [rank for rank, hit in enumerate(hits, 1) if _hit_ids(hit) & relevant]
+        rows.append(
+            {
+                "query_id": query.get("query_id", len(rows)),
+                "first_rank": ranks[0] if ranks else None,
+                "found_at": {k: len({i for hit in hits[:k] for i in _hit_ids(hit)} & relevant) for k in ks},
+                "relevant": len(relevant),
+                "top_score": hits[0]["_score"] if hits else None,
+                "top_relevant": bool(ranks and ranks[0] == 1),
+                "embed_ms": (embedded - start) * 1000,
+                "search_ms": (searched - embedded) * 1000,
+            }
+        )
+    return rows
+
+
+def summarize(rows: list, ks: list, thresholds: list = THRESHOLDS) -> dict:
+    """Aggregate per-query results into recall@k, MRR, threshold curve and latency."""
+    count = len(rows)
+    summary = {
+        "queries": count,
+        "recall": {k: statistics.mean(row["found_at"][k] / row["relevant"] for row in rows) for k in ks},
+        "mrr": statistics.mean(1 / row["first_rank"] if row["first_rank"] else 0 for row in rows),
+        "thresholds": [],
+        "latency_ms": {},
+    }
+    for threshold in thresholds:
+        answered = [row for row in rows if row["top_score"] is not None and row["top_score"] > threshold]
+        correct = sum(row["top_relevant"] for row in answered)
+        summary["thresholds"].append(
+            {
+                "threshold": threshold,
+                "answered": len(answered) / count,
+                "precision": correct / len(answered) if answered else None,
+                "recall": correct / count,
+            }
+        )
+    for stage in ("embed_ms", "search_ms"):
+        values = sorted(row[stage] for row in rows)
+        summary["latency_ms"][stage] = {
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        }
+    return summary
+
+
+def print_summary(summary: dict) -> None:
+    print(f"queries: {summary['queries']}")
+    for k, recall in summary["recall"].items():
+        print(f"recall@{k}: {recall:.3f}")
+    print(f"MRR: {summary['mrr']:.3f}")
+    print(f"\n{'threshold':>9}  {'answered':>8}  {'precision':>9}  {'recall':>6}")
+    for row in summary["thresholds"]:
+        precision = "-" if row["precision"] is None else f"{row['precision']:.3f}"
+        print(f"{row['threshold']:>9.2f}  {row['answered']:>8.3f}  {precision:>9}  {row['recall']:>6.3f}")
+    print()
+    for stage, latency in summary["latency_ms"].items():
+        print(f"{stage}: p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("queries", type=Path, help="Labelled query set (JSON lines)")
+    backend = parser.add_mutually_exclusive_group(required=True)
+    backend.add_argument("--snapshot", type=Path, help="Search an index snapshot locally")
+    backend.add_argument("--opensearch", action="store_true", help="Search the deployed index")
+    parser.add_argument("--host", help="Collection endpoint, defaults to the one in variables.json")
+    parser.add_argument("--index", help="Index to search, defaults to the one in config.yml")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10], help="Cutoffs for recall@k")
+    parser.add_argument("--embedding-size", type=int, help="Defaults to embeddingSize in config.yml")
+    parser.add_argument("--embedding-cache", type=Path, default=Path(".retrieval_eval_cache.json"))
+    parser.add_argument("--per-query", type=Path, help="Write per-query results to this CSV file")
+    parser.add_argument("--history", type=Path, help="Append the summary to this JSON lines file")
+    parser.add_argument("--profile", help="AWS profile to use")
+    parser.add_argument("--region", help="AWS region to use")
+    args = parser.parse_args(argv)
+
+    settings = index_snapshot.stack_settings(aoss_host=args.host, region=args.region)
+    embedding_size = args.embedding_size or settings.embedding_size
+    if args.snapshot:
+        search_backend = SnapshotBackend(args.snapshot)
+    else:
+        if not settings.aoss_host:
+            parser.error("--host is required when variables.json has no collection endpoint")
+        client = index_snapshot.opensearch_client(settings, args.profile)
+        search_backend = OpenSearchBackend(client, args.index or settings.index_name)
+
+    with open(args.queries, "r") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+    embedder = Embedder(settings, embedding_size, args.embedding_cache, args.profile)
+    try:
+        rows = evaluate(queries, embedder, search_backend, sorted(args.k))
+    finally:
+        embedder.save()
+    summary = summarize(rows, sorted(args.k))
+    print_summary(summary)
+
+    if args.per_query:
+        with open(args.per_query, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["query_id", "first_rank", "top_score", "top_relevant", "embed_ms", "search_ms"])
+            for row in rows:
+                writer.writerow(
+                    [
+                        row["query_id"],
+                        row["first_rank"],
+                        row["top_score"],
+                        row["top_relevant"],
+                        f"{row['embed_ms']:.1f}",
+                        f"{row['search_ms']:.1f}",
+                    ]
+                )
+    if args.history:
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "backend": str(args.snapshot) if args.snapshot else "opensearch",
+            "embedding_size": embedding_size,
+            "retrieve_threshold": retrieval.RETRIEVE_THRESHOLD,
+            **summary,
+        }
+        with open(args.history, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Aggregate the EMF tracing lines written by the agent Lambda into a per-stage
+latency table.
+
+Usage:
+    python -m tools.trace_report lambda.log [more.log ...]
+    aws logs tail /aws/lambda/FashionAgentLambda --since 1h | python -m tools.trace_report -
+"""
+
+import argparse
+import csv
+import json
+import sys
+from collections import defaultdict
+
+
+def iter_records(lines):
+    """
+    Yield the EMF records found in an iterable of log lines.
+
+    Lines may carry a CloudWatch/CLI prefix (timestamp, stream name) before the JSON.
+    """
+    for line in lines:
+        start = line.find("{")
+        if start < 0 or '"_aws"' not in line:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and "_aws" in record:
+            yield record
+
+
+def _stage_names(record):
+    for directive in record["_aws"].get("CloudWatchMetrics", []):
+        for metric in directive.get("Metrics", []):
+            if metric.get("Unit") == "Milliseconds":
+                yield metric["Name"]
+
+
+def aggregate(records):
+    """
+    Group stage timings and payload sizes by (apiPath, stage).
+
+    Returns:
+        dict: {(api_path, stage): {"ms": [..], "bytes": [..], "hits": int, "misses": int}}
+    """
+    stats = defaultdict(lambda: {"ms": [], "bytes": [], "hits": 0, "misses": 0})
+    for record in records:
+        api_path = record.get("apiPath", "?")
+        for stage in _stage_names(record):
+            entry = stats[(api_path, stage)]
+            entry["ms"].append(float(record.get(stage, 0)))
+            if f"{stage}.bytes" in record:
+                entry["bytes"].append(record[f"{stage}.bytes"])
+            entry["hits"] += record.get(f"{stage}.cache_hit", 0)
+            entry["misses"] += record.get(f"{stage}.cache_miss", 0)
+    return stats
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def build_rows(stats):
+    """Turn the aggregate into table rows, slowest stages first within each path."""
+    totals = {
+        api_path: sum(entry["ms"]) for (api_path, stage), entry in stats.items() if stage == "total"
+    }
+    rows = []
+    for (api_path, stage), entry in stats.items():
+        ms = entry["ms"]
+        lookups = entry["hits"] + entry["misses"]
+        rows.append(
+            {
+                "apiPath": api_path,
+                "stage": stage,
+                "n": len(ms),
+                "mean_ms": sum(ms) / len(ms),
+                "p50_ms": percentile(ms, 50),
+                "p90_ms": percentile(ms, 90),
+                "p99_ms": percentile(ms, 99),
+                "max_ms": max(ms),
+                "share_pct": 100 * sum(ms) / totals[api_path] if totals.get(api_path) else 0.0,
+                "mean_bytes": sum(entry["bytes"]) / len(entry["bytes"]) if entry["bytes"] else "",
+                "hit_rate": entry["hits"] / lookups if lookups else "",
+            }
+        )
+    rows.sort(key=lambda row: (row["apiPath"], row["stage"] != "total", -row["mean_ms"]))
+    return rows
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.1f}" if value >= 1 or value == 0 else f"{value:.3f}"
+    return str(value)
+
+
+def print_table(rows, out=sys.stdout):
+    columns = list(rows[0].keys()) if rows else []
+    cells = [[_format(row[c]) for c in columns] for row in rows]
+    widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+    out.write("  ".join(c.ljust(w) for c, w in zip(columns, widths)) + "\n")
+    for row in cells:
+        out.write("  ".join(v.ljust(w) for v, w in zip(row, widths)) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("logs", nargs="+", help="Log files to read, '-' for stdin")
+    parser.add_argument("--api-path", help="Only report this API path")
+    parser.add_argument("--csv", action="store_true", help="Write CSV instead of a table")
+    args = parser.parse_args(argv)
+
+    records = []
+    for path in args.logs:
+        if path == "-":
+            records.extend(iter_records(sys.stdin))
+        else:
+            with open(path, "r") as f:
+                records.extend(iter_records(f))
+    if args.api_path:
+        records = [r for r in records if r.get("apiPath") == args.api_path]
+
+    rows = build_rows(aggregate(records))
+    if not rows:
+        print("No tracing records found. Is tracing_enabled set on the Lambda?")
+        return 1
+    if args.csv:
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        print_table(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
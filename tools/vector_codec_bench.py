@@ -0,0 +1,89 @@
+"""
+Measure the CPU time and bytes of moving embedding vectors through JSON, before and
+after the codec of components/layers/common_layer/fashion_common/vectors.py.
+
+Three paths are timed per vector:
+
+    parse    a Titan embeddings response into the vector used by the Lambda
+    query    the kNN search body sent by the Lambda, through the client serializer
+    bulk     the _bulk document line of a snapshot row, as written by index_snapshot
+
+"before" is the stock opensearch-py JSONSerializer with vectors as lists of Python
+floats; orjson is used by the codec when it is installed, pass --no-orjson to
+measure the json fallback of the Lambda without the dependency.
+
+Usage:
+    python -m tools.vector_codec_bench --size 1024 --runs 2000
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+from array import array
+from pathlib import Path
+
+import numpy as np
+from opensearchpy.serializer import JSONSerializer
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "components/lambda/agent"), str(ROOT / "components/layers/common_layer")]
+import retrieval  # noqa: E402
+from fashion_common import vectors  # noqa: E402
+
+
+def _titan_response(vector: np.ndarray) -> bytes:
+    # Titan writes the float32 values of the embedding as doubles
+    return json.dumps({"embedding": vector.tolist(), "inputTextTokenCount": 7}).encode("utf8")
+
+
+def measure(function, runs: int):
+    """Return (microseconds per call, bytes of the last result)."""
+    result = function()  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = function()
+    elapsed = time.perf_counter() - start
+    return elapsed / runs * 1e6, len(result) if isinstance(result, (str, bytes)) else None
+
+
+def cases(size: int):
+    vector = np.random.default_rng(0).standard_normal(size).astype("<f4")
+    vector /= np.linalg.norm(vector)
+    response = _titan_response(vector)
+    stock = JSONSerializer()
+    as_list = json.loads(response)["embedding"]
+    as_array = array("f", as_list)
+    row = np.ascontiguousarray(vector)
+    document = {"s3_uri": "s3://bucket/catalog/0001.jpg", "image_id": "0001", "aliases": []}
+    yield "parse", "before", lambda: json.loads(io.BytesIO(response).read())["embedding"]
+    yield "parse", "after", lambda: vectors.parse_embedding(io.BytesIO(response))["embedding"]
+    yield "query", "before", lambda: stock.dumps(retrieval.knn_query(as_list, 1))
+    for digits in (9, 7):
+        serializer = vectors.VectorSerializer(digits)
+        yield "query", f"after, {digits} digits", lambda s=serializer: s.dumps(retrieval.knn_query(as_array, 1))
+    yield "bulk", "before", lambda: stock.dumps({**document, "vector_field": row.tolist()})
+    for digits in (9, 7):
+        serializer = vectors.VectorSerializer(digits)
+        yield "bulk", f"after, {digits} digits", lambda s=serializer: s.dumps({**document, "vector_field": row})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=1024, choices=[256, 384, 1024], help="Embedding size")
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--no-orjson", action="store_true", help="Measure the codec without orjson")
+    args = parser.parse_args(argv)
+
+    if args.no_orjson:
+        vectors.orjson = None
+    print(f"orjson: {'yes' if vectors.orjson is not None else 'no'}, {args.size} dimensions")
+    print(f"{'path':6}  {'codec':18}  {'us/vector':>10}  {'bytes':>8}")
+    for path, codec, function in cases(args.size):
+        micros, size = measure(function, args.runs)
+        print(f"{path:6}  {codec:18}  {micros:>10.1f}  {size if size is not None else '':>8}")
+
+
+if __name__ == "__main__":
+    main()